@@ -0,0 +1,167 @@
+"""
+Scores many PrinceDomino boards, and generates many decks, at once with NumPy.
+
+Boards are passed as two stacked integer arrays of shape (N, H, W), indexed [board, row, col]:
+    terrain - the cell's contents: EMPTY, WILD, or 1 + the terrain's index in Tiles.TERRAINS
+    crowns  - the number of crowns on the cell (0 for empty cells and the castle)
+
+encode_boards builds these arrays from Board objects, and score_boards returns the same
+totals and breakdowns as Board.score_board, one entry per board.
+
+generate_decks returns decks as rows of tile codes (see the codec in Tiles).
+"""
+import numpy as np
+
+import Tiles
+
+EMPTY = 0
+WILD = len(Tiles.TERRAINS) + 1
+TERRAIN_CODES = {terrain: code + 1 for code, terrain in enumerate(Tiles.TERRAINS)}
+
+
+def encode_boards(boards):
+    """Returns the (terrain, crowns) arrays for a list of Board objects of the same size."""
+    height, width = boards[0].grid_height, boards[0].grid_width
+    terrain = np.zeros((len(boards), height, width), dtype=np.int8)
+    crowns = np.zeros((len(boards), height, width), dtype=np.int8)
+    for n, board in enumerate(boards):
+        for col, row, value in board:
+            if value == 'wild':
+                terrain[n, row, col] = WILD
+            elif value:
+                terrain[n, row, col] = TERRAIN_CODES[value.get_terrain()]
+                crowns[n, row, col] = value.get_crowns()
+    return terrain, crowns
+
+
+def _label_territories(terrain):
+    """Labels the connected territories in a stack of boards.
+
+    Every square starts with its own flat index as a label, then repeatedly takes the
+    smallest label among its neighbours of the same terrain until nothing changes.
+    Each territory ends up labelled with the flat index of one of its own cells.
+    Cells that aren't squares are labelled with -1.
+    """
+    is_square = (terrain != EMPTY) & (terrain != WILD)
+    sentinel = terrain.size
+    labels = np.where(is_square, np.arange(terrain.size).reshape(terrain.shape), sentinel)
+
+    # Pairs of neighbouring cells that belong to the same territory, one array per direction.
+    same_down = is_square[:, 1:, :] & (terrain[:, 1:, :] == terrain[:, :-1, :])
+    same_right = is_square[:, :, 1:] & (terrain[:, :, 1:] == terrain[:, :, :-1])
+
+    while True:
+        new_labels = labels.copy()
+        below, right = labels[:, 1:, :], labels[:, :, 1:]
+        above, left = labels[:, :-1, :], labels[:, :, :-1]
+        new_labels[:, :-1, :] = np.where(same_down, np.minimum(new_labels[:, :-1, :], below), new_labels[:, :-1, :])
+        new_labels[:, 1:, :] = np.where(same_down, np.minimum(new_labels[:, 1:, :], above), new_labels[:, 1:, :])
+        new_labels[:, :, :-1] = np.where(same_right, np.minimum(new_labels[:, :, :-1], right), new_labels[:, :, :-1])
+        new_labels[:, :, 1:] = np.where(same_right, np.minimum(new_labels[:, :, 1:], left), new_labels[:, :, 1:])
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    return np.where(is_square, labels, -1)
+
+
+def score_boards(terrain, crowns, center_kingdom = False, full_kingdom = False):
+    """Scores a stack of boards, matching Board.score_board.
+
+    Returns (total_score, score), where total_score is an array with one total per board,
+    and score is a dictionary with the same keys as Board.score_board, holding an array per key.
+    (Where Board.score_board would leave out 'full_kingdom', its entry here is 0.)
+    """
+    terrain = np.asarray(terrain)
+    crowns = np.asarray(crowns)
+    boards, height, width = terrain.shape
+    cells = (height - 2) * (width - 2)  # Scored cells on each board
+
+    # Like Board.score_board, only the cells inside the outer margin are scored.
+    inner_terrain = terrain[:, 1:-1, 1:-1]
+    inner_crowns = crowns[:, 1:-1, 1:-1].astype(np.int64)
+    labels = _label_territories(inner_terrain).ravel()
+
+    is_square = labels >= 0
+    cell_labels = labels[is_square]
+    size = np.bincount(cell_labels, minlength=inner_terrain.size)
+    crown_total = np.bincount(cell_labels, weights=inner_crowns.ravel()[is_square],
+                              minlength=inner_terrain.size).astype(np.int64)
+
+    # Each territory is labelled with one of its own cells, which gives its board and terrain.
+    roots = np.nonzero(size)[0]
+    root_board = roots // cells
+    root_terrain = inner_terrain.ravel()[roots]
+    per_terrain = np.zeros((boards, WILD + 1), dtype=np.int64)
+    np.add.at(per_terrain, (root_board, root_terrain), size[roots] * crown_total[roots])
+
+    score = {}
+    for terrain_name in Tiles.SQUARESET:
+        score[terrain_name] = per_terrain[:, TERRAIN_CODES[terrain_name]]
+    squares = (inner_terrain != EMPTY) & (inner_terrain != WILD)
+    score["empty_spaces"] = cells - squares.reshape(boards, cells).sum(axis=1) - 1
+
+    if center_kingdom:
+        score["centered"] = np.where(terrain[:, height // 2, width // 2] == WILD, 10, 0)
+    if full_kingdom:
+        score["full_kingdom"] = np.where(score["empty_spaces"] == 0, 5, 0)
+
+    total_score = sum(score.values()) - score["empty_spaces"]
+    return total_score, score
+
+
+def _mix(values):
+    """The splitmix64 finalizer: scrambles an array of uint64s into well-spread random bits."""
+    with np.errstate(over="ignore"):
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def _shuffle_keys(seed, start, count, length):
+    """Returns a (count, length) array of random sort keys for decks start to start + count.
+
+    Each key is a hash of (seed, deck number, position), so deck n always gets the same keys,
+    however the decks are split into calls (or across workers).
+    """
+    decks = np.arange(start, start + count, dtype=np.uint64)[:, None]
+    positions = np.arange(length, dtype=np.uint64)[None, :]
+    base = _mix(np.array([seed], dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15))
+    with np.errstate(over="ignore"):
+        return _mix(base ^ _mix((decks << np.uint64(16)) + positions + np.uint64(1)))
+
+
+def generate_decks(count, seed, standard = False, start = 0):
+    """Returns count decks as a (count, number of tiles) array of tile codes.
+
+    If standard is True, each deck is a shuffled standard deck.
+    Otherwise, each is a random deck made the same way as Tiles.Deck(): the squares are
+    paired up at random, and the tiles renumbered 1, 2, 3, ... in order of their calculated value.
+
+    The decks are numbered from start, and deck n depends only on seed and n, so a worker
+    asking for start = 1000, count = 1000 gets exactly the second half of a call for 2000 decks.
+    Pass a row to Tiles.Deck.from_codes to play with it.
+    """
+    if standard:
+        template = np.array(Tiles.load_standard_template(), dtype=np.uint32)
+        order = np.argsort(_shuffle_keys(seed, start, count, len(template)), axis=1, kind="stable")
+        return template[order]
+
+    squares = Tiles.Square.all_squares()
+    square_terrain = np.array([Tiles.TERRAIN_RANK[square.terrain] for square in squares], dtype=np.int64)
+    square_crowns = np.array([square.crowns for square in squares], dtype=np.int64)
+    order = np.argsort(_shuffle_keys(seed, start, count, len(squares)), axis=1, kind="stable")
+
+    # Pair up the shuffled squares, then sort each pair the way Tile.sort_squares does
+    terrain_a, terrain_b = square_terrain[order[:, 0::2]], square_terrain[order[:, 1::2]]
+    crowns_a, crowns_b = square_crowns[order[:, 0::2]], square_crowns[order[:, 1::2]]
+    swap = (crowns_b > crowns_a) | ((crowns_b == crowns_a) & (terrain_a > terrain_b))
+    terrain1, terrain2 = np.where(swap, terrain_b, terrain_a), np.where(swap, terrain_a, terrain_b)
+    crowns1, crowns2 = np.where(swap, crowns_b, crowns_a), np.where(swap, crowns_a, crowns_b)
+
+    # Tile.calculate_value, then renumber the tiles by value (ties keep their deck order)
+    value = 50 * (crowns1 + crowns2) + terrain2 + np.where(terrain1 != terrain2, (1 + terrain1) * 7, 0)
+    ranks = np.empty_like(value)
+    np.put_along_axis(ranks, np.argsort(value, axis=1, kind="stable"), np.arange(1, value.shape[1] + 1)[None, :], axis=1)
+
+    direction = Tiles.DIRECTIONS.index("right")
+    return Tiles.pack_tile(terrain1, crowns1, terrain2, crowns2, direction, ranks).astype(np.uint32)
@@ -0,0 +1,61 @@
+import unittest
+
+from Tiles import Deck, Square, Tile
+from Board import Board
+
+try:
+    import numpy
+    import Batch
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, "Batch scoring needs NumPy")
+class TestBatch(unittest.TestCase):
+    def test_score_boards_matches_board(self):
+        boards = []
+        for n in range(40):
+            b = Board()
+            for t in Deck().deck[:n % 14]:
+                placements = list(b.legal_placements(t))
+                if placements:
+                    col, row, direction = placements[(n * 3) % len(placements)]
+                    t.set_direction(direction)
+                    b.place_tile(col, row, t)
+            boards.append(b)
+
+        terrain, crowns = Batch.encode_boards(boards)
+        totals, scores = Batch.score_boards(terrain, crowns, center_kingdom=True, full_kingdom=True)
+        for n, b in enumerate(boards):
+            total, score = b.score_board(center_kingdom=True, full_kingdom=True)
+            self.assertEqual(totals[n], total)
+            for category in score:
+                self.assertEqual(scores[category][n], score[category], category)
+
+    def test_score_no_boards(self):
+        empty = numpy.zeros((0, 7, 7), dtype=numpy.int8)
+        totals, scores = Batch.score_boards(empty, empty, center_kingdom=True, full_kingdom=True)
+        self.assertEqual(totals.shape, (0,))
+        for category in scores:
+            self.assertEqual(scores[category].shape, (0,), category)
+
+
+@unittest.skipIf(numpy is None, "Batch deck generation needs NumPy")
+class TestGenerateDecks(unittest.TestCase):
+    def test_random_decks(self):
+        decks = Batch.generate_decks(50, seed=7)
+        self.assertEqual(decks.shape, (50, 48))
+        for row in decks:
+            deck = Deck.from_codes(row)
+            self.assertEqual(sorted(t.get_value() for t in deck.deck), list(range(1, 49)))
+            squares = sorted(str(s) for t in deck.deck for s in t)
+            self.assertEqual(squares, sorted(str(s) for s in Square.all_squares()))
+            for t in deck.deck:
+                self.assertEqual(str(Tile(*t)), str(t), "Squares are in Tile order")
+        self.assertFalse(numpy.array_equal(decks[0], decks[1]))
+
+    def test_reproducible_when_split(self):
+        whole = Batch.generate_decks(30, seed=3)
+        parts = [Batch.generate_decks(10, seed=3, start=start) for start in (0, 10, 20)]
+        self.assertTrue(numpy.array_equal(whole, numpy.concatenate(parts)))
+        self.assertFalse(numpy.array_equal(whole, Batch.generate_decks(30, seed=4)))
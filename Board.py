@@ -1,8 +1,68 @@
 """
 This is for board class for Princedomino
 """
+import copy
+import random
+from collections import namedtuple
+
 import Tiles
 
+# Zobrist keys for every (position, terrain, crowns) seen so far. Each key is drawn from
+# a generator seeded with the cell's description, so every process agrees on them.
+_ZOBRIST_KEYS = {}
+
+
+def zobrist_key(position, terrain, crowns):
+    """Returns the 64 bit Zobrist key for a square of terrain with crowns at position
+    (a position with the centering shifts taken out, as from Board._fixed_position)."""
+    cell = (position, terrain, crowns)
+    key = _ZOBRIST_KEYS.get(cell)
+    if key is None:
+        key = random.Random(f"zobrist:{position[0]},{position[1]}:{terrain}:{crowns}").getrandbits(64)
+        _ZOBRIST_KEYS[cell] = key
+    return key
+
+
+# Each cell of a kingdom is packed into this many bits by Board.encode_kingdom.
+CELL_BITS = 5
+# The code (see Board.encode_kingdom) for each kind of cell, filled in for squares as they're seen
+_CELL_CODES = {0: 0, 'wild': 1}
+_SYMMETRIES = {}
+
+
+def _symmetries(height, width):
+    """Returns the 8 rotations and reflections of a height x width rectangle (its D4 symmetries).
+    Each is (new_height, new_width, order), where order lists the old cell index for each new cell."""
+    if (height, width) not in _SYMMETRIES:
+        transforms = []
+        for reflect in (False, True):
+            for turns in range(4):
+                new_height, new_width = (width, height) if turns % 2 else (height, width)
+                order = [0] * (height * width)
+                for row in range(height):
+                    for col in range(width):
+                        r, c = row, (width - 1 - col if reflect else col)
+                        for turn in range(turns):  # rotate a quarter turn clockwise
+                            r, c = c, (height if (turn % 2) == 0 else width) - 1 - r
+                        order[r * new_width + c] = row * width + col
+                transforms.append((new_height, new_width, order))
+        _SYMMETRIES[(height, width)] = transforms
+    return _SYMMETRIES[(height, width)]
+
+
+def canonical_key(height, width, codes):
+    """Given a kingdom as from Board.encode_kingdom, returns one integer key that is the same
+    for all 8 of its rotations and reflections (the smallest of their packed encodings)."""
+    best = None
+    for new_height, new_width, order in _symmetries(height, width):
+        packed = 0
+        for index in order:
+            packed = (packed << CELL_BITS) | codes[index]
+        key = (((new_height << 4) | new_width) << (CELL_BITS * len(codes))) | packed
+        if best is None or key < best:
+            best = key
+    return best
+
 
 class Grid:
 
@@ -58,20 +118,365 @@ class Grid:
         return ans
 
 
+class BitBoard:
+    """A compact copy of a Board's contents, stored as integer bitmasks.
+
+    Cell (col, row) is stored in bit (row * stride + col). Each row has one spare
+    bit at the end, so a mask can be shifted one column left or right without
+    any cell wrapping around onto the next row.
+
+    There is one mask per terrain, one per number of crowns, and masks for the
+    'wild' castle and for every occupied cell. used_cols and used_rows mark the
+    columns and rows that contain anything, which gives the size of the kingdom.
+    """
+
+    def __init__(self, grid_width, grid_height):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.stride = grid_width + 1
+
+        row_mask = (1 << grid_width) - 1
+        self.row_mask = row_mask
+        self.valid = 0  # every bit that is a real cell (not a spare bit)
+        for row in range(grid_height):
+            self.valid |= row_mask << (row * self.stride)
+        self.set_window(0, 0, grid_width, grid_height)
+
+        self.terrain = dict.fromkeys(Tiles.SQUARESET, 0)
+        self.crowns = [0, 0, 0, 0]  # crowns[n] marks the squares with n crowns
+        self.wild = 0
+        self.occupied = 0
+        self.used_cols = 0
+        self.used_rows = 0
+
+    def copy(self):
+        """Returns an independent copy of the bitboard."""
+        new = copy.copy(self)
+        new.terrain = dict(self.terrain)
+        new.crowns = list(self.crowns)
+        return new
+
+    def set_window(self, col, row, width, height):
+        """Sets the part of the grid that is shown to the players, starting at (col, row).
+        window marks its cells, and interior marks them minus the outer margin
+        (which is where the kingdom always ends up after centering).
+        Squares can only be placed inside the window."""
+        self.window, self.interior = 0, 0
+        line = (1 << width) - 1
+        for r in range(row, row + height):
+            self.window |= (line << col) << (r * self.stride)
+            if row < r < row + height - 1:
+                self.interior |= (line >> 2 << (col + 1)) << (r * self.stride)
+
+    def bit(self, col, row):
+        """Returns the single-bit mask for cell (col, row)"""
+        return 1 << (row * self.stride + col)
+
+    def in_bounds(self, col, row):
+        return 0 <= col < self.grid_width and 0 <= row < self.grid_height
+
+    def neighbors(self, mask):
+        """Returns a mask of every cell horizontally or vertically adjacent to a cell in mask."""
+        stride = self.stride
+        return ((mask << 1) | (mask >> 1) | (mask << stride) | (mask >> stride)) & self.valid
+
+    def set_cell(self, col, row, value):
+        """Mirrors Board.set_cell. value is a Square, 'wild', or 0 (empty)."""
+        bit = self.bit(col, row)
+        if self.occupied & bit:
+            self._clear(bit)
+        if not value:
+            self._recount_used()
+            return
+        if value == 'wild':
+            self.wild |= bit
+        else:
+            self.terrain[value.get_terrain()] |= bit
+            self.crowns[value.get_crowns()] |= bit
+        self.occupied |= bit
+        self.used_cols |= 1 << col
+        self.used_rows |= 1 << row
+
+    def _clear(self, bit):
+        keep = ~bit
+        for terrain in self.terrain:
+            self.terrain[terrain] &= keep
+        for crowns in range(4):
+            self.crowns[crowns] &= keep
+        self.wild &= keep
+        self.occupied &= keep
+
+    def _recount_used(self):
+        """Rebuilds used_cols and used_rows from the occupied mask (only needed after a cell is cleared)."""
+        self.used_cols, self.used_rows = 0, 0
+        for row in range(self.grid_height):
+            cols = (self.occupied >> (row * self.stride)) & self.row_mask
+            if cols:
+                self.used_cols |= cols
+                self.used_rows |= 1 << row
+
+    def is_occupied(self, col, row):
+        return bool(self.occupied & self.bit(col, row))
+
+    def empty_spaces(self):
+        """Counts the empty interior cells, the way Board.score_board reports 'empty_spaces'
+        (the castle is counted as empty, and the total starts from -1)."""
+        squares = self.occupied & ~self.wild
+        return bin(self.interior & ~squares).count("1") - 1
+
+    @staticmethod
+    def _span(mask):
+        """Distance between the lowest and highest set bit, inclusive."""
+        if not mask:
+            return 0
+        return mask.bit_length() - (mask & -mask).bit_length() + 1
+
+    def width_with(self, *cols):
+        """Returns the width of the kingdom if squares were added in cols."""
+        mask = self.used_cols
+        for col in cols:
+            mask |= 1 << col
+        return self._span(mask)
+
+    def height_with(self, *rows):
+        """Returns the height of the kingdom if squares were added in rows."""
+        mask = self.used_rows
+        for row in rows:
+            mask |= 1 << row
+        return self._span(mask)
+
+    def touches(self, col, row, terrain):
+        """Returns whether (col, row) is next to a square of the given terrain, or the castle."""
+        return bool(self.neighbors(self.bit(col, row)) & (self.terrain[terrain] | self.wild))
+
+    def _line_window(self, used, length):
+        """Returns a mask of the positions in a row/column line that keep the kingdom within 5 squares."""
+        low, high = (used & -used).bit_length() - 1, used.bit_length() - 1
+        first, last = max(0, high - 4), min(length - 1, low + 4)
+        if first > last:
+            return 0
+        return ((1 << (last - first + 1)) - 1) << first
+
+    def placement_region(self):
+        """Returns a mask of the cells a square could occupy without exceeding the 5x5 play space."""
+        cols = self._line_window(self.used_cols, self.grid_width)
+        rows = self._line_window(self.used_rows, self.grid_height)
+        region = 0
+        rows &= (1 << self.grid_height) - 1
+        while rows:
+            low = rows & -rows
+            region |= cols << ((low.bit_length() - 1) * self.stride)
+            rows ^= low
+        return region & self.window
+
+    def frontier(self):
+        """Returns a mask of the empty cells next to the kingdom that are inside the play space."""
+        return self.neighbors(self.occupied) & ~self.occupied & self.placement_region()
+
+    def legal_placements(self, terrain1, terrain2, offsets):
+        """Yields (col, row, direction) for every legal placement of a tile with the given terrains.
+
+        offsets maps each direction to the (col, row) offset of the second square from the first.
+        A placement is legal when both cells are empty and inside the play space,
+        and at least one square sits on the frontier next to matching terrain (or the castle).
+        """
+        open_cells = self.valid & ~self.occupied & self.placement_region()
+        frontier = self.neighbors(self.occupied) & open_cells
+        anchors1 = self.neighbors(self.terrain[terrain1] | self.wild) & frontier
+        anchors2 = self.neighbors(self.terrain[terrain2] | self.wild) & frontier
+        for direction, (dcol, drow) in offsets.items():
+            # Line the second square's cell up with the first square's bit.
+            k = drow * self.stride + dcol
+            if k >= 0:
+                open2, anchored2 = open_cells >> k, anchors2 >> k
+            else:
+                open2, anchored2 = open_cells << -k, anchors2 << -k
+            candidates = open_cells & open2 & (anchors1 | anchored2)
+            while candidates:
+                low = candidates & -candidates
+                row, col = divmod(low.bit_length() - 1, self.stride)
+                yield col, row, direction
+                candidates ^= low
+
+    def shift(self, cols, rows):
+        """Moves every mask by (cols, rows). Cells pushed off the grid are dropped,
+        which is safe because Board only shifts an empty margin across."""
+        offset = rows * self.stride + cols
+
+        def move(mask):
+            if offset >= 0:
+                return (mask << offset) & self.valid
+            return (mask >> -offset) & self.valid
+
+        for terrain in self.terrain:
+            self.terrain[terrain] = move(self.terrain[terrain])
+        self.crowns = [move(mask) for mask in self.crowns]
+        self.wild = move(self.wild)
+        self.occupied = move(self.occupied)
+        self.used_cols = self._move_line(self.used_cols, cols, self.grid_width)
+        self.used_rows = self._move_line(self.used_rows, rows, self.grid_height)
+
+    @staticmethod
+    def _move_line(mask, offset, length):
+        if offset >= 0:
+            return (mask << offset) & ((1 << length) - 1)
+        return mask >> -offset
+
+
+class Territories:
+    """Tracks the connected territories of a Board in a union-find (disjoint-set) structure.
+
+    Each territory's root keeps its size and crowns, and scores keeps the running
+    score of each terrain, so the board's score never needs to be flood-filled.
+    Cells are keyed by their position in the board's own frame (see Board.offset),
+    so the centering shifts don't disturb anything stored here.
+    """
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+        self.crowns = {}
+        self.terrain = {}
+        self.scores = dict.fromkeys(Tiles.SQUARESET, 0)
+        # Every add and union, in order, so they can be rolled back.
+        # (Unions are by size without path compression, which keeps them reversible.)
+        self.history = []
+
+    def find(self, cell):
+        """Returns the root cell of cell's territory."""
+        while self.parent[cell] != cell:
+            cell = self.parent[cell]
+        return cell
+
+    def add(self, cell, terrain, crowns):
+        """Adds a square at cell, joining it to any neighbouring territories of the same terrain."""
+        self.parent[cell] = cell
+        self.size[cell] = 1
+        self.crowns[cell] = crowns
+        self.terrain[cell] = terrain
+        self.scores[terrain] += crowns
+        self.history.append((cell, None))
+        col, row = cell
+        for neighbor in ((col, row - 1), (col, row + 1), (col - 1, row), (col + 1, row)):
+            if self.terrain.get(neighbor) == terrain:
+                self._union(cell, neighbor)
+
+    def _union(self, cell1, cell2):
+        root1, root2 = self.find(cell1), self.find(cell2)
+        if root1 == root2:
+            return
+        if self.size[root1] < self.size[root2]:
+            root1, root2 = root2, root1
+        terrain = self.terrain[root1]
+        self.scores[terrain] -= self.size[root1] * self.crowns[root1] + self.size[root2] * self.crowns[root2]
+        self.parent[root2] = root1
+        self.size[root1] += self.size[root2]
+        self.crowns[root1] += self.crowns[root2]
+        self.scores[terrain] += self.size[root1] * self.crowns[root1]
+        self.history.append((root1, root2))
+
+    def gain(self, squares):
+        """Returns how much the terrain scores would go up by if squares were added, without adding them.
+        squares is a list of (cell, terrain, crowns), for cells that are next to each other (like a tile's two squares).
+        """
+        gain = 0
+        for terrain in {terrain for cell, terrain, crowns in squares}:
+            # The new squares of this terrain join up with each other, and with every territory they touch
+            roots, size, crowns = set(), 0, 0
+            for cell, square_terrain, square_crowns in squares:
+                if square_terrain != terrain:
+                    continue
+                size, crowns = size + 1, crowns + square_crowns
+                col, row = cell
+                for neighbor in ((col, row - 1), (col, row + 1), (col - 1, row), (col + 1, row)):
+                    if self.terrain.get(neighbor) == terrain:
+                        roots.add(self.find(neighbor))
+            for root in roots:
+                gain -= self.size[root] * self.crowns[root]
+                size, crowns = size + self.size[root], crowns + self.crowns[root]
+            gain += size * crowns
+        return gain
+
+    def copy(self):
+        """Returns an independent copy of the territories, history included."""
+        new = Territories.__new__(Territories)
+        new.parent, new.size, new.crowns = dict(self.parent), dict(self.size), dict(self.crowns)
+        new.terrain, new.scores, new.history = dict(self.terrain), dict(self.scores), list(self.history)
+        return new
+
+    def rollback(self, mark):
+        """Undoes every add and union made since len(self.history) was mark."""
+        while len(self.history) > mark:
+            root1, root2 = self.history.pop()
+            terrain = self.terrain[root1]
+            if root2 is None:  # root1 was added on its own
+                self.scores[terrain] -= self.crowns[root1]
+                del self.parent[root1], self.size[root1], self.crowns[root1], self.terrain[root1]
+                continue
+            self.scores[terrain] -= self.size[root1] * self.crowns[root1]
+            self.size[root1] -= self.size[root2]
+            self.crowns[root1] -= self.crowns[root2]
+            self.parent[root2] = root2
+            self.scores[terrain] += self.size[root1] * self.crowns[root1] + self.size[root2] * self.crowns[root2]
+
+    def territory(self, cell):
+        """Returns (size, crowns, terrain) for the territory containing cell."""
+        root = self.find(cell)
+        return self.size[root], self.crowns[root], self.terrain[root]
+
+
+# What Board.place_tile returns, so that Board.undo can take the placement back.
+# cells holds the two squares' (col, row) before centering, edges is a copy of Board.edges
+# from before the placement, shift is the (cols, rows) the grid was moved by, and
+# territory_mark is where the Territories history stood.
+Placement = namedtuple("Placement", ["cells", "edges", "shift", "territory_mark"])
+
+
 class Board(Grid):
     ALPHABET = ["A", "B", "C", "D", "E", "F", 'G', 'H', 'I', 'J', 'K', 'L',
                 'M', 'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'U', 'V', 'W',
                 'X', 'Y', 'Z']
+    # Where a tile's second square sits relative to its first, for each direction.
+    OFFSETS = {'left': (-1, 0), 'up': (0, -1), 'right': (1, 0), 'down': (0, 1), }
 
-    def __init__(self, grid_height=5, grid_width=5):
-        """"""
+    def __init__(self, grid_height=5, grid_width=5, fixed_frame=False):
+        """If fixed_frame is True, the board stores its cells in a fixed frame around the castle,
+        big enough for the kingdom to grow in any direction. Centering then only moves the
+        part of that frame being viewed, and never moves any stored data.
+
+        Either way, every method takes and returns coordinates in the (grid_width + 2) x (grid_height + 2) view.
+        """
         # create a board, which acts as a grid
         super(Board, self).__init__(grid_height + 2, grid_width + 2)
         # (While the play space are equal to grid height/width,
         # the +2 provides a margin and helps with the centering method.
 
+        self.fixed_frame = fixed_frame
+        # How far the view's cell (0, 0) is from the stored grid's cell (0, 0).
+        # This is only ever non-zero with a fixed frame.
+        self.frame_shift = [0, 0]
+        if fixed_frame:
+            # The kingdom can reach grid_width - 1 squares past the castle in any direction, plus a margin.
+            self.frame_shift = [grid_width - 1, grid_height - 1]
+            frame_width, frame_height = self.grid_width + 2 * self.frame_shift[0], self.grid_height + 2 * self.frame_shift[1]
+            self.grid = [[0 for n in range(frame_width)] for m in range(frame_height)]
+        else:
+            frame_width, frame_height = self.grid_width, self.grid_height
+
         self.grid_center = (self.grid_width // 2, self.grid_height // 2)
-        self.grid[self.grid_center[0]][self.grid_center[1]] = 'wild'
+        castle = self._stored(*self.grid_center)
+        self.grid[castle[1]][castle[0]] = 'wild'
+        # The bitboard mirrors the grid, and answers the validity checks with a few shifts and ANDs.
+        self.bits = BitBoard(frame_width, frame_height)
+        self.bits.set_cell(castle[0], castle[1], 'wild')
+        self.bits.set_window(self.frame_shift[0], self.frame_shift[1], self.grid_width, self.grid_height)
+        # How far the centering has moved the kingdom within the view, as (columns, rows).
+        # Subtracting it from a cell's coordinates gives a position that never changes.
+        self.offset = [0, 0]
+        self.territories = Territories()
+        # A hash of the squares on the board, updated by set_cell (see zobrist_key).
+        # Centering doesn't change it, so equal kingdoms hash the same however they were built.
+        self.zobrist = 0
         self.message = "All's good for now"
         self.edges = {bound: 3 for bound in ["left", "right", "top", "bottom"]}
 
@@ -88,10 +493,10 @@ class Board(Grid):
     def __str__(self):
         print_string = ""
         y_label_copy = list(self.y_label)
-        for row in self.grid:
+        for row in range(self.grid_height):
             r = str(y_label_copy.pop(0))
-            for value in row:
-                r += "{0:^7}".format(str(value))
+            for col in range(self.grid_width):
+                r += "{0:^7}".format(str(self.get_cell(col, row)))
             print_string += "\n\n\n" + r
         r = "\n\n "
         for value in self.x_label:
@@ -99,6 +504,29 @@ class Board(Grid):
         print_string += r
         return print_string
 
+    def copy(self):
+        """Returns an independent copy of the board, much faster than copy.deepcopy.
+        (Squares are immutable, so the copies share them.)"""
+        new = copy.copy(self)
+        new.grid = [list(row) for row in self.grid]
+        new.frame_shift, new.offset, new.edges = list(self.frame_shift), list(self.offset), dict(self.edges)
+        new.bits = self.bits.copy()
+        new.territories = self.territories.copy()
+        return new
+
+    def _stored(self, col, row):
+        """Returns where the view's cell (col, row) is kept in self.grid and self.bits"""
+        return col + self.frame_shift[0], row + self.frame_shift[1]
+
+    def _in_view(self, col, row):
+        return 0 <= col < self.grid_width and 0 <= row < self.grid_height
+
+    def get_cell(self, col, row):
+        return self.grid[row + self.frame_shift[1]][col + self.frame_shift[0]]
+
+    def is_empty(self, col, row):
+        return self.get_cell(col, row) == 0
+
     def _chess_indexed(self, col, row):
         """Takes as input coordinates in chess-format
         returns Grid coordinates that the class can interpret
@@ -114,6 +542,10 @@ class Board(Grid):
 
         return true_col, true_row
 
+    def chess_coordinate(self, col, row):
+        """The reverse of _chess_indexed. Returns the chess-format coordinate (like "D6") of (col, row)."""
+        return f"{self.x_label[col]}{self.y_label[row]}"
+
     def get_cell_terrain(self, col, row):
         """If the cell is a square, returns its terrain type
         If the cell is 'wild,' return 'wild'
@@ -173,10 +605,9 @@ class Board(Grid):
     @staticmethod
     def _square2_coords(col, row, tile):
         """A helper function that returns the coordinates (row, col) of the second square in a tile."""
-        offset = {'left': (-1, 0), 'up': (0, -1), 'right': (1, 0), 'down': (0, 1), }
         direction = tile.get_direction()
-        col2, row2 = tuple(map(sum, zip((col, row), offset[direction])))
-        return col2, row2
+        dcol, drow = Board.OFFSETS[direction]
+        return col + dcol, row + drow
 
     def set_cell(self, col, row, value, chess_indexed = False):
         """This method skips many of the validity checks on placing a tile.
@@ -186,11 +617,35 @@ class Board(Grid):
         if chess_indexed:
             col, row = self._chess_indexed(col, row)
 
-        self.edges["left"] = min([col, self.edges["left"]])
-        self.edges["right"] = max([col, self.edges["right"]])
-        self.edges["top"] = min([row, self.edges["top"]])
-        self.edges["bottom"] = max([row, self.edges["bottom"]])
-        super(Board, self).set_cell(col, row, value)
+        edges = self.edges
+        edges["left"], edges["right"] = min(col, edges["left"]), max(col, edges["right"])
+        edges["top"], edges["bottom"] = min(row, edges["top"]), max(row, edges["bottom"])
+        previous = self.get_cell(col, row)
+        stored_col, stored_row = self._stored(col, row)
+        super(Board, self).set_cell(stored_col, stored_row, value)
+        self.bits.set_cell(stored_col, stored_row, value)
+
+        position = self._fixed_position(col, row)
+        if isinstance(previous, Tiles.Square):
+            self.zobrist ^= zobrist_key(position, previous.get_terrain(), previous.get_crowns())
+        if isinstance(value, Tiles.Square):
+            self.zobrist ^= zobrist_key(position, value.get_terrain(), value.get_crowns())
+
+        # Keep the running territory scores up to date
+        if isinstance(previous, Tiles.Square) or not value:
+            self._rebuild_territories()  # Squares can't be taken out of a territory, so start over
+        elif isinstance(value, Tiles.Square):
+            self.territories.add(position, value.get_terrain(), value.get_crowns())
+
+    def _fixed_position(self, col, row):
+        """Returns the position of (col, row) with the centering shifts taken out."""
+        return col - self.offset[0], row - self.offset[1]
+
+    def _rebuild_territories(self):
+        self.territories = Territories()
+        for col, row, value in self:
+            if isinstance(value, Tiles.Square):
+                self.territories.add(self._fixed_position(col, row), value.get_terrain(), value.get_crowns())
 
     def is_square_invalid(self, col, row, square):
         #todo review these entire functions
@@ -202,24 +657,27 @@ class Board(Grid):
                     - (3)Placement would exceed a 5x5 grid
                     - (4)No adjacent tile of the same suit or 'wild'
                     """
+        bits = self.bits
         if not isinstance(square, Tiles.Square):  # the object is not a square
             self.message = "Can only place Square objects on a Board."
             return 1
-        elif not self.is_empty(col, row):  # if the cell is not empty
+        elif not self._in_view(col, row):  # the cell is off the grid entirely
+            self.message = "Cannot exceed the 5x5 play space."
+            return 3
+        col, row = self._stored(col, row)
+        if bits.is_occupied(col, row):  # if the cell is not empty
             self.message = "Cannot place a tile on an occupied cell."
             return 2
-        elif self.get_width_used(new_bound=col) > 5:
+        elif bits.width_with(col) > 5:
             self.message = "Cannot exceed the 5x5 play space."
             return 3
-        elif self.get_height_used(new_bound=row) > 5:
+        elif bits.height_with(row) > 5:
             self.message = "Cannot exceed the 5x5 play space."
             return 3
-        else:  # determine whether there's a valid adjacent suit.
-            for ncol, nrow in self.four_neighbors(col, row):
-                nterrain = self.get_cell_terrain(ncol, nrow)
-                if nterrain == square.get_terrain() or nterrain == "wild":
-                    self.message = ""
-                    return 0
+        elif bits.touches(col, row, square.get_terrain()):  # there's a valid adjacent suit.
+            self.message = ""
+            return 0
+        else:
             self.message = "Can't place tile without adjacent matching territory."
             return 4
 
@@ -254,24 +712,85 @@ class Board(Grid):
             # The tile cannot be placed at the chosen location
             return 0
 
-    def place_tile(self, col, row, tile, chess_indexed = False):
+    def legal_placements(self, tile):
+        """Yields every valid placement of tile as a (col, row, direction) tuple.
+
+        (col, row) is where tile.get_square1 would go, exactly as for is_tile_valid
+        after the tile is turned to face direction. The tile itself is not rotated.
+        The placements are read off the frontier of empty cells around the kingdom,
+        rather than by trying every cell and rotation.
+        """
+        square1, square2 = tile
+        placements = self.bits.legal_placements(square1.get_terrain(), square2.get_terrain(), self.OFFSETS)
+        if not self.fixed_frame:
+            return placements
+        shift_col, shift_row = self.frame_shift
+        return ((col - shift_col, row - shift_row, direction) for col, row, direction in placements)
+
+    def has_legal_placement(self, tile):
+        """Returns 1 if tile can be placed anywhere on the board, otherwise 0."""
+        for placement in self.legal_placements(tile):
+            return 1
+        return 0
+
+    def placement_gain(self, col, row, direction, tile):
+        """Returns how much the board's score (before bonuses) would go up by
+        if tile were placed at (col, row) facing direction, as from legal_placements.
+        The board is not changed, and the placement is not checked.
+        """
+        square1, square2 = tile
+        dcol, drow = self.OFFSETS[direction]
+        return self.territories.gain(
+            [(self._fixed_position(col, row), square1.get_terrain(), square1.get_crowns()),
+             (self._fixed_position(col + dcol, row + drow), square2.get_terrain(), square2.get_crowns())])
+
+    def place_tile(self, col, row, tile, chess_indexed = False, checked = False):
         """Checks if the Tile is valid at the location.
         If it is, places each square in the correct location, using set_cell
         Then re-centers the grid.
+        If checked is True, the placement is already known to be valid (it came from legal_placements),
+        so it isn't checked again.
+
+        Returns a Placement record if the tile was placed (which can be passed to undo), or 0 if not.
         """
         if chess_indexed:
             col, row = self._chess_indexed(col, row)
 
-        if self.is_tile_valid(col, row, tile):
+        if checked or self.is_tile_valid(col, row, tile):
             square1, square2 = tile
             col2, row2 = self._square2_coords(col, row, tile)
+            edges, territory_mark = dict(self.edges), len(self.territories.history)
             self.set_cell(col, row, square1)
             self.set_cell(col2, row2, square2)
-            self._center()
-            return 1
+            shift = self._center()
+            return Placement(((col, row), (col2, row2)), edges, shift, territory_mark)
         else:
             return 0
 
+    def undo(self, placement):
+        """Takes back a tile placed by place_tile, given the Placement it returned.
+        The board ends up exactly as it was before, including its edges and centering.
+
+        Placements have to be undone in the reverse order they were made.
+        """
+        shift_cols, shift_rows = placement.shift
+        if shift_cols:
+            self._horizontal_shift("right" if shift_cols < 0 else "left")
+        if shift_rows:
+            self._vertical_shift("down" if shift_rows < 0 else "up")
+        for col, row in placement.cells:
+            self._clear_cell(col, row)
+        self.edges = dict(placement.edges)
+        self.territories.rollback(placement.territory_mark)
+
+    def _clear_cell(self, col, row):
+        """Empties a cell without touching the edges or the territories. Used by undo."""
+        square = self.get_cell(col, row)
+        self.zobrist ^= zobrist_key(self._fixed_position(col, row), square.get_terrain(), square.get_crowns())
+        stored_col, stored_row = self._stored(col, row)
+        super(Board, self).set_cell(stored_col, stored_row, 0)
+        self.bits.set_cell(stored_col, stored_row, 0)
+
     def _center(self):
         """Keeps the board centered, so it doesn't need to do
         fancy wrapping things or mutatable edges.
@@ -279,59 +798,144 @@ class Board(Grid):
         May be useful to keep a binary row/column counter.
         ex. Rows:0011110, Col:0011100
 
-        This function determines whether to bump a 0 row/column to the other side."""
+        This function determines whether to bump a 0 row/column to the other side.
+        Returns how far the grid moved, as (columns, rows)."""
+        shift_cols, shift_rows = 0, 0
         left_margin = self.edges["left"]
         right_margin = self.grid_width - 1 - self.edges["right"]
         if left_margin > (right_margin + 1):  # slide to the left
             self._horizontal_shift("left")
+            shift_cols = -1
         elif right_margin > (left_margin + 1):  # slide to the right
             self._horizontal_shift("right")
+            shift_cols = 1
 
         top_margin = self.edges["top"]
         bottom_margin = self.grid_height - 1 - self.edges["bottom"]
         if top_margin > (bottom_margin + 1):  # slide toward the top
             self._vertical_shift("up")
+            shift_rows = -1
         elif bottom_margin > (top_margin + 1):  # slide toward the bottom
             self._vertical_shift("down")
+            shift_rows = 1
+        return shift_cols, shift_rows
 
     def _horizontal_shift(self, direction):
-        """Shift entire grid horizontally, either 'left' or 'right'"""
+        """Shift entire grid horizontally, either 'left' or 'right'
+        With a fixed frame, the view moves the other way instead, and the grid stays put."""
         if direction == "left":
-            for row in self.grid:
-                leftmost = row.pop(0)
-                row.append(leftmost)
+            if self.fixed_frame:
+                self._move_view(1, 0)
+            else:
+                for row in self.grid:
+                    leftmost = row.pop(0)
+                    row.append(leftmost)
+                self.bits.shift(-1, 0)
             self.edges["left"] -= 1
             self.edges["right"] -= 1
+            self.offset[0] -= 1
         if direction == "right":
-            for row in self.grid:
-                rightmost = row.pop()
-                row.insert(0, rightmost)
+            if self.fixed_frame:
+                self._move_view(-1, 0)
+            else:
+                for row in self.grid:
+                    rightmost = row.pop()
+                    row.insert(0, rightmost)
+                self.bits.shift(1, 0)
             self.edges["left"] += 1
             self.edges["right"] += 1
+            self.offset[0] += 1
 
     def _vertical_shift(self, direction):
-        """Shift entire grid vertically, either 'up' or 'down'"""
+        """Shift entire grid vertically, either 'up' or 'down'
+        With a fixed frame, the view moves the other way instead, and the grid stays put."""
         if direction == "down":
-            bottom_row = self.grid.pop()
-            self.grid.insert(0, bottom_row)
+            if self.fixed_frame:
+                self._move_view(0, -1)
+            else:
+                bottom_row = self.grid.pop()
+                self.grid.insert(0, bottom_row)
+                self.bits.shift(0, 1)
             self.edges["top"] += 1
             self.edges["bottom"] += 1
+            self.offset[1] += 1
         if direction == "up":
-            top_row = self.grid.pop(0)
-            self.grid.append(top_row)
+            if self.fixed_frame:
+                self._move_view(0, 1)
+            else:
+                top_row = self.grid.pop(0)
+                self.grid.append(top_row)
+                self.bits.shift(0, -1)
             self.edges["top"] -= 1
             self.edges["bottom"] -= 1
+            self.offset[1] -= 1
+
+    def _move_view(self, cols, rows):
+        """Helper function for the shifts with a fixed frame. Moves the view over the stored grid."""
+        self.frame_shift[0] += cols
+        self.frame_shift[1] += rows
+        self.bits.set_window(self.frame_shift[0], self.frame_shift[1], self.grid_width, self.grid_height)
+
+    def encode_kingdom(self):
+        """Returns the kingdom (the smallest rectangle holding every square and the castle)
+        as (height, width, codes), where codes lists a small integer for each cell, row by row:
+        0 for an empty cell, 1 for the castle, and 2 + 4 * terrain code + crowns for a square
+        (with terrain codes from Tiles.TERRAINS)."""
+        height = self.edges["bottom"] - self.edges["top"] + 1
+        width = self.edges["right"] - self.edges["left"] + 1
+        left, top = self._stored(self.edges["left"], self.edges["top"])
+        codes = []
+        for row in self.grid[top:top + height]:
+            for cell in row[left:left + width]:
+                code = _CELL_CODES.get(cell)
+                if code is None:
+                    code = _CELL_CODES[cell] = 2 + 4 * Tiles.TERRAINS.index(cell.get_terrain()) + cell.get_crowns()
+                codes.append(code)
+        return height, width, codes
+
+    def restore_kingdom(self, edges, offset, codes):
+        """Puts a kingdom from encode_kingdom back onto a new, empty Board.
+        edges is the kingdom's bounding box in the view (as in self.edges), and offset is
+        how far centering had moved it (as in self.offset)."""
+        self.set_cell(*self.grid_center, 0)  # The castle is somewhere in codes
+        self.offset = list(offset)
+        width = edges["right"] - edges["left"] + 1
+        for index, code in enumerate(codes):
+            if not code:
+                continue
+            row, col = divmod(index, width)
+            if code == 1:
+                value = 'wild'
+            else:
+                terrain, crowns = divmod(code - 2, 4)
+                value = Tiles.Square(Tiles.TERRAINS[terrain], crowns)
+            self.set_cell(edges["left"] + col, edges["top"] + row, value)
+        self.edges = dict(edges)
+
+    def canonical_key(self):
+        """Returns a key shared by every kingdom that is a rotation or reflection of this one.
+        Those kingdoms all score the same, so caches can store one entry for all 8."""
+        return canonical_key(*self.encode_kingdom())
 
     def score_board(self, center_kingdom = False, full_kingdom = False):
         """return the score of the board. Scoring works as follows:
 
         Count up connected regions. Multiply the number of tiles in a connected region
         by the number of crowns in that regions.
-        Review the Breadth/Depth searches from the wildfire simulation.
 
-        TODO: Optional Scoring
         Optional:   Score 10 points if your castle is in the center.
                     Score 5 points if your 5x5 grid contains no empty spaces.
+
+        The territories are tracked as tiles are placed (see Territories),
+        so this doesn't need to search the board.
+        """
+        score = dict(self.territories.scores)
+        score["empty_spaces"] = self.bits.empty_spaces()
+        return self._add_bonuses(score, center_kingdom, full_kingdom)
+
+    def rescore_board(self, center_kingdom = False, full_kingdom = False):
+        """Scores the board from scratch with a flood fill, and returns the same thing as score_board.
+        This is much slower, but doesn't rely on the running totals.
         """
         score = dict.fromkeys(Tiles.SQUARESET, 0)
         score["empty_spaces"] = -1
@@ -359,9 +963,12 @@ class Board(Grid):
             territory_score = num_connected * crowns
             score[terrain] += territory_score
 
-        #add bonus points (if enabled)
+        return self._add_bonuses(score, center_kingdom, full_kingdom)
+
+    def _add_bonuses(self, score, center_kingdom, full_kingdom):
+        """Helper function for score_board. Adds the optional bonuses, then returns (total_score, score)"""
         if center_kingdom:
-            if self.get_cell_terrain(self.grid_center[0],self.grid_center[1]) == 'wild':
+            if self.bits.wild & self.bits.bit(*self._stored(*self.grid_center)):
                 score["centered"] = 10
             else:
                 score["centered"] = 0
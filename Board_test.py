@@ -66,6 +66,76 @@ class TestBoard(unittest.TestCase):
         self.assertEqual(0, b.is_empty(1, 3), "Now should look like a cross")
         self.assertEqual(1, b.is_empty(3, 0), "Slid that boy off the lid")
 
+    def test_fixed_frame(self):
+        for n in range(20):
+            shifting, fixed = Board(), Board(fixed_frame=True)
+            stored = []
+            for t in Deck().deck[:12]:
+                options = list(shifting.legal_placements(t))
+                self.assertEqual(sorted(options), sorted(fixed.legal_placements(t)))
+                if not options:
+                    continue
+                col, row, direction = options[(n * 7) % len(options)]
+                t.set_direction(direction)
+                shifting.place_tile(col, row, t)
+                stored.append((fixed._stored(col, row), t.get_square1()))
+                fixed.place_tile(col, row, t)
+                self.assertEqual(list(shifting), list(fixed))
+                self.assertEqual(shifting.edges, fixed.edges)
+                self.assertEqual(shifting.score_board(True, True), fixed.score_board(True, True))
+                self.assertEqual(fixed.score_board(True, True), fixed.rescore_board(True, True))
+            # Nothing stored has moved since it was placed
+            for (col, row), square in stored:
+                self.assertIs(fixed.grid[row][col], square)
+
+    def test_zobrist(self):
+        d = Deck()
+        for n in range(10):
+            b, fixed = Board(), Board(fixed_frame=True)
+            hashes, placements = [b.zobrist], []
+            for t in d.deck[:12]:
+                options = list(b.legal_placements(t))
+                if options:
+                    col, row, direction = options[(n * 3) % len(options)]
+                    t.set_direction(direction)
+                    placements.append(b.place_tile(col, row, t))
+                    fixed.place_tile(col, row, t)
+                    self.assertEqual(b.zobrist, fixed.zobrist, "Centering doesn't change the hash")
+                    hashes.append(b.zobrist)
+            self.assertEqual(len(set(hashes)), len(hashes))
+            while placements:
+                hashes.pop()
+                b.undo(placements.pop())
+                self.assertEqual(b.zobrist, hashes[-1])
+            d.shuffle()
+        self.assertEqual(b.zobrist, 0)
+
+    def test_canonical_key(self):
+        d = Deck()
+        transforms = [lambda x, y: (x, y), lambda x, y: (-y, x), lambda x, y: (-x, -y), lambda x, y: (y, -x),
+                      lambda x, y: (-x, y), lambda x, y: (y, x), lambda x, y: (x, -y), lambda x, y: (-y, -x)]
+        keys = set()
+        for n in range(10):
+            b = Board()
+            for t in d.deck[:6]:
+                options = list(b.legal_placements(t))
+                if options:
+                    col, row, direction = options[(n * 5) % len(options)]
+                    t.set_direction(direction)
+                    b.place_tile(col, row, t)
+            castle_col, castle_row = [(col, row) for col, row, value in b if value == 'wild'][0]
+            for transform in transforms:
+                copy = Board(fixed_frame=True)  # Leaves room to set cells left of or above the view
+                for col, row, value in b:
+                    if value and value != 'wild':
+                        x, y = transform(col - castle_col, row - castle_row)
+                        copy.set_cell(3 + x, 3 + y, value)
+                self.assertEqual(copy.canonical_key(), b.canonical_key())
+                self.assertEqual(copy.territories.scores, b.territories.scores)
+            keys.add(b.canonical_key())
+            d.shuffle()
+        self.assertEqual(len(keys), 10, "Different kingdoms have different keys")
+
     def test_set_tile(self):
         # TODO rewrite these tests to account and check for the _center method.
         b = Board()
@@ -88,10 +158,123 @@ class TestBoard(unittest.TestCase):
         b.place_tile(3, 3, t2)
         b.place_tile(0, 3, t2)
 
+    def test_bitboard_mirrors_grid(self):
+        b = Board()
+        d = Deck()
+        d.shuffle()
+        for t in d.deck:
+            for col, row, _ in b:
+                if b.place_tile(col, row, t):
+                    break
+        for col, row, value in b:
+            self.assertEqual(b.bits.is_occupied(col, row), not b.is_empty(col, row))
+            terrain = b.get_cell_terrain(col, row)
+            if terrain and terrain != "wild":
+                self.assertTrue(b.bits.terrain[terrain] & b.bits.bit(col, row))
+                self.assertTrue(b.bits.crowns[value.get_crowns()] & b.bits.bit(col, row))
+        self.assertEqual(b.bits.width_with(), b.get_width_used())
+        self.assertEqual(b.bits.height_with(), b.get_height_used())
+
+    def test_square_off_grid(self):
+        b = Board()
+        self.assertEqual(b.is_square_invalid(7, 3, Square("grass", 0)), 3, "Off the grid")
+        self.assertEqual(b.is_square_invalid(-1, 3, Square("grass", 0)), 3, "Off the grid")
+
+    def test_legal_placements(self):
+        d = Deck()
+        for n in range(20):
+            b = Board()
+            for t in d.deck[:2 * n % 13]:
+                placements = list(b.legal_placements(t))
+                brute_force = []
+                for direction in Board.OFFSETS:
+                    t.set_direction(direction)
+                    for col, row, _ in b:
+                        if b.is_tile_valid(col, row, t):
+                            brute_force.append((col, row, direction))
+                self.assertEqual(sorted(placements), sorted(brute_force))
+                self.assertEqual(b.has_legal_placement(t), int(bool(brute_force)))
+                if placements:
+                    col, row, direction = placements[(n * 7) % len(placements)]
+                    t.set_direction(direction)
+                    self.assertTrue(b.place_tile(col, row, t))
+            d.shuffle()
+
+    def test_undo(self):
+        for n in range(20):
+            b = Board()
+            placements, snapshots = [], []
+            for t in Deck().deck[:12]:
+                options = list(b.legal_placements(t))
+                if not options:
+                    continue
+                snapshots.append(([list(r) for r in b.grid], dict(b.edges), list(b.offset), b.score_board()))
+                col, row, direction = options[(n * 11) % len(options)]
+                t.set_direction(direction)
+                placements.append(b.place_tile(col, row, t))
+            while placements:
+                b.undo(placements.pop())
+                grid, edges, offset, score = snapshots.pop()
+                self.assertEqual(b.grid, grid)
+                self.assertEqual(b.edges, edges)
+                self.assertEqual(b.offset, offset)
+                self.assertEqual(b.score_board(), score)
+            fresh = Board()
+            self.assertEqual(b.bits.occupied, fresh.bits.occupied)
+            self.assertEqual((b.bits.used_cols, b.bits.used_rows), (fresh.bits.used_cols, fresh.bits.used_rows))
+
+    def test_placement_gain(self):
+        #The gain of every legal placement matches placing the tile and scoring the board
+        for n in range(10):
+            b, d = Board(), Deck()
+            d.shuffle()
+            for t in d.deck[:12]:
+                before = b.score_board()[0]
+                for placement in list(b.legal_placements(t)):
+                    gain = b.placement_gain(*placement, t)
+                    t.set_direction(placement[2])
+                    record = b.place_tile(placement[0], placement[1], t)
+                    self.assertEqual(gain, b.score_board()[0] - before, placement)
+                    b.undo(record)
+                options = list(b.legal_placements(t))
+                if options:
+                    col, row, direction = options[n % len(options)]
+                    t.set_direction(direction)
+                    b.place_tile(col, row, t)
+
     def test_score_board(self):
-        pass
-        # TODO create some sample complete (or incomplete) boards
-        # pickle them, so I don't need to recreate it every time.
-        # Then, calculate the score by hand.
+        b = Board()
+        b.set_cell(2, 3, Square("grass", 1))
+        b.set_cell(1, 3, Square("grass", 0))
+        b.set_cell(3, 2, Square("wheat", 0))
+        b.set_cell(3, 1, Square("wheat", 1))
+        b.set_cell(2, 2, Square("wheat", 0))
+        b.set_cell(4, 3, Square("mine", 2))
+        total, score = b.score_board(center_kingdom=True, full_kingdom=True)
+        self.assertEqual(score["grass"], 2 * 1)
+        self.assertEqual(score["wheat"], 3 * 1)
+        self.assertEqual(score["mine"], 1 * 2)
+        self.assertEqual(score["empty_spaces"], 25 - 6 - 1)
+        self.assertEqual(score["centered"], 10)
+        self.assertEqual(score["full_kingdom"], 0)
+        self.assertEqual(total, 2 + 3 + 2 + 10)
+        self.assertEqual(b.score_board(True, True), b.rescore_board(True, True))
+
+        # Without the modifiers, there's no bonus
+        total, score = b.score_board()
+        self.assertNotIn("centered", score)
+        self.assertNotIn("full_kingdom", score)
+        self.assertEqual(total, 2 + 3 + 2)
 
-        #With the modifier, and without
\ No newline at end of file
+    def test_score_board_matches_rescore(self):
+        for n in range(30):
+            b = Board()
+            d = Deck()
+            for t in d.deck:
+                placements = list(b.legal_placements(t))
+                if placements:
+                    col, row, direction = placements[(n * 5) % len(placements)]
+                    t.set_direction(direction)
+                    b.place_tile(col, row, t)
+                self.assertEqual(b.score_board(), b.rescore_board())
+            self.assertEqual(b.score_board(True, True), b.rescore_board(True, True))
\ No newline at end of file
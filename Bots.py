@@ -0,0 +1,147 @@
+"""
+Computer players for PrinceDomino.
+
+Every strategy makes the two decisions of a turn (see Strategy), given the Game.
+play_game runs a whole game between strategies, with no input or output.
+"""
+import random
+
+import Search
+
+
+class Strategy:
+    """The decisions a player makes in a turn. Subclasses fill in both methods.
+
+    choose_placement(game) - returns where to put the current tile, as a (col, row, direction) tuple
+                             from Board.legal_placements, or None to pass.
+    choose_tile(game)      - returns the number (from 1) of the future market tile to claim.
+
+    Both are only called when it's the player's turn, and when there is something to decide:
+    a current tile to place, or a future market to choose from.
+    """
+
+    def __init__(self, seed = None):
+        """seed makes the strategy's choices the same every time. Strategies that choose nothing at random ignore it."""
+
+    def choose_placement(self, game):
+        raise NotImplementedError
+
+    def choose_tile(self, game):
+        raise NotImplementedError
+
+    def close(self):
+        """Lets go of anything the strategy holds on to between games (like a pool of processes)."""
+
+    @staticmethod
+    def free_tiles(game):
+        """Returns the numbers (from 1) of the future market tiles nobody has claimed yet."""
+        return [n + 1 for n, piece in enumerate(game.table.future_player_pieces) if not piece]
+
+
+class RandomBot(Strategy):
+    """Places its tile, and claims a new one, at random."""
+
+    def __init__(self, seed = None):
+        self.rng = random.Random(seed)
+
+    def choose_placement(self, game):
+        placements = list(game.get_current_player().board.legal_placements(game.get_current_tile()))
+        if not placements:
+            return None
+        return self.rng.choice(placements)
+
+    def choose_tile(self, game):
+        return self.rng.choice(self.free_tiles(game))
+
+
+class GreedyBot(Strategy):
+    """Places its tile wherever it raises its score the most,
+    and claims the tile that would raise its score the most if it were placed right now.
+
+    Placements are scored with Board.placement_gain, so nothing is placed and taken back.
+    Ties go to the first placement found, and to the lowest numbered tile (which picks first next round).
+    It has nothing random about it, so it ignores the seed.
+    """
+
+    @staticmethod
+    def best_placement(board, tile):
+        """Returns (gain, placement) for the best placement of tile on board, or (None, None) if there isn't one."""
+        best_gain, best = None, None
+        for placement in board.legal_placements(tile):
+            gain = board.placement_gain(*placement, tile)
+            if best_gain is None or gain > best_gain:
+                best_gain, best = gain, placement
+        return best_gain, best
+
+    def choose_placement(self, game):
+        return self.best_placement(game.get_current_player().board, game.get_current_tile())[1]
+
+    def choose_tile(self, game):
+        board = game.get_current_player().board
+        best_value, best = None, None
+        for n in self.free_tiles(game):
+            gain = self.best_placement(board, game.table.future_market[n - 1])[0]
+            value = -1 if gain is None else gain  # A tile that won't fit is worth less than one that scores nothing
+            if best_value is None or value > best_value:
+                best_value, best = value, n
+        return best
+
+
+class MCTSBot(Strategy):
+    """Chooses its moves with Monte Carlo tree search (see Search.MCTS), spending up to seconds on each decision.
+    If playouts is given, each decision also stops after that many playouts.
+    After each decision, self.search.report says how many playouts it ran, and how fast.
+
+    If endgame is True, once every tile has been dealt the bot plays the exact solution instead
+    (see Search.solve_endgame).
+
+    With more than one worker, each decision is searched on that many processes at once (see Search.ParallelMCTS).
+    Call close when done with the bot, to stop them.
+    """
+
+    def __init__(self, seed = None, seconds = 0.5, playouts = None, exploration = 1.0, endgame = True, workers = 1):
+        if seconds is None and playouts is None:
+            raise ValueError("An MCTSBot needs a limit on each decision: seconds, playouts, or both")
+        self.seconds, self.playouts, self.endgame = seconds, playouts, endgame
+        if workers > 1:
+            self.search = Search.ParallelMCTS(workers, exploration, seed)
+        else:
+            self.search = Search.MCTS(exploration, seed)
+
+    def close(self):
+        if isinstance(self.search, Search.ParallelMCTS):
+            self.search.close()
+
+    def choose_placement(self, game):
+        return self._choose(game, Search.PLACE)
+
+    def choose_tile(self, game):
+        return self._choose(game, Search.DRAFT)
+
+    def _choose(self, game, phase):
+        if self.endgame and not len(game.table.deck):
+            score, line = Search.solve_endgame(game, phase)
+            return line[0][2]
+        return self.search.search(game, phase, self.seconds, self.playouts)
+
+
+# Bots by name, for choosing them on the command line.
+STRATEGIES = {"random": RandomBot, "greedy": GreedyBot, "mcts": MCTSBot}
+
+
+def play_game(game, bots):
+    """Plays game to the end. bots is a list with a Strategy for each player, in the order of game.players.
+    Returns the final scores, as from Game.score_boards.
+    """
+    while True:
+        player = game.get_current_player()
+        bot = bots[player.id]
+        if game.get_current_tile():
+            placed, message = game.place_current_tile(bot.choose_placement(game))
+            if not placed:
+                raise ValueError(f"{player.handle}'s bot made an invalid placement: {message}")
+        if game.table.future_market[0]:
+            if not game.try_to_choose_new_tile(bot.choose_tile(game)):
+                raise ValueError(f"{player.handle}'s bot chose a tile that was already taken")
+        if not game.next_turn():
+            return game.score_boards()
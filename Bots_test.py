@@ -0,0 +1,60 @@
+import unittest
+
+import Bots
+from Game import Game
+
+
+class TestBots(unittest.TestCase):
+
+    def test_strategy(self):
+        with self.assertRaises(NotImplementedError):
+            Bots.Strategy().choose_placement(None)
+        for name, strategy in Bots.STRATEGIES.items():
+            self.assertTrue(issubclass(strategy, Bots.Strategy), name)
+
+    def test_play_game(self):
+        for name, strategy in Bots.STRATEGIES.items():
+            game = Game(["A", "B", "C"], deck_type = 0, seed = 5)
+            options = {"playouts": 5} if strategy is Bots.MCTSBot else {}
+            scores = Bots.play_game(game, [strategy(seed = n, **options) for n in range(3)])
+            self.assertFalse(game.game_is_not_over)
+            self.assertEqual(set(scores), set(game.players))
+
+    def test_greedy_placement(self):
+        #The greedy bot's placement scores at least as much as any other
+        game = Game(["A", "B"], deck_type = 0, seed = 2)
+        bots = [Bots.GreedyBot(), Bots.GreedyBot()]
+        while game.game_is_not_over:
+            tile, board = game.get_current_tile(), game.get_current_player().board
+            if tile:
+                placement = bots[0].choose_placement(game)
+                gains = [board.placement_gain(*option, tile) for option in board.legal_placements(tile)]
+                if placement:
+                    self.assertEqual(board.placement_gain(*placement, tile), max(gains))
+                else:
+                    self.assertEqual(gains, [])
+                game.place_current_tile(placement)
+            if game.table.future_market[0]:
+                self.assertTrue(game.try_to_choose_new_tile(bots[0].choose_tile(game)))
+            game.next_turn()
+
+    def test_greedy_beats_random(self):
+        greedy = 0
+        for seed in range(10):
+            game = Game(["greedy", "random"], deck_type = 0, seed = seed)
+            scores = Bots.play_game(game, [Bots.GreedyBot(), Bots.RandomBot(seed)])
+            greedy += scores[game.players[0]][0] > scores[game.players[1]][0]
+        self.assertGreaterEqual(greedy, 7)
+
+    def test_mcts_beats_random(self):
+        mcts = 0
+        for seed in range(3):
+            game = Game(["mcts", "random"], deck_type = 0, seed = seed)
+            scores = Bots.play_game(game, [Bots.MCTSBot(seed, seconds = None, playouts = 25), Bots.RandomBot(seed)])
+            mcts += scores[game.players[0]][0] > scores[game.players[1]][0]
+        self.assertGreaterEqual(mcts, 2)
+        self.assertRaises(ValueError, Bots.MCTSBot, seconds = None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,41 @@
-import copy
 import Board
 import Tiles
 import random
+from array import array
+from collections import namedtuple
+
+# Everything needed to play a game over again: how it was set up, and every move made (see encode_move).
+MoveLog = namedtuple("MoveLog", ["players", "deck_type", "center_kingdom", "full_kingdom", "grid_size", "seed", "moves"])
+
+# Moves are logged as small integers:
+#   PASS                        passing on placing the tile
+#   1 to 15                     claiming that future market tile
+#   PLACED + (row, col, direction index)   placing the tile, as 16 + ((row << 4 | col) << 2 | direction index)
+PASS = 0
+PLACED = 16
+
+
+def encode_move(move):
+    """Returns the code of a move: None (a pass), a future market tile number, or a (col, row, direction) placement."""
+    if move is None:
+        return PASS
+    if isinstance(move, int):
+        assert 1 <= move < PLACED, f"{move} is not a tile number"
+        return move
+    col, row, direction = move
+    assert 0 <= col < 16 and 0 <= row < 16, f"{move} is off the board"
+    return PLACED + (((row << 4) | col) << 2 | Tiles.DIRECTIONS.index(direction))
+
+
+def decode_move(code):
+    """Returns the move for a code from encode_move."""
+    if code == PASS:
+        return None
+    if code < PLACED:
+        return code
+    cell, direction = divmod(code - PLACED, 4)
+    row, col = divmod(cell, 16)
+    return col, row, Tiles.DIRECTIONS[direction]
 
 
 class Game:
@@ -9,8 +43,25 @@ class Game:
     It has various functions that allow for manipulating the game state.
 
     Player names and boards are stored in Player objects,
-    while cards in play and turn order are stored in a Table object."""
-    def __init__(self, players: list, deck_type = 1, center_kingdom = False, full_kingdom = False, grid_size = 5):
+    while cards in play and turn order are stored in a Table object.
+
+    Everything belongs to the Game instance (its players, its random number generator, and its table),
+    and a Game never reads input or prints. Messages for the players are added to self.messages instead.
+    So any number of games can run in one process, one after another or side by side."""
+    def __init__(self, players: list, deck_type = 1, center_kingdom = False, full_kingdom = False, grid_size = 5,
+                 seed = None):
+        """players is a list of player names. If seed is given, the game is dealt and ordered the same way every time.
+        (Otherwise, a seed is picked at random. Either way, it is kept in self.seed)"""
+
+        self.messages = []
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(64)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.deck_type, self.grid_size = deck_type, grid_size
+        # Every move made, as codes (see encode_move). A new Game always has a log. Games built another way,
+        # like those from Save.loads or GameState.to_game, weren't played from the start, so theirs is None.
+        self.moves = array("H")
 
         self.player_count = len(players)
 
@@ -18,13 +69,13 @@ class Game:
         if self.num_player_pieces == 2:
             self.num_player_pieces *= 2
 
-        for name in players:
-            Player(name, grid_size = grid_size) #default game is 5x5 grid
+        #default game is 5x5 grid
+        self.players = [Player(name, grid_size = grid_size, id = n) for n, name in enumerate(players)]
 
         self.center_kingdom, self.full_kingdom = center_kingdom, full_kingdom
 
-        deck = Tiles.Deck(deck_type)
-        deck.shuffle()#deck_type is 1 (standard) by default
+        deck = Tiles.Deck(deck_type, rng = self.rng)
+        deck.shuffle(self.rng)#deck_type is 1 (standard) by default
 
         #Each round (except for round 0), a player places a tile on their board.
         #Thus, the size of the player's board (and how many tiles would fit on it)
@@ -45,21 +96,21 @@ class Game:
 
         #Remove excess tiles from the deck
         excess_tiles = len(deck) - tiles_needed_in_deck
-        self.discard = deck.deal_tile(excess_tiles)
-        print(f"Removing {excess_tiles} tiles for a {self.player_count}-player game, "
-              f"leaving {len(deck)} in the deck")
+        self.discard = deck.discard(excess_tiles) # The discarded tiles' codes (see Tiles.encode_tile)
+        self.messages.append(f"Removing {excess_tiles} tiles for a {self.player_count}-player game, "
+                             f"leaving {len(deck)} in the deck")
 
         #set up the table
         self.table = Table(deck, self.num_player_pieces)
         self.table.advance_tiles()
         # Randomize the player order for the first turn.
         # If 2 players, each player gets 2 turns in snake formation. This is a house rule but I like it.
-        self.table.current_player_pieces = Player.random_order(snake = Player.player_count == 2)
+        self.table.current_player_pieces = self.random_order(snake = self.player_count == 2)
 
         self.game_is_not_over = 1
 
         #These parameters allow for undoing a turn
-        self.temp_board = None
+        self.turn_placement = None
         self.temp_future_player_pieces = None
         self.create_save_point()
 
@@ -70,6 +121,57 @@ class Game:
         return playstate + "\n"
 
 
+    def clone(self):
+        """Returns an independent copy of the game, for trying moves out (such as in a search).
+        The copy's boards, table, deck and random number generator are its own, and it starts with no messages.
+        """
+        new = Game.__new__(Game)
+        new.__dict__.update(self.__dict__)
+        new.messages = []
+        if self.moves is not None:
+            new.moves = array("H", self.moves)
+        new.rng = random.Random()
+        new.rng.setstate(self.rng.getstate())
+        new.players = [Player(player.handle, player.board.copy(), id = player.id) for player in self.players]
+        new.table = self.table.copy(new.players)
+        if self.temp_future_player_pieces is not None:
+            new.temp_future_player_pieces = tuple(piece and new.players[piece.id]
+                                                  for piece in self.temp_future_player_pieces)
+        return new
+
+    def move_log(self):
+        """Returns the game's MoveLog, which Replay can play back."""
+        if self.moves is None:
+            raise ValueError("This game wasn't played from the start, so it has no move log")
+        return MoveLog(tuple(player.handle for player in self.players), self.deck_type, self.center_kingdom,
+                       self.full_kingdom, self.grid_size, self.seed, array("H", self.moves))
+
+    def _log(self, move):
+        if self.moves is not None:
+            self.moves.append(encode_move(move))
+
+    def get_all_players(self):
+        """Returns a list of all player objects"""
+        return list(self.players)
+
+    def get_player(self, id):
+        "returns a player specified by their ID"
+        return self.players[id]
+
+    def random_order(self, snake = False):
+        """ Returns a list of players in a random order.
+        If Snake is True, appends a reversed copy of the list to itself before returning.
+        Eg, for players A, B, C, it might return [C, A, B, B, A, C]
+        This is useful for "snake drafts."
+        """
+        random_order = self.get_all_players()
+        self.rng.shuffle(random_order)
+        if snake:
+            reverse_order = list(random_order)
+            reverse_order.reverse()
+            random_order += reverse_order #For two players, the order is a "snake." Either 0110, or 1001
+        return random_order
+
     def get_current_player(self):
         """Return's the player whose turn it is.
         """
@@ -95,6 +197,7 @@ class Game:
             # the player successfully chooses the tile
             future_order[tile_id-1] = self.get_current_player()
             self.table.future_player_pieces = tuple(future_order)
+            self._log(tile_id)
             return 1
         else:
             return 0
@@ -118,10 +221,11 @@ class Game:
 
         # Pass Handling
         elif player_input == "P":
-            # Passing (if valid) advances the game state.
-            return (1, "You have passed on placing your tile. (This should only be allowed if you have no valid moves, "
-                       "but that check has not yet been implemented.)")
-            #todo implement passing, don't just allow it whenever
+            # Passing is only allowed when the tile can't be placed anywhere.
+            if current_player.board.has_legal_placement(current_tile):
+                return (0, "You can only pass if there is nowhere to place your tile.")
+            self._log(None)
+            return (1, "You have passed on placing your tile.")
 
         col, row = player_input[:1], player_input[1:]
 
@@ -129,13 +233,33 @@ class Game:
         mssg = current_player.board.message
 
         if tile_valid:
-            current_player.board.place_tile(col, row, current_tile, True)
+            self.turn_placement = current_player.board.place_tile(col, row, current_tile, True)
+            self._log(self.turn_placement.cells[0] + (current_tile.get_direction(),))
             return (1, "")
         elif not tile_valid:
             return (0, f"\n'{player_input}' not valid: {mssg}")
 
+    def place_current_tile(self, placement, checked = False):
+        """Handler for the tile-placement phase of a turn, for players that aren't typing chess coordinates.
+        placement is a (col, row, direction) tuple, as from Board.legal_placements, or None to pass.
+        If checked is True, the placement is known to be legal, and isn't checked again (see Board.place_tile).
+
+        Returns (n, Message), exactly like try_to_place_tile.
+        """
+        if placement is None:
+            return self.try_to_place_tile("P")
+        col, row, direction = placement
+        current_tile, board = self.get_current_tile(), self.get_current_player().board
+        current_tile.set_direction(direction)
+        self.turn_placement = board.place_tile(col, row, current_tile, checked = checked)
+        if self.turn_placement:
+            self._log(placement)
+            return (1, "")
+        return (0, f"\n'{placement}' not valid: {board.message}")
+
     def create_save_point(self):
-        """When called at the start of a turn, creates a copy of the current player's board and the future market.
+        """When called at the start of a turn, remembers the future market selections,
+        and clears the record of this turn's tile placement (which try_to_place_tile fills in).
         These can be used to revert the game state, or 'undo' the current player's turn.
 
         WARNING: This does not create a complete copy of the Game, and can not be used to create an arbitrary save point.
@@ -143,20 +267,24 @@ class Game:
         """
         if self.game_is_not_over == 0:
             return
-        current_player = self.get_current_player()
-        if current_player:
-            self.temp_board = copy.deepcopy(current_player.board)
+        self.turn_placement = None
         self.temp_future_player_pieces = self.table.future_player_pieces
+        self.turn_moves = len(self.moves) if self.moves is not None else 0
         return
 
     def revert_to_save_point(self):
         """Resets the game state to where it was at the start of the turn.
+        The tile placement is taken back with Board.undo, rather than by copying the board.
 
         WARNING: This can only revert to the start of a turn, and only if create_save_point was called.
         The scope is limited to a player's current turn.
         """
-        self.get_current_player().set_board(copy.deepcopy(self.temp_board))
+        if self.turn_placement:
+            self.get_current_player().board.undo(self.turn_placement)
+            self.turn_placement = None
         self.table.future_player_pieces = self.temp_future_player_pieces
+        if self.moves is not None:
+            del self.moves[self.turn_moves:]
         return
 
 
@@ -176,7 +304,7 @@ class Game:
         """
         self.current_round += 1
         if self.current_round == self.number_of_rounds:
-            print("This is the start of the last round")
+            self.messages.append("This is the start of the last round")
         if self.current_round > self.number_of_rounds:
             self.game_is_not_over = 0
             return
@@ -193,26 +321,20 @@ class Game:
         Where Player is a Player object, total score is an int, and score_details is another dictionary.
         """
         scores = {}
-        for player in Player.get_all_players():
+        for player in self.players:
             score = player.board.score_board(self.center_kingdom, self.full_kingdom)
             scores[player] = score
         return scores
 
 
 class Player:
-    """Container for a player's name and board,
-    with several class methods for accessing all players.
+    """Container for a player's name and board.
+    Players belong to a Game, which numbers them from 0 (their id).
     """
-    #The class keeps a dictionary of all players to their boards.
-    players = {}
-    player_count = 0
 
-    def __init__(self, player_name, board = None, grid_size = 5):
-        #Each player has a unique id.
+    def __init__(self, player_name, board = None, grid_size = 5, id = 0):
         self.handle = player_name
-        self.id = Player.player_count
-        Player.player_count += 1
-        Player.players[self.id] = self
+        self.id = id
 
         #You can assign a player a board. Otherwise, they are given a new one
         if board:
@@ -221,50 +343,11 @@ class Player:
         else:
             self.board = Board.Board(grid_size, grid_size)
 
-    @classmethod
-    def get_all_players(cls):
-        """Returns a list of all player objects"""
-        all_players = []
-        for player_obj in cls.players.values():
-            all_players.append(player_obj)
-        return all_players
-
-    @classmethod
-    def get_player(cls, id):
-        "returns a player specified by their ID"
-        return cls.players[id]
-
-    @classmethod
-    def random_order(cls, snake = False):
-        """ Returns a list of players in a random order.
-        If Snake is True, appends a reversed copy of the list to itself before returning.
-        Eg, for players A, B, C, it might return [C, A, B, B, A, C]
-        This is useful for "snake drafts."
-        """
-        random_order = cls.get_all_players()
-        random.shuffle(random_order)
-        if snake:
-            reverse_order = list(random_order)
-            reverse_order.reverse()
-            random_order += reverse_order #For two players, the order is a "snake." Either 0110, or 1001
-        return random_order
-
-    @classmethod
-    def get_player_count(cls):
-        return cls.player_count
-
-
     def set_board(self, new_board):
         """Given a Board object as input, assigns that board to the player."""
         if type(new_board) == Board.Board:
             self.board = new_board
 
-    def new_game(self):
-        """If I add the ability to play multiple games in a row
-        I might need to purge the Player class to prevent 'ghost' players
-        """
-        pass
-
 
 class Table:
     """A container for:
@@ -290,6 +373,18 @@ class Table:
         return playstate + "\n"
 
 
+    def copy(self, players):
+        """Returns a copy of the table, with its own deck and tiles.
+        players is the list of Players the copy's player pieces should point to (looked up by id)."""
+        new = Table.__new__(Table)
+        new.__dict__.update(self.__dict__)
+        new.deck = self.deck.copy()
+        new.current_market = tuple(tile and tile.copy() for tile in self.current_market)
+        new.future_market = tuple(tile and tile.copy() for tile in self.future_market)
+        new.current_player_pieces = tuple(piece and players[piece.id] for piece in self.current_player_pieces)
+        new.future_player_pieces = tuple(piece and players[piece.id] for piece in self.future_player_pieces)
+        return new
+
     def advance_tiles(self, last_round = 0):
         """ Advances the board state for the next round.
 
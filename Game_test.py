@@ -0,0 +1,58 @@
+import contextlib
+import io
+import unittest
+
+from Game import Game
+
+
+def play_randomly(game):
+    """Plays a game to the end, taking the first legal placement and the first free tile each turn."""
+    while True:
+        tile, board = game.get_current_tile(), game.get_current_player().board
+        if tile:
+            placement = next(board.legal_placements(tile), None)
+            if placement:
+                col, row, direction = placement
+                tile.set_direction(direction)
+                board.place_tile(col, row, tile)
+        if game.table.future_market[0]:
+            game.try_to_choose_new_tile(game.table.future_player_pieces.index(None) + 1)
+        if not game.next_turn():
+            return game.score_boards()
+
+
+class TestGame(unittest.TestCase):
+    def test_games_are_independent(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            first = Game(["A", "B", "C"], deck_type=0, seed=1)
+            second = Game(["D", "E"], deck_type=0, seed=2)
+            scores = play_randomly(first)
+        self.assertEqual(output.getvalue(), "", "Games don't print")
+        self.assertEqual([p.handle for p in scores], ["A", "B", "C"])
+        self.assertEqual(sorted(p.handle for p in second.table.current_player_pieces), ["D", "D", "E", "E"])
+        self.assertTrue(first.messages)
+
+    def test_seeded_games_repeat(self):
+        results = []
+        for n in range(2):
+            game = Game(["A", "B", "C", "D"], deck_type=0, seed=42)
+            order = [p.handle for p in game.table.current_player_pieces]
+            scores = play_randomly(game)
+            results.append((order, [score[0] for score in scores.values()]))
+        self.assertEqual(results[0], results[1])
+
+    def test_clone(self):
+        game = Game(["A", "B", "C"], deck_type=0, seed=7)
+        game.try_to_choose_new_tile(1)
+        game.next_turn()
+        copy = game.clone()
+        self.assertIs(copy.table.future_player_pieces[0], copy.players[game.table.future_player_pieces[0].id])
+        before = ([[list(r) for r in p.board.grid] for p in game.players], game.table.deck.remaining_codes(),
+                  game.rng.getstate())
+        copy_scores = play_randomly(copy)
+        self.assertEqual(([[list(r) for r in p.board.grid] for p in game.players],
+                          game.table.deck.remaining_codes(), game.rng.getstate()), before,
+                         "Playing the copy out doesn't touch the original")
+        self.assertEqual([s[0] for s in copy_scores.values()], [s[0] for s in play_randomly(game).values()],
+                         "The copy plays out exactly like the original")
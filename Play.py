@@ -1,6 +1,7 @@
 from dataclasses import field
 from time import time_ns
 
+import Bots
 import Game
 import traceback
 import Tiles
@@ -25,6 +26,8 @@ class Play:
         self.temp_messages = ["Welcome to PrinceDomino!","I have a few quick questions, then you can play!"]
         # self.temp_messages are displayed just before self.message, and clear after they are seen.
 
+        self.strategies = {} # The Strategy playing for each computer player, by player id
+
         self.setup = True
         self.game = self.gather_starting_information()
         self.setup = False
@@ -53,10 +56,16 @@ class Play:
         self.message = "How many players?"
         player_count = self._ask_for_input_integer("(2-4)", 2, 4)
 
+        self.message = "How many of them should be computer players?"
+        bot_count = self._ask_for_input_integer(f"(0-{player_count})", 0, player_count)
+
         self.message = "How should I call you?"
         player_names=[]
-        for player in range(player_count):
+        for player in range(player_count - bot_count):
             player_names.append(self._ask_for_input_string(f"Player {player + 1}:", default=f"Player {player + 1}"))
+        for bot in range(bot_count):
+            self.strategies[len(player_names)] = Bots.GreedyBot()
+            player_names.append(f"Bot {bot + 1}")
 
         self.message = "Would you like to see the additional scoring options? (By default, not enabled)"
         opt_scoring = self._ask_for_input_string("(Y/N)", permitted_strings=["y","Y","n","N"], default = "N")
@@ -90,6 +99,8 @@ class Play:
     def take_a_turn(self):
         """In a turn, the current player places the current tile, chooses a new one, and then has the option to undo."""
         current_player = self.game.get_current_player()
+        if current_player.id in self.strategies:
+            return self.take_a_computer_turn(current_player)
 
         self.message = f"Ok {current_player.handle}, where/how would you like to place {self.game.get_current_tile()} in your grid?"
         self.place_current_tile(current_player)
@@ -106,6 +117,23 @@ class Play:
             self.take_a_turn()
         return 1
 
+    def take_a_computer_turn(self, current_player):
+        """The current player's Strategy makes both decisions of the turn. There's no undo."""
+        strategy = self.strategies[current_player.id]
+        current_tile = self.game.get_current_tile()
+        if current_tile:
+            placement = strategy.choose_placement(self.game)
+            self.game.place_current_tile(placement)
+            if placement:
+                self.temp_messages.append(f"{current_player.handle} placed {current_tile}.")
+            else:
+                self.temp_messages.append(f"{current_player.handle} passed on placing {current_tile}.")
+        if self.game.table.future_market[0]:
+            selection = strategy.choose_tile(self.game)
+            self.game.try_to_choose_new_tile(selection)
+            self.temp_messages.append(f"{current_player.handle} chose tile {selection} from the Future Market.")
+        return 1
+
     def place_current_tile(self, current_player):
         """Prompts the current player on the tile placement part of their turn.
         Then passes the player input to game.try_to_place_tile.
@@ -243,6 +271,10 @@ class Play:
         game_visualization = "\n"
         # Show the round, turn, and player's name
         if not self.setup: # Only show this info if the setup is complete
+            # Pass along any messages from the game
+            self.temp_messages += self.game.messages
+            self.game.messages.clear()
+
             current_player = self.game.get_current_player()
             game_visualization += "{0:^80}".format(f"{current_player.handle}'s Turn "
                                                    f"(Round {self.game.current_round }/{self.game.number_of_rounds}, "
@@ -0,0 +1,172 @@
+"""
+Plays logged games back (see Game.MoveLog), with no input or output.
+
+    replay(log)              the Game at the end of the log (or after any number of its moves)
+    verify(log)              replays a log, checking every move, and returns the final scores
+    verify_many(logs)        verifies many logs, spread over a pool of processes
+    Replayer(log)            jumps back and forth through one game, from snapshots taken along the way
+
+Logs can be stored as bytes with dumps_log and loads_log.
+"""
+import multiprocessing
+import os
+import struct
+import sys
+from array import array
+
+import Game
+import Search
+from State import GameState
+
+LOG_MAGIC = b"PDLOG1"
+_LOG_HEADER = struct.Struct("<6sBBBQH")  # magic, flags, grid size, deck type, seed, number of moves
+MAX_GRID_SIZE = 14  # Moves keep a column and a row of the view (grid size + 2) in 4 bits each
+
+
+def _apply(game, phase, code, index):
+    """Makes logged move number index (a code) on game, at phase. Returns the next phase.
+    Raises ValueError if the move isn't allowed."""
+    if phase is None:
+        raise ValueError(f"Move {index} was made after the game was over")
+    move = Game.decode_move(code)
+    if phase == Search.PLACE:
+        if isinstance(move, int):
+            raise ValueError(f"Move {index} claims a tile, but a tile has to be placed")
+        placed, message = game.place_current_tile(move)
+        if not placed:
+            raise ValueError(f"Move {index} can't be made: {message.strip()}")
+        return Search.next_decision(game, Search.DRAFT)
+    if not isinstance(move, int):
+        raise ValueError(f"Move {index} places a tile, but a tile has to be claimed")
+    if not 1 <= move <= game.num_player_pieces or not game.try_to_choose_new_tile(move):
+        raise ValueError(f"Move {index} claims tile {move}, which can't be claimed")
+    game.next_turn()
+    return Search.next_decision(game, Search.PLACE)
+
+
+def new_game(log):
+    """Returns the game in the log, as it was set up (before any moves)."""
+    return Game.Game(list(log.players), log.deck_type, log.center_kingdom, log.full_kingdom, log.grid_size, log.seed)
+
+
+def replay(log, moves = None):
+    """Returns the Game after the first moves moves of log (all of them by default)."""
+    game = new_game(log)
+    phase = Search.next_decision(game)
+    for index, code in enumerate(log.moves[:moves]):
+        phase = _apply(game, phase, code, index)
+    return game
+
+
+def verify(log):
+    """Replays every move in log, checking each is allowed and that the game ends.
+    Returns each player's final total score, in player order. Raises ValueError for a bad log."""
+    game = replay(log)
+    if game.game_is_not_over:
+        raise ValueError(f"The log stops after {len(log.moves)} moves, before the game is over")
+    return [player.board.score_board(game.center_kingdom, game.full_kingdom)[0] for player in game.players]
+
+
+def _verify_job(data):
+    """Verifies one log, returning what's wrong with it instead of raising, so one bad log can't stop a batch."""
+    try:
+        return verify(loads_log(data))
+    except ValueError as error:
+        return error
+    except Exception as error:
+        return ValueError(f"The log can't be replayed: {error!r}")
+
+
+def verify_many(logs, workers = None):
+    """Verifies many logs (each a MoveLog, or bytes from dumps_log) on a pool of workers processes.
+    Yields the result for each log, in order: its final scores, or the ValueError explaining what's wrong with it."""
+    jobs = (log if isinstance(log, bytes) else dumps_log(log) for log in logs)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield from map(_verify_job, jobs)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap(_verify_job, jobs, chunksize = 64)
+
+
+class Replayer:
+    """Moves through one logged game, to the position after any number of moves.
+
+    Every interval moves, a snapshot of the game (a GameState) is kept as the game is played through,
+    so seeking only has to fast-forward from the nearest snapshot before the move wanted.
+    """
+
+    def __init__(self, log, interval = 16):
+        self.log = log
+        self.interval = interval
+        game = new_game(log)
+        self.snapshots = {0: GameState.from_game(game, Search.next_decision(game))}
+        # The move number each turn starts at, by (round, turn), as far as the game has been played through
+        self.turn_starts = {(game.current_round, game.current_turn): 0}
+
+    def __len__(self):
+        return len(self.log.moves)
+
+    def game_at(self, moves):
+        """Returns the Game after the first moves moves. It can be played on without affecting the Replayer,
+        and its move log carries on from the one being replayed."""
+        if not 0 <= moves <= len(self.log.moves):
+            raise IndexError(f"The log has {len(self.log.moves)} moves")
+        start = max(index for index in self.snapshots if index <= moves)
+        state = self.snapshots[start]
+        game, phase = state.to_game(), state.phase
+        game.deck_type = self.log.deck_type
+        for index in range(start, moves):
+            phase = _apply(game, phase, self.log.moves[index], index)
+            self.turn_starts.setdefault((game.current_round, game.current_turn), index + 1)
+            if (index + 1) % self.interval == 0 and index + 1 not in self.snapshots:
+                self.snapshots[index + 1] = GameState.from_game(game, phase)
+        game.moves = array("H", self.log.moves[:moves])
+        game.create_save_point()
+        return game
+
+    def game_at_turn(self, round, turn):
+        """Returns the Game at the start of turn number turn (from 0) of round number round (from 0)."""
+        if (round, turn) not in self.turn_starts:
+            self.game_at(len(self.log.moves))
+        if (round, turn) not in self.turn_starts:
+            raise IndexError(f"Round {round} turn {turn} isn't in the log")
+        return self.game_at(self.turn_starts[(round, turn)])
+
+
+def dumps_log(log):
+    """Returns log as bytes: a small header, the players' names, then two bytes a move."""
+    flags = bool(log.center_kingdom) | bool(log.full_kingdom) << 1
+    names = b"".join(bytes((len(name),)) + name for name in (player.encode("utf-8") for player in log.players))
+    header = _LOG_HEADER.pack(LOG_MAGIC, flags, log.grid_size, int(log.deck_type), log.seed, len(log.moves))
+    moves = array("H", log.moves)
+    if sys.byteorder == "big":
+        moves.byteswap()  # Saved little-endian, like everything else
+    return header + bytes((len(log.players),)) + names + moves.tobytes()
+
+
+def loads_log(data):
+    """Returns the MoveLog in data, from dumps_log. Raises ValueError if data isn't a move log, or is damaged."""
+    if len(data) < _LOG_HEADER.size + 1:
+        raise ValueError("Not a PrinceDomino move log: too short")
+    magic, flags, grid_size, deck_type, seed, count = _LOG_HEADER.unpack_from(data)
+    if magic != LOG_MAGIC:
+        raise ValueError("Not a PrinceDomino move log")
+    player_count = data[_LOG_HEADER.size]
+    if flags > 3 or deck_type > 1 or not 1 <= grid_size <= MAX_GRID_SIZE or not 2 <= player_count <= 4:
+        raise ValueError(f"Damaged PrinceDomino move log: flags {flags}, deck type {deck_type}, "
+                         f"grid size {grid_size}, {player_count} players")
+    at = _LOG_HEADER.size + 1
+    players = []
+    for n in range(player_count):
+        if at >= len(data) or at + 1 + data[at] > len(data):
+            raise ValueError("Damaged PrinceDomino move log: the players' names are cut short")
+        players.append(bytes(data[at + 1:at + 1 + data[at]]).decode("utf-8"))
+        at += 1 + data[at]
+    moves = array("H")
+    moves.frombytes(bytes(data[at:at + 2 * count]))
+    if len(moves) != count:
+        raise ValueError("The move log is cut short")
+    if sys.byteorder == "big":
+        moves.byteswap()
+    return Game.MoveLog(tuple(players), deck_type, bool(flags & 1), bool(flags & 2), grid_size, seed, moves)
@@ -0,0 +1,97 @@
+import random
+import unittest
+
+import Bots
+import Replay
+import Search
+from Game import Game, decode_move, encode_move
+from State import GameState
+
+
+def logged_game(players = 3, seed = 1, moves = None):
+    """Plays a game between random bots (stopping after moves moves, if given). Returns the game and its phase."""
+    game = Game([f"P{n}" for n in range(players)], deck_type = 0, full_kingdom = True, seed = seed)
+    bot = Bots.RandomBot(seed)
+    phase, count = Search.next_decision(game), 0
+    while phase is not None and count != moves:
+        action = bot.choose_placement(game) if phase == Search.PLACE else bot.choose_tile(game)
+        phase = Search.apply_action(game, phase, action)
+        count += 1
+    return game, phase
+
+
+class TestReplay(unittest.TestCase):
+
+    def test_move_codes(self):
+        for move in (None, 1, 4, (0, 0, "left"), (6, 3, "down"), (8, 8, "up")):
+            self.assertEqual(decode_move(encode_move(move)), move)
+
+    def test_replay(self):
+        for players in (2, 3, 4):
+            game, phase = logged_game(players, seed = players)
+            log = game.move_log()
+            self.assertEqual(Replay.verify(log), [p.board.score_board(False, True)[0] for p in game.players])
+            replayed = Replay.replay(log)
+            self.assertEqual(GameState.from_game(replayed, None).key(), GameState.from_game(game, None).key())
+            self.assertEqual(Replay.loads_log(Replay.dumps_log(log)), log)
+
+    def test_replayer(self):
+        game, phase = logged_game(4, seed = 7)
+        log = game.move_log()
+        replayer = Replay.Replayer(log, interval = 10)
+        for moves in (len(log.moves), 0, 33, 5, 60, 61, len(log.moves)):
+            expected, expected_phase = logged_game(4, seed = 7, moves = moves)
+            sought = replayer.game_at(moves)
+            self.assertEqual(GameState.from_game(sought, expected_phase).key(),
+                             GameState.from_game(expected, expected_phase).key(), moves)
+            self.assertEqual(sought.moves.tolist(), log.moves[:moves].tolist())
+        self.assertEqual(sorted(replayer.snapshots), list(range(0, len(log.moves) + 1, 10)))
+
+        sought = replayer.game_at_turn(3, 2)
+        self.assertEqual((sought.current_round, sought.current_turn), (3, 2))
+        self.assertRaises(IndexError, replayer.game_at_turn, 99, 0)
+
+    def test_bad_logs(self):
+        game, phase = logged_game(3, seed = 2)
+        log = game.move_log()
+        self.assertRaises(ValueError, Replay.verify, log._replace(moves = log.moves[:-1]))
+        moves = log.moves[:]
+        moves[0] = encode_move((3, 3, "left"))  # The first move is a draft
+        self.assertRaises(ValueError, Replay.verify, log._replace(moves = moves))
+        results = list(Replay.verify_many([log, log._replace(moves = moves)], workers = 2))
+        self.assertEqual(results[0], Replay.verify(log))
+        self.assertIsInstance(results[1], ValueError)
+
+    def test_damaged_logs(self):
+        game, phase = logged_game(3, seed = 2)
+        data = Replay.dumps_log(game.move_log())
+        self.assertRaises(ValueError, Replay.loads_log, data[:10])
+        bad_grid = bytearray(data)
+        bad_grid[7] = 200  # The grid size
+        self.assertRaises(ValueError, Replay.loads_log, bytes(bad_grid))
+
+        rng = random.Random(3)
+        damaged = []
+        for n in range(300):
+            log = bytearray(data)
+            if n % 3 == 0:
+                log = log[:rng.randrange(len(log))]
+            else:
+                log[rng.randrange(len(log))] = rng.randrange(256)
+            damaged.append(bytes(log))
+        results = list(Replay.verify_many(damaged + [data], workers = 1))
+        self.assertEqual(len(results), 301, "Every log gets a result, however damaged the others are")
+        self.assertTrue(all(isinstance(result, (list, ValueError)) for result in results))
+        self.assertEqual(results[-1], Replay.verify(game.move_log()))
+
+    def test_undo(self):
+        game = Game(["A", "B"], deck_type = 0, seed = 3)
+        game.try_to_choose_new_tile(2)
+        game.next_turn()
+        game.try_to_choose_new_tile(1)
+        game.revert_to_save_point()
+        self.assertEqual(game.moves.tolist(), [2], "Undoing a turn takes its moves out of the log")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+"""
+Saving and loading games of PrinceDomino, in a small versioned binary format.
+
+A save holds everything needed to carry on the game: the players, each board's kingdom
+(just its bounding box, one byte per cell, as from Board.encode_kingdom), the Table's markets and
+player pieces, the deck's remaining order, the discard, and the round and turn.
+A 4-player game takes a few hundred bytes.
+
+Games are saved between turns (the way Game.next_turn leaves them). A turn in progress can't be saved:
+dumps raises ValueError for a game that has placed or claimed a tile this turn (see between_turns).
+
+The format, all little-endian:
+    header      MAGIC, VERSION, flags, player count, player pieces, rounds, current round, current turn,
+                grid size, seed (8 bytes)
+    names       for each player: length (1 byte), then the name in UTF-8
+    boards      for each player: left, right, top, bottom, offset col, offset row (1 byte each),
+                then a byte for each cell of the kingdom, row by row (see Board.encode_kingdom)
+    table       current market, future market (3 bytes a tile code, see Tiles.encode_tile),
+                current pieces, future pieces (1 byte a player id, NO_PLAYER for none)
+    deck        count (1 byte), then 3 bytes a tile code, top of the deck last
+    discard     count (1 byte), then 3 bytes a tile code
+    rng         only if the EXACT_RNG flag is set: the random number generator's whole state
+
+The game only draws random numbers while it is set up, so by default the generator isn't saved,
+and a loaded game gets a new one from the seed. Pass exact_rng = True to save it exactly (2.5 KB more).
+"""
+import os
+import random
+import struct
+import tempfile
+
+import Board
+import Game
+import Tiles
+
+MAGIC = b"PDSAVE"
+VERSION = 1
+# Flags
+CENTER_KINGDOM, FULL_KINGDOM, GAME_OVER, EXACT_RNG = 1, 2, 4, 8
+
+NO_PLAYER = 255
+CODE_BYTES = 3  # Tile codes fit in 21 bits
+
+_HEADER = struct.Struct("<6sBBBBBBBBQ")
+_BOARD = struct.Struct("<BBBBbb")
+_RNG = struct.Struct("<625IBd")  # The Mersenne Twister's state, then whether there's a gauss_next, and its value
+
+
+def dumps(game, exact_rng = False):
+    """Returns game saved as bytes. Raises ValueError if game can't be saved (see between_turns)."""
+    if not between_turns(game):
+        raise ValueError("A game partway through a turn can't be saved: finish the turn, or take it back")
+    if not isinstance(game.seed, int) or not 0 <= game.seed < 1 << 64:
+        raise ValueError("Only games with an integer seed from 0 to 2**64 - 1 can be saved")
+    flags = (CENTER_KINGDOM * bool(game.center_kingdom) | FULL_KINGDOM * bool(game.full_kingdom)
+             | GAME_OVER * (not game.game_is_not_over) | EXACT_RNG * bool(exact_rng))
+    grid_size = game.players[0].board.grid_width - 2
+    parts = [_HEADER.pack(MAGIC, VERSION, flags, game.player_count, game.num_player_pieces, game.number_of_rounds,
+                          game.current_round, game.current_turn, grid_size, game.seed)]
+
+    for player in game.players:
+        name = player.handle.encode("utf-8")
+        parts.append(bytes((len(name),)) + name)
+
+    for player in game.players:
+        board = player.board
+        height, width, codes = board.encode_kingdom()
+        edges = board.edges
+        parts.append(_BOARD.pack(edges["left"], edges["right"], edges["top"], edges["bottom"], *board.offset))
+        parts.append(bytes(codes))
+
+    table = game.table
+    parts.append(_pack_codes(Tiles.encode_tile(tile) if tile else Tiles.NO_TILE for tile in table.current_market))
+    parts.append(_pack_codes(Tiles.encode_tile(tile) if tile else Tiles.NO_TILE for tile in table.future_market))
+    parts.append(bytes(piece.id if piece else NO_PLAYER for piece in table.current_player_pieces))
+    parts.append(bytes(piece.id if piece else NO_PLAYER for piece in table.future_player_pieces))
+
+    for codes in (table.deck.remaining_codes(), game.discard):
+        parts.append(bytes((len(codes),)))
+        parts.append(_pack_codes(codes))
+
+    if exact_rng:
+        version, state, gauss_next = game.rng.getstate()
+        parts.append(_RNG.pack(*state, gauss_next is not None, gauss_next or 0.0))
+    return b"".join(parts)
+
+
+def between_turns(game):
+    """Whether game is between turns, so a save can hold it: the current player hasn't placed or claimed
+    a tile yet this turn (since Game.create_save_point), or the game is over."""
+    return not game.game_is_not_over or (game.turn_placement is None and
+                                         game.table.future_player_pieces == game.temp_future_player_pieces)
+
+
+def loads(data):
+    """Returns the Game saved in data (from dumps). Raises ValueError if data isn't a save this version can read."""
+    data = memoryview(data)
+    if len(data) < _HEADER.size:
+        raise ValueError("Not a PrinceDomino save: too short")
+    (magic, version, flags, player_count, num_player_pieces, number_of_rounds,
+     current_round, current_turn, grid_size, seed) = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a PrinceDomino save")
+    if version != VERSION:
+        raise ValueError(f"Can't read version {version} saves (only version {VERSION})")
+
+    try:
+        at = _HEADER.size
+        names = []
+        for n in range(player_count):
+            length = data[at]
+            names.append(bytes(data[at + 1:at + 1 + length]).decode("utf-8"))
+            at += 1 + length
+
+        players = []
+        for n, name in enumerate(names):
+            left, right, top, bottom, offset_col, offset_row = _BOARD.unpack_from(data, at)
+            at += _BOARD.size
+            cells = (right - left + 1) * (bottom - top + 1)
+            for code in data[at:at + cells]:
+                if code > 1 and not Tiles.is_square_code(*divmod(code - 2, 4)):
+                    raise ValueError(f"Damaged PrinceDomino save: {name}'s kingdom has a square with code {code}")
+            board = Board.Board(grid_size, grid_size)
+            board.restore_kingdom({"left": left, "right": right, "top": top, "bottom": bottom},
+                                  (offset_col, offset_row), data[at:at + cells])
+            at += cells
+            players.append(Game.Player(name, board, grid_size, id = n))
+
+        current_market, at = _unpack_tiles(data, at, num_player_pieces)
+        future_market, at = _unpack_tiles(data, at, num_player_pieces)
+        current_pieces = tuple(players[n] if n != NO_PLAYER else None for n in data[at:at + num_player_pieces])
+        at += num_player_pieces
+        future_pieces = tuple(players[n] if n != NO_PLAYER else None for n in data[at:at + num_player_pieces])
+        at += num_player_pieces
+
+        deck_codes, at = _unpack_codes(data, at + 1, data[at])
+        discard, at = _unpack_codes(data, at + 1, data[at])
+
+        rng = random.Random(seed)
+        if flags & EXACT_RNG:
+            *state, has_gauss, gauss_next = _RNG.unpack_from(data, at)
+            rng.setstate((3, tuple(state), gauss_next if has_gauss else None))
+    except (IndexError, struct.error) as error:
+        raise ValueError(f"Damaged PrinceDomino save: {error}")
+
+    game = Game.Game.__new__(Game.Game)
+    game.messages = []
+    game.seed, game.rng = seed, rng
+    game.player_count, game.num_player_pieces = player_count, num_player_pieces
+    game.players = players
+    game.center_kingdom, game.full_kingdom = bool(flags & CENTER_KINGDOM), bool(flags & FULL_KINGDOM)
+    game.number_of_rounds, game.current_round, game.current_turn = number_of_rounds, current_round, current_turn
+    game.discard = tuple(discard)
+    game.table = Game.Table(Tiles.Deck.from_codes(deck_codes), num_player_pieces)
+    game.table.current_market, game.table.future_market = current_market, future_market
+    game.table.current_player_pieces, game.table.future_player_pieces = current_pieces, future_pieces
+    game.game_is_not_over = 0 if flags & GAME_OVER else 1
+    game.turn_placement = None
+    game.temp_future_player_pieces = future_pieces
+    game.deck_type, game.grid_size = None, grid_size  # (The deck's type isn't saved, only its tiles)
+    game.moves, game.turn_moves = None, 0  # A loaded game has no log of the moves before it was saved
+    return game
+
+
+def save_game(game, path, exact_rng = False):
+    """Saves game to the file at path. The file is replaced all at once, so it is never left half-written."""
+    write_file(path, dumps(game, exact_rng))
+
+
+def write_file(path, data, sync = True):
+    """Replaces the file at path with data, all at once. With sync, the data is on disk before this returns."""
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(dir = directory, prefix = ".save-")
+    try:
+        with os.fdopen(handle, "wb") as file:
+            file.write(data)
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def load_game(path):
+    """Returns the Game saved in the file at path."""
+    with open(path, "rb") as file:
+        return loads(file.read())
+
+
+def _pack_codes(codes):
+    return b"".join(code.to_bytes(CODE_BYTES, "little") for code in codes)
+
+
+def _unpack_codes(data, at, count):
+    end = at + count * CODE_BYTES
+    if end > len(data):
+        raise IndexError("tile codes run past the end")
+    codes = [int.from_bytes(data[n:n + CODE_BYTES], "little") for n in range(at, end, CODE_BYTES)]
+    for code in codes:
+        if not Tiles.is_tile_code(code):
+            raise ValueError(f"Damaged PrinceDomino save: {code} isn't a tile code")
+    return codes, end
+
+
+def _unpack_tiles(data, at, count):
+    codes, at = _unpack_codes(data, at, count)
+    return tuple(Tiles.decode_tile(code) for code in codes), at
@@ -0,0 +1,120 @@
+import os
+import random
+import tempfile
+import unittest
+
+import Save
+import Search
+import Tiles
+from Game import Game
+from State import GameState
+
+
+def play_some(game, moves, seed = 0):
+    """Plays moves random moves, then finishes the turn. Returns the next phase."""
+    rng = random.Random(seed)
+    phase = Search.next_decision(game)
+    for n in range(moves):
+        if phase is None:
+            break
+        phase = Search.apply_action(game, phase, rng.choice(Search.legal_actions(game, phase)))
+    while phase == Search.DRAFT:
+        phase = Search.apply_action(game, phase, Search.legal_actions(game, phase)[0])
+    return phase
+
+
+class TestSave(unittest.TestCase):
+
+    def test_round_trip(self):
+        for players, moves in ((2, 0), (3, 17), (4, 40), (4, 200)):
+            game = Game([f"Player {n}" for n in range(players)], deck_type = 0, center_kingdom = True,
+                        seed = players * 1000 + moves)
+            phase = play_some(game, moves)
+            data = Save.dumps(game)
+            self.assertLess(len(data), 500)
+            loaded = Save.loads(data)
+            self.assertEqual(GameState.from_game(loaded, phase).key(), GameState.from_game(game, phase).key())
+            self.assertEqual([p.handle for p in loaded.players], [p.handle for p in game.players])
+            self.assertEqual(loaded.table.deck.remaining_codes(), game.table.deck.remaining_codes())
+            self.assertEqual(loaded.discard, game.discard)
+            self.assertEqual(loaded.game_is_not_over, game.game_is_not_over)
+            for mine, theirs in zip(loaded.players, game.players):
+                self.assertEqual(mine.board.score_board(True), theirs.board.score_board(True))
+                self.assertEqual(mine.board.zobrist, theirs.board.zobrist)
+            self.assertEqual(Save.dumps(loaded), data)
+
+            #The loaded game plays on exactly like the original
+            while phase is not None:
+                action = Search.legal_actions(game, phase)[0]
+                self.assertEqual(Search.legal_actions(loaded, phase)[0], action)
+                Search.apply_action(loaded, phase, action)
+                phase = Search.apply_action(game, phase, action)
+            self.assertEqual([p.board.score_board()[0] for p in loaded.players],
+                             [p.board.score_board()[0] for p in game.players])
+
+    def test_exact_rng(self):
+        game = Game(["A", "B"], deck_type = 0, seed = 11)
+        game.rng.random()
+        loaded = Save.loads(Save.dumps(game, exact_rng = True))
+        self.assertEqual(loaded.rng.getstate(), game.rng.getstate())
+
+    def test_file(self):
+        game = Game(["A", "B", "C"], deck_type = 0, seed = 12)
+        play_some(game, 20)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "game.save")
+            with open(path, "wb") as file:
+                file.write(b"an older save")
+            Save.save_game(game, path)
+            self.assertEqual(os.listdir(directory), ["game.save"], "No temporary file is left behind")
+            self.assertEqual(Save.dumps(Save.load_game(path)), Save.dumps(game))
+
+    def test_bad_data(self):
+        data = Save.dumps(Game(["A", "B"], deck_type = 0, seed = 1))
+        self.assertRaises(ValueError, Save.loads, b"PDTILES1" + data[8:])
+        self.assertRaises(ValueError, Save.loads, data[:6] + bytes((Save.VERSION + 1,)) + data[7:])
+        self.assertRaises(ValueError, Save.loads, data[:40])
+        self.assertRaises(ValueError, Save.dumps, Game(["A", "B"], deck_type = 0, seed = "a string"))
+
+    def test_mid_turn(self):
+        """A game partway through a turn can't be saved, and can be once the turn is finished or taken back."""
+        game = Game(["A", "B", "C"], deck_type = 0, seed = 13)
+        self.assertEqual(Search.next_decision(game), Search.DRAFT)  # (Round 0 only has claims)
+        self.assertTrue(Save.between_turns(game))
+        game.try_to_choose_new_tile(2)
+        self.assertRaises(ValueError, Save.dumps, game)
+        game.revert_to_save_point()
+        Save.dumps(game)
+
+        phase = play_some(game, 10)
+        phase = Search.apply_action(game, phase, Search.legal_actions(game, phase)[0])
+        self.assertEqual(phase, Search.DRAFT)
+        self.assertFalse(Save.between_turns(game))
+        self.assertRaises(ValueError, Save.dumps, game)
+        Search.apply_action(game, phase, Search.legal_actions(game, phase)[0])
+        self.assertEqual(Save.loads(Save.dumps(game)).current_turn, game.current_turn)
+
+    def test_corrupted_codes(self):
+        data = bytearray(Save.dumps(Game(["A", "B"], deck_type = 0, seed = 1)))
+        castle = Save._HEADER.size + 4 + Save._BOARD.size  # A's kingdom is just the castle, for now
+        market = castle + 1 + Save._BOARD.size + 1
+        bad_square = bytearray(data)
+        bad_square[castle] = 2 + 4 * Tiles.TERRAINS.index("wheat") + 3  # Wheat never has 3 crowns
+        self.assertRaises(ValueError, Save.loads, bytes(bad_square))
+        bad_tile = bytearray(data)
+        bad_tile[market:market + Save.CODE_BYTES] = (7).to_bytes(Save.CODE_BYTES, "little")  # There's no terrain 7
+        self.assertRaises(ValueError, Save.loads, bytes(bad_tile))
+
+        rng = random.Random(2)
+        for n in range(2000):
+            damaged = bytearray(data)
+            for m in range(rng.randint(1, 4)):
+                damaged[rng.randrange(len(damaged))] = rng.randrange(256)
+            try:
+                Save.loads(bytes(damaged))
+            except ValueError:
+                pass  # Anything else is a bug
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,472 @@
+"""
+Tools shared by the PrinceDomino search bots.
+
+Searches step through a game one decision at a time. A decision is made in a phase:
+    PLACE - the current player places the current tile. The actions are the placements from
+            Board.legal_placements, or just None (a pass) if there are none.
+    DRAFT - the current player claims a future market tile. The actions are the free tile numbers (from 1).
+next_decision skips over the steps where there is nothing to decide, and apply_action makes a move.
+"""
+import math
+import multiprocessing
+import os
+import random
+import time
+from collections import OrderedDict, namedtuple
+
+import Tiles
+
+# A stored evaluation. flag says whether value is exact, or only a "lower" or "upper" bound
+# (as happens when an alpha-beta search cuts off), and depth is how deep the search behind it went.
+Entry = namedtuple("Entry", ["key", "value", "depth", "flag", "move"])
+
+
+class TranspositionTable:
+    """A bounded cache of position evaluations, keyed by an integer hash
+    (such as Board.zobrist, or several of them combined).
+
+    When the table is full, one of two eviction policies decides what is kept:
+        "depth" - the table is a fixed array of slots, indexed by key. A new entry only replaces
+                  the one in its slot if it was searched at least as deeply (or the slot is for the same key).
+        "lru"   - the table keeps the most recently used entries, and drops the least recently used.
+    """
+
+    def __init__(self, capacity = 1 << 16, policy = "depth"):
+        if policy not in ("depth", "lru"):
+            raise ValueError(f"Unknown eviction policy '{policy}'. Use 'depth' or 'lru'.")
+        self.capacity = capacity
+        self.policy = policy
+        self.hits, self.misses = 0, 0
+        if policy == "depth":
+            self.slots = [None] * capacity
+        else:
+            self.entries = OrderedDict()
+
+    def __len__(self):
+        if self.policy == "depth":
+            return sum(1 for entry in self.slots if entry is not None)
+        return len(self.entries)
+
+    def get(self, key, depth = 0):
+        """Returns the Entry for key, if it was searched to at least depth. Otherwise, returns None."""
+        if self.policy == "depth":
+            entry = self.slots[key % self.capacity]
+            if entry is not None and entry.key != key:
+                entry = None
+        else:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+
+        if entry is None or entry.depth < depth:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, value, depth = 0, flag = "exact", move = None):
+        """Stores an evaluation of key. Returns 1 if it was kept, or 0 if the policy turned it away."""
+        entry = Entry(key, value, depth, flag, move)
+        if self.policy == "depth":
+            index = key % self.capacity
+            current = self.slots[index]
+            if current is not None and current.key != key and current.depth > depth:
+                return 0
+            self.slots[index] = entry
+            return 1
+
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        return 1
+
+    def clear(self):
+        self.hits, self.misses = 0, 0
+        if self.policy == "depth":
+            self.slots = [None] * self.capacity
+        else:
+            self.entries.clear()
+
+
+PLACE, DRAFT = "place", "draft"
+
+
+def next_decision(game, phase = PLACE):
+    """Moves game on to the next decision, starting from phase of the current turn.
+    Returns the phase of that decision, or None if the game is over."""
+    while game.game_is_not_over:
+        if phase == PLACE:
+            if game.get_current_tile():
+                return PLACE
+            phase = DRAFT  # (There's no tile to place in the first round)
+        if game.table.future_market[0]:
+            return DRAFT
+        game.next_turn()  # (There's nothing to draft in the last round)
+        phase = PLACE
+    return None
+
+
+def legal_actions(game, phase):
+    """Returns the list of actions open to the current player in phase."""
+    if phase == PLACE:
+        return list(game.get_current_player().board.legal_placements(game.get_current_tile())) or [None]
+    return [n + 1 for n, piece in enumerate(game.table.future_player_pieces) if not piece]
+
+
+def apply_action(game, phase, action):
+    """Makes the current player's move, then returns the phase of the next decision (see next_decision)."""
+    if phase == PLACE:
+        game.place_current_tile(action, checked = True)
+        return next_decision(game, DRAFT)
+    game.try_to_choose_new_tile(action)
+    game.next_turn()
+    return next_decision(game, PLACE)
+
+
+def state_key(game, phase):
+    """Returns a hashable key for the position at a decision. Positions with the same key have the same actions."""
+    return (game.current_round, game.current_turn, phase,
+            tuple((player.board.zobrist, tuple(player.board.offset)) for player in game.players),
+            tuple(tile and tile.face for tile in game.table.current_market),
+            tuple(tile and tile.face for tile in game.table.future_market),
+            tuple(piece and piece.id for piece in game.table.current_player_pieces),
+            tuple(piece and piece.id for piece in game.table.future_player_pieces))
+
+
+def outcome(game):
+    """Returns each player's share of the win (by player id). Tied winners split it."""
+    totals = [game.players[n].board.score_board(game.center_kingdom, game.full_kingdom)[0]
+              for n in range(len(game.players))]
+    best = max(totals)
+    winners = totals.count(best)
+    return [1 / winners if total == best else 0.0 for total in totals]
+
+
+def determinize(game, rng):
+    """Returns a copy of game with the tiles nobody has seen yet (the deck and the discard) shuffled together
+    and dealt out again, as a guess at what the hidden order might be."""
+    sample = game.clone()
+    deck = game.table.deck
+    unseen = deck.remaining_codes() + list(game.discard)
+    rng.shuffle(unseen)
+    sample.table.deck = Tiles.Deck.from_codes(unseen[:len(deck)])
+    sample.discard = tuple(unseen[len(deck):])
+    return sample
+
+
+def _check_limits(seconds, playouts):
+    if seconds is None and playouts is None:
+        raise ValueError("A search needs a limit: seconds, playouts, or both")
+
+
+class Node:
+    """A decision in the MCTS tree. stats holds [visits, total reward] for each action that has been tried,
+    where the reward is for the player making the decision. children is keyed by (action, dealt),
+    where dealt is the market dealt by the move (a chance outcome), or None if nothing was dealt."""
+
+    __slots__ = ("key", "player", "phase", "untried", "stats", "children", "visits")
+
+    def __init__(self, game, phase, rng):
+        self.key = state_key(game, phase)
+        self.phase = phase
+        self.visits = 0
+        self.stats = {}
+        self.children = {}
+        if phase is None:
+            self.player, self.untried = None, []
+        else:
+            self.player = game.get_current_player().id
+            self.untried = legal_actions(game, phase)
+            rng.shuffle(self.untried)
+
+
+class MCTS:
+    """Monte Carlo tree search over the decisions of a game, for the current player.
+
+    Every playout starts from a fresh guess at the hidden deck order (see determinize). The tree follows
+    the moves with UCB1, and branches on each newly dealt market like a chance node. A new leaf is played
+    out to the end with random moves, and each player's share of the win is backed up the path.
+
+    The tree is kept between searches. When search is called again later in the same game,
+    the position is looked up among the nodes already grown, and its statistics are reused.
+    """
+
+    def __init__(self, exploration = 1.0, seed = None):
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+        self.root = None
+        # How the last search went: {"playouts", "seconds", "playouts_per_second", "reused"}
+        # (reused is how many playouts had already been through the root)
+        self.report = {}
+
+    def search(self, game, phase, seconds = 1.0, playouts = None):
+        """Searches for up to seconds (of wall-clock time) or playouts playouts, whichever comes first.
+        Returns the most visited action of the current player. Raises ValueError if neither limit is given."""
+        _check_limits(seconds, playouts)
+        root = self._find_root(game, phase)
+        reused = root.visits
+        start = time.perf_counter()
+        deadline = start + seconds if seconds is not None else math.inf
+        count = 0
+        while (playouts is None or count < playouts) and time.perf_counter() < deadline:
+            self.playout(root, determinize(game, self.rng))
+            count += 1
+        elapsed = time.perf_counter() - start
+        self.report = {"playouts": count, "seconds": elapsed,
+                       "playouts_per_second": count / elapsed if elapsed else 0.0, "reused": reused}
+        self.root = root
+        return self.best_action(root)
+
+    def best_action(self, node):
+        if not node.stats:
+            return node.untried[0]
+        return max(node.stats, key = lambda action: node.stats[action][0])
+
+    def _find_root(self, game, phase):
+        """Returns the node for the current position from the last search's tree, or a new node."""
+        key = state_key(game, phase)
+        layer = [self.root] if self.root else []
+        # The position is at most one round of decisions (and chance) below the old root
+        for depth in range(2 * game.num_player_pieces + 2):
+            for node in layer:
+                if node.key == key:
+                    return node
+            layer = [child for node in layer for child in node.children.values()]
+        return Node(game, phase, self.rng)
+
+    def playout(self, root, game):
+        """Runs one playout from root, on game (a determinized copy of root's position), and updates the tree."""
+        node, phase, path = root, root.phase, []
+        while phase is not None:
+            if node.untried:
+                action = node.untried.pop()
+                node.stats[action] = [0, 0.0]
+            else:
+                action = self._select(node)
+            round_before = game.current_round
+            phase = apply_action(game, node.phase, action)
+            path.append((node, action))
+            dealt = None
+            if game.current_round != round_before:
+                dealt = tuple(tile and tile.face for tile in game.table.future_market)
+            child = node.children.get((action, dealt))
+            if child is None:
+                child = node.children[(action, dealt)] = Node(game, phase, self.rng)
+                self._rollout(game, phase)
+                break
+            node = child
+
+        rewards = outcome(game)
+        for node, action in path:
+            node.visits += 1
+            stats = node.stats[action]
+            stats[0] += 1
+            stats[1] += rewards[node.player]
+
+    def _select(self, node):
+        """UCB1, from the point of view of the player making the decision."""
+        log_visits = math.log(node.visits or 1)
+        best, best_value = None, -math.inf
+        for action, (visits, total) in node.stats.items():
+            value = total / visits + self.exploration * math.sqrt(log_visits / visits)
+            if value > best_value:
+                best, best_value = action, value
+        return best
+
+    def _rollout(self, game, phase):
+        """Plays random moves until the game is over."""
+        while phase is not None:
+            phase = apply_action(game, phase, self.rng.choice(legal_actions(game, phase)))
+
+
+# Each worker process of a ParallelMCTS keeps its own tree here, so it can be reused between batches and decisions.
+_worker_search = None
+
+
+def _search_worker(job):
+    """Worker function for ParallelMCTS. job is (game, phase, seconds, playouts, exploration, seed).
+    Returns (stats, report), where stats is {action: (visits, total reward)} for the playouts run by this job."""
+    global _worker_search
+    game, phase, seconds, playouts, exploration, seed = job
+    if _worker_search is None or _worker_search.exploration != exploration:
+        _worker_search = MCTS(exploration)
+    _worker_search.rng.seed(seed)
+    root = _worker_search.root = _worker_search._find_root(game, phase)
+    before = {action: tuple(stats) for action, stats in root.stats.items()}
+    _worker_search.search(game, phase, seconds, playouts)
+    stats = {}
+    for action, (visits, total) in root.stats.items():
+        visits_before, total_before = before.get(action, (0, 0.0))
+        if visits > visits_before:
+            stats[action] = (visits - visits_before, total - total_before)
+    return stats, dict(_worker_search.report, pid = os.getpid())
+
+
+class ParallelMCTS:
+    """Runs one MCTS decision on several processes at once (root parallelization), and adds their results up.
+
+    Each worker grows its own tree from the same position, with its own random numbers, for the whole
+    time budget. The budget is split into batches: after each batch, every worker's visit counts and
+    rewards for the root actions are merged, and the next batch carries on from the workers' trees.
+    The most visited action overall is chosen.
+
+    The pool of processes is started on the first search, and kept until close is called.
+    """
+
+    def __init__(self, workers = None, exploration = 1.0, seed = None, batches = 1):
+        self.workers = workers or os.cpu_count() or 1
+        self.exploration = exploration
+        self.batches = batches
+        self.rng = random.Random(seed)
+        self.pool = None
+        # How the last search went: {"playouts", "seconds", "playouts_per_second", "workers"},
+        # where "workers" has a report for every job run (see MCTS.report), with the pid of the process that ran it
+        self.report = {}
+        # The merged {action: [visits, total reward]} from the last search
+        self.stats = {}
+
+    def search(self, game, phase, seconds = 1.0, playouts = None):
+        """Searches for up to seconds (of wall-clock time), or until each worker has run playouts playouts.
+        Returns the most visited action of the current player. Raises ValueError if neither limit is given."""
+        _check_limits(seconds, playouts)
+        if self.pool is None and self.workers > 1:
+            self.pool = multiprocessing.Pool(self.workers)
+        batch_seconds = seconds / self.batches if seconds is not None else None
+        batch_playouts = -(-playouts // self.batches) if playouts is not None else None
+
+        self.stats, reports = {}, []
+        start = time.perf_counter()
+        for batch in range(self.batches):
+            jobs = [(game, phase, batch_seconds, batch_playouts, self.exploration, self.rng.getrandbits(64))
+                    for worker in range(self.workers)]
+            if self.pool is None:
+                results = map(_search_worker, jobs)
+            else:
+                results = self.pool.imap_unordered(_search_worker, jobs)
+            for stats, report in results:
+                for action, (visits, total) in stats.items():
+                    merged = self.stats.setdefault(action, [0, 0.0])
+                    merged[0] += visits
+                    merged[1] += total
+                reports.append(report)
+        elapsed = time.perf_counter() - start
+
+        count = sum(report["playouts"] for report in reports)
+        self.report = {"playouts": count, "seconds": elapsed,
+                       "playouts_per_second": count / elapsed if elapsed else 0.0, "workers": reports}
+        if not self.stats:
+            return legal_actions(game, phase)[0]
+        return max(self.stats, key = lambda action: self.stats[action][0])
+
+    def close(self):
+        """Shuts the pool of processes down."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+def solve_endgame(game, phase, player = None, table = None):
+    """Exactly solves the rest of the game for one player (by id; the current player by default),
+    once every tile has been dealt (the deck is empty, so every tile still to be placed is on the table).
+
+    The player is assumed to face the worst case: every other player drafts to keep the player's score down.
+    (The others' placements can't change the player's board, so they aren't searched.)
+    The draft is searched with alpha-beta pruning, the player's placements by trying each in turn
+    with Board.place_tile and Board.undo, and positions already solved are looked up in table
+    (a TranspositionTable, or a new one).
+
+    Returns (score, line). score is the final score the player can guarantee, and line is the list of
+    (player id, phase, action) moves that gets it, starting with the current decision. Only the drafts
+    that can change the player's tiles are in the line.
+    """
+    if len(game.table.deck):
+        raise ValueError("The endgame can only be solved once every tile has been dealt")
+    if player is None:
+        player = game.get_current_player().id
+    table = table if table is not None else TranspositionTable(1 << 16, "lru")
+    board = game.players[player].board.copy()
+    market = game.table.future_market
+    claims = [piece and piece.id for piece in game.table.future_player_pieces]
+
+    # The steps left in the game, in order: ("place", tile) for each of the player's own tiles,
+    # and ("draft", player id) for each pick of the future market
+    steps = []
+    for turn in range(game.current_turn, game.num_player_pieces):
+        who, tile = game.table.current_player_pieces[turn], game.table.current_market[turn]
+        if tile and who.id == player and not (turn == game.current_turn and phase == DRAFT):
+            steps.append(("place", tile))
+        if market[0]:
+            steps.append(("draft", who.id))
+    # In the last round, the player places what they drafted (in the order of the market)
+    steps += [("final", slot) for slot in range(len(market)) if market[slot]]
+    drafts_left = [sum(1 for kind, who in steps[n:] if kind == "draft" and who == player)
+                   for n in range(len(steps) + 1)]
+
+    def score():
+        return board.score_board(game.center_kingdom, game.full_kingdom)[0]
+
+    def search(step, alpha, beta):
+        if step == len(steps):
+            return score(), ()
+        kind, detail = steps[step]
+        if kind == "final":
+            if claims[detail] != player:
+                return search(step + 1, alpha, beta)
+            kind, detail = "place", market[detail]
+        if kind == "draft" and detail != player and not drafts_left[step]:
+            # The player has all their tiles, so this pick makes no difference
+            slot = claims.index(None)
+            claims[slot] = detail
+            result = search(step + 1, alpha, beta)
+            claims[slot] = None
+            return result
+
+        key = (step, tuple(claims), board.zobrist, tuple(board.offset))
+        entry = table.get(key)
+        if entry is not None:
+            if entry.flag == "exact" or (entry.flag == "lower" and entry.value >= beta) or \
+                    (entry.flag == "upper" and entry.value <= alpha):
+                return entry.value, entry.move
+        alpha_before = alpha
+
+        if kind == "place":
+            best, best_line = -math.inf, ()
+            tile = detail.copy()
+            placements = sorted(board.legal_placements(tile), key = lambda p: -board.placement_gain(*p, tile))
+            for placement in placements or [None]:
+                if placement is None:
+                    value, line = search(step + 1, alpha, beta)
+                else:
+                    tile.set_direction(placement[2])
+                    record = board.place_tile(placement[0], placement[1], tile, checked = True)
+                    value, line = search(step + 1, alpha, beta)
+                    board.undo(record)
+                if value > best:
+                    best, best_line = value, ((player, PLACE, placement),) + line
+                    alpha = max(alpha, best)
+                if alpha >= beta:
+                    break
+        else:
+            maximizing = detail == player
+            best, best_line = (-math.inf if maximizing else math.inf), ()
+            for slot in [n for n, claim in enumerate(claims) if claim is None]:
+                claims[slot] = detail
+                value, line = search(step + 1, alpha, beta)
+                claims[slot] = None
+                if (value > best) if maximizing else (value < best):
+                    best, best_line = value, ((detail, DRAFT, slot + 1),) + line
+                    if maximizing:
+                        alpha = max(alpha, best)
+                    else:
+                        beta = min(beta, best)
+                if alpha >= beta:
+                    break
+
+        flag = "upper" if best <= alpha_before else "lower" if best >= beta else "exact"
+        table.store(key, best, flag = flag, move = best_line)
+        return best, best_line
+
+    value, line = search(0, -math.inf, math.inf)
+    return value, list(line)
@@ -0,0 +1,142 @@
+import random
+import unittest
+
+import Bots
+import Search
+from Game import Game
+from Search import TranspositionTable
+
+
+class TestTranspositionTable(unittest.TestCase):
+    def test_depth_preferred(self):
+        tt = TranspositionTable(capacity=8, policy="depth")
+        self.assertTrue(tt.store(3, 10, depth=2))
+        self.assertFalse(tt.store(11, 20, depth=1), "A shallower entry doesn't replace a deeper one")
+        self.assertEqual(tt.get(3).value, 10)
+        self.assertIsNone(tt.get(11))
+        self.assertIsNone(tt.get(3, depth=3), "Not searched deeply enough")
+        self.assertTrue(tt.store(11, 20, depth=2))
+        self.assertIsNone(tt.get(3))
+        self.assertEqual(tt.get(11).value, 20)
+
+    def test_lru(self):
+        tt = TranspositionTable(capacity=2, policy="lru")
+        tt.store(1, "a")
+        tt.store(2, "b")
+        tt.get(1)
+        tt.store(3, "c")
+        self.assertIsNone(tt.get(2), "The least recently used entry was dropped")
+        self.assertEqual(tt.get(1).value, "a")
+        self.assertEqual(len(tt), 2)
+
+    def test_bad_policy(self):
+        self.assertRaises(ValueError, TranspositionTable, 8, "random")
+
+
+class TestMCTS(unittest.TestCase):
+    def test_search(self):
+        game = Game(["A", "B", "C"], deck_type = 0, seed = 4)
+        mcts = Search.MCTS(seed = 1)
+        phase = Search.next_decision(game)
+        key = Search.state_key(game, phase)
+        action = mcts.search(game, phase, seconds = None, playouts = 30)
+        self.assertIn(action, Search.legal_actions(game, phase))
+        self.assertEqual(Search.state_key(game, phase), key, "Searching doesn't change the game")
+        self.assertEqual(mcts.report["playouts"], 30)
+        self.assertEqual(mcts.root.visits, 30)
+        self.assertRaises(ValueError, mcts.search, game, phase, seconds = None, playouts = None)
+
+    def test_tree_reuse(self):
+        game = Game(["A", "B"], deck_type = 0, seed = 8)
+        mcts = Search.MCTS(seed = 2)
+        phase = Search.next_decision(game)
+        phase = Search.apply_action(game, phase, mcts.search(game, phase, seconds = None, playouts = 50))
+        mcts.search(game, phase, seconds = None, playouts = 10)
+        self.assertGreater(mcts.report["reused"], 0, "The next decision was already in the tree")
+        self.assertEqual(mcts.root.key, Search.state_key(game, phase))
+
+    def test_determinize(self):
+        game = Game(["A", "B", "C"], deck_type = 0, seed = 6)
+        sample = Search.determinize(game, random.Random(0))
+        unseen = sorted(game.table.deck.remaining_codes() + list(game.discard))
+        self.assertEqual(sorted(sample.table.deck.remaining_codes() + list(sample.discard)), unseen)
+        self.assertEqual(len(sample.table.deck), len(game.table.deck))
+        self.assertEqual(Search.state_key(sample, None), Search.state_key(game, None))
+
+
+def brute_force(game, phase, player):
+    """Plays out every line, with the other players drafting against player (and placing anywhere)."""
+    if phase is None:
+        return game.players[player].board.score_board(game.center_kingdom, game.full_kingdom)[0]
+    who = game.get_current_player().id
+    actions = Search.legal_actions(game, phase)
+    if phase == Search.PLACE and who != player:
+        actions = actions[:1]
+    values = []
+    for action in actions:
+        copy = game.clone()
+        values.append(brute_force(copy, Search.apply_action(copy, phase, action), player))
+    return max(values) if who == player else min(values)
+
+
+def greedy_until_dealt(game, extra_moves = 0):
+    """Plays greedily until the deck is empty, then extra_moves more. Returns the next phase."""
+    bot = Bots.GreedyBot()
+    phase = Search.next_decision(game)
+    while len(game.table.deck) or extra_moves:
+        if not len(game.table.deck):
+            extra_moves -= 1
+        action = bot.choose_placement(game) if phase == Search.PLACE else bot.choose_tile(game)
+        phase = Search.apply_action(game, phase, action)
+    return phase
+
+
+class TestEndgame(unittest.TestCase):
+    def test_matches_brute_force(self):
+        for players, seed, bonuses, extra_moves in ((4, 0, False, 0), (4, 1, True, 3), (3, 2, True, 0),
+                                                    (3, 3, False, 2), (2, 4, False, 1)):
+            game = Game([str(n) for n in range(players)], deck_type = 0, center_kingdom = bonuses,
+                        full_kingdom = bonuses, seed = seed)
+            phase = greedy_until_dealt(game, extra_moves)
+            for player in range(players):
+                score, line = Search.solve_endgame(game, phase, player)
+                self.assertEqual(score, brute_force(game, phase, player), (players, seed, player))
+
+    def test_line(self):
+        #Following the line, with the others drafting as it says, gets the promised score
+        game = Game(["A", "B", "C", "D"], deck_type = 0, seed = 5)
+        phase = greedy_until_dealt(game)
+        player = game.get_current_player().id
+        score, line = Search.solve_endgame(game, phase, player)
+        self.assertEqual(line[0][:2], (player, phase))
+        planned = list(line)
+        while phase is not None:
+            who = game.get_current_player().id
+            if planned and planned[0][:2] == (who, phase):
+                action = planned.pop(0)[2]
+            else:
+                action = Search.legal_actions(game, phase)[0]
+            phase = Search.apply_action(game, phase, action)
+        self.assertEqual(planned, [])
+        self.assertGreaterEqual(game.players[player].board.score_board()[0], score)
+
+    def test_needs_empty_deck(self):
+        game = Game(["A", "B"], deck_type = 0, seed = 1)
+        self.assertRaises(ValueError, Search.solve_endgame, game, Search.next_decision(game))
+
+
+class TestParallelMCTS(unittest.TestCase):
+    def test_merge(self):
+        game = Game(["A", "B", "C"], deck_type = 0, seed = 4)
+        phase = Search.next_decision(game)
+        for workers in (1, 2):
+            search = Search.ParallelMCTS(workers, seed = 3, batches = 2)
+            try:
+                action = search.search(game, phase, seconds = None, playouts = 20)
+            finally:
+                search.close()
+            self.assertIn(action, Search.legal_actions(game, phase))
+            self.assertEqual(len(search.report["workers"]), 2 * workers)
+            self.assertEqual(search.report["playouts"], 2 * workers * 10)
+            self.assertEqual(sum(visits for visits, total in search.stats.values()), search.report["playouts"],
+                             "Every playout is counted once, even though the workers reuse their trees")
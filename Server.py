@@ -0,0 +1,506 @@
+"""
+An asyncio TCP server that hosts many games of PrinceDomino at once, one per table.
+
+    python Server.py --port 8765
+
+Clients send and receive one JSON object per line. Each request has a "type":
+
+    {"type": "create", "seats": ["human", "greedy", ...], "center_kingdom": false, "full_kingdom": false,
+     "seed": 1, "deck": "standard"}
+        Opens a table. Each seat is "human", or the name of a bot from Bots.STRATEGIES.
+        The seed, if there is one, is a whole number from 0 to 2**64 - 1.
+        Replies {"type": "created", "table": id}. A connection can only have a few tables open at once.
+    {"type": "join", "table": id, "seat": n, "name": "Alice"}
+        Takes a human seat (numbered from 0). Replies {"type": "joined", "table": id, "seat": n}.
+        A seat left during the game (by disconnecting) can be taken again, to carry on playing it.
+    {"type": "watch", "table": id}
+        Follows a table without playing.
+    {"type": "place", "table": id, "at": "C3", "direction": "left"}
+        Places the current tile, through Game.try_to_place_tile. "at" is a chess-format coordinate,
+        or "P" to pass. "direction" is optional (the tile is placed the way it's facing without it).
+    {"type": "choose", "table": id, "tile": n}
+        Claims tile n (from 1) of the future market, through Game.try_to_choose_new_tile.
+
+The game starts once every human seat is taken. Each player and watcher at the table is then sent the game's
+state as it changes: a whole "state" to start with, and after every move a "delta" of just what changed
+(see Stream, and Stream.apply to follow one). Watchers who come in late get the latest whole state and the deltas
+since. Mistakes get {"type": "error", "message": ...}.
+
+Everything runs on one event loop, except the bots: their decisions run in an executor,
+so a slow search never holds up the other tables.
+
+Given a Sessions.SessionStore, only the games played most recently are kept in memory.
+The rest are put away on disk, and loaded again when a move comes in for them.
+Tables are closed a while after their game ends, or once nobody has been sitting at them for a while
+(because everyone left, or nobody joined).
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import functools
+import itertools
+import json
+import logging
+import secrets
+
+import Bots
+import Game
+import Search
+import Sessions
+import Stream
+import Tiles
+
+log = logging.getLogger(__name__)
+
+
+class Client:
+    """One connection. Messages are queued on the transport without waiting for them to be sent."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.task = None  # The task reading this client's requests
+        self.seats = {}  # table id: seat number
+        self.tables = set()  # The ids of the tables this client opened that are still open
+
+    def send(self, message):
+        self.write(encode(message))
+
+    def write(self, data):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+
+class Room:
+    """A table: one Game, the seats at it, and whoever is watching."""
+
+    def __init__(self, id, seats, center_kingdom = False, full_kingdom = False, seed = None, deck_type = 1,
+                 store = None, key = None):
+        """With a store, the game is kept in it under key (the id, by default)."""
+        self.id = id
+        self.store = store
+        self.key = key or str(id)
+        self.started = False
+        self.options = (center_kingdom, full_kingdom, seed, deck_type)
+        # A seat holds a Client (or None, until someone joins) for humans, and a Strategy for bots
+        self.bots = {n: Bots.STRATEGIES[kind](seed = f"{seed}:{n}")
+                     for n, kind in enumerate(seats) if kind != "human"}
+        self.humans = {n: None for n, kind in enumerate(seats) if kind == "human"}
+        self.names = [f"{kind.capitalize()} bot {n + 1}" if kind != "human" else None for n, kind in enumerate(seats)]
+        self.watchers = set()
+        self._game = None
+        self.phase = None
+        self.stream = Stream.Stream(id)
+        self.bot_task = None
+        self.creator = None  # The Client that opened the table
+        self.abandoned = None  # The timer to close the table, while nobody is sitting at it
+
+    def start(self):
+        center_kingdom, full_kingdom, seed, deck_type = self.options
+        game = Game.Game(self.names, deck_type, center_kingdom, full_kingdom, seed = seed)
+        self.phase = Search.next_decision(game)
+        if self.store is None:
+            self._game = game
+        else:
+            self.store.put(self.key, game)
+        self.started = True
+
+    @property
+    def game(self):
+        """The table's Game, or None before it starts. With a store, it's fetched from there (see Sessions),
+        so don't hold on to it across an await."""
+        if not self.started:
+            return None
+        if self.store is None:
+            return self._game
+        game = self.store.get(self.key)
+        self.stream.restore(game, self.phase)  # In case the game was put away, and the stream forgotten
+        return game
+
+    def close(self):
+        """Lets go of everything the table holds."""
+        self._game, self.stream, self.bots = None, None, {}
+        self.watchers.clear()
+        self.humans = dict.fromkeys(self.humans)
+        self.started = False
+
+    def seated(self):
+        """Whether anyone is sitting at the table (or there are only bots, who never leave)."""
+        return not self.humans or any(self.humans.values())
+
+    def clients(self):
+        return [client for client in self.humans.values() if client] + list(self.watchers)
+
+    def current_seat(self):
+        if self.phase is None:
+            return None
+        return self.game.get_current_player().id
+
+    def state(self):
+        """The whole public state of the table, as a JSON-ready dictionary (see Stream.keyframe)."""
+        if self.game is None:
+            return {"type": "state", "table": self.id, "started": False, "names": self.names}
+        return self.stream.keyframe(self.game, self.phase)
+
+    def catch_up(self):
+        """The messages for someone who starts following the table now."""
+        if self.game is None:
+            return [self.state()]
+        return self.stream.catch_up()
+
+    def broadcast(self):
+        """Sends everyone at the table what the last move changed. Each message is only encoded once."""
+        clients = self.clients()
+        for message in self.stream.update(self.game, self.phase):
+            data = encode(message)
+            for client in clients:
+                client.write(data)
+
+    def place(self, at, direction = None):
+        """Makes a placement move for the current player. Returns "" if it was made, or an error message."""
+        if self.phase != Search.PLACE:
+            return "It's not time to place a tile"
+        at = str(at).upper()
+        board, tile = self.game.get_current_player().board, self.game.get_current_tile()
+        if at not in board.valid_coordinates and at != "P":
+            return f"'{at}' is not a valid coordinate"
+        if direction is not None:
+            if direction not in Tiles.DIRECTIONS:
+                return f"'{direction}' is not a direction"
+            tile.set_direction(direction)
+        if at in board.valid_coordinates and not at[0].isalpha():
+            at = at[::-1]  # The letter goes first
+        placed, message = self.game.try_to_place_tile(at)
+        if not placed:
+            return message.strip()
+        self.phase = Search.next_decision(self.game, Search.DRAFT)
+        return ""
+
+    def choose(self, tile):
+        """Makes a draft move for the current player. Returns "" if it was made, or an error message."""
+        if self.phase != Search.DRAFT:
+            return "It's not time to choose a tile"
+        if not _is_int(tile) or not 1 <= tile <= self.game.num_player_pieces:
+            return f"There is no tile {tile}"
+        if not self.game.try_to_choose_new_tile(tile):
+            return "That tile has already been chosen"
+        self.game.next_turn()
+        self.phase = Search.next_decision(self.game, Search.PLACE)
+        return ""
+
+
+class Server:
+    """Hosts any number of Rooms. executor runs the bots' decisions (a thread pool by default).
+    store is a Sessions.SessionStore to keep the games in, or None to keep them all in memory.
+    If the store has idle_seconds, games left that long are put away on disk as the server runs.
+    A table is closed linger seconds after its game ends, and everything about it let go. It's closed too
+    once nobody has sat at it for abandoned_after seconds. Each client can have tables_per_client tables open."""
+
+    def __init__(self, executor = None, store = None, linger = 60, abandoned_after = 300, tables_per_client = 10):
+        self.rooms = {}
+        self.executor = executor or concurrent.futures.ThreadPoolExecutor()
+        self.store = store
+        if store is not None:
+            store.on_spill = self._game_spilled
+        # Games are kept in the store under this server's own prefix, so that they can't be mixed up with
+        # games left in the store's directory by another server (or an earlier run of this one)
+        self.store_prefix = secrets.token_hex(4)
+        self.linger = linger
+        self.abandoned_after = abandoned_after
+        self.tables_per_client = tables_per_client
+        self.server = None
+        self.evicting = None  # The task putting idle games away
+        self.clients = set()
+        self._ids = itertools.count(1)
+        # The requests clients can make, by their "type"
+        self.handlers = {"create": self._create, "join": self._join, "watch": self._watch,
+                         "place": self._place, "choose": self._choose}
+
+    async def start(self, host = "127.0.0.1", port = 0):
+        """Starts listening. Returns the port (useful with port 0, which picks a free one)."""
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        if self.store is not None and self.store.idle_seconds is not None:
+            self.evicting = asyncio.ensure_future(self._evict_idle_games())
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.server.close()
+        if self.evicting:
+            self.evicting.cancel()
+        for client in self.clients:
+            client.writer.close()
+        await asyncio.gather(*(client.task for client in list(self.clients)), return_exceptions = True)
+        await self.server.wait_closed()
+        for room in self.rooms.values():
+            if room.bot_task:
+                room.bot_task.cancel()
+            if room.abandoned:
+                room.abandoned.cancel()
+        self.executor.shutdown(wait = False)
+
+    async def handle_client(self, reader, writer):
+        client = Client(writer)
+        client.task = asyncio.current_task()
+        self.clients.add(client)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError
+                except ValueError:
+                    client.send({"type": "error", "message": "Requests must be JSON objects, one per line"})
+                    continue
+                try:
+                    self.handle_request(client, request)
+                except Exception as error:
+                    # A bug handling one request mustn't cost the client its connection (and its seats)
+                    log.exception("Error handling %r", request)
+                    client.send({"type": "error", "message": f"The server couldn't handle that: {error!r}"})
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(client)
+            for table, seat in client.seats.items():
+                if table in self.rooms:
+                    self.rooms[table].humans[seat] = None
+                    self._check_abandoned(self.rooms[table])
+            for room in self.rooms.values():
+                room.watchers.discard(client)
+            writer.close()
+
+    def handle_request(self, client, request):
+        kind = request.get("type")
+        handler = self.handlers.get(kind) if isinstance(kind, str) else None
+        if handler is None:
+            client.send({"type": "error", "message": f"Unknown request type '{kind}'"})
+            return
+        room = None
+        if kind != "create":
+            table = request.get("table")
+            room = self.rooms.get(table) if _is_int(table) else None
+            if room is None:
+                client.send({"type": "error", "message": f"There is no table {request.get('table')}"})
+                return
+        error = handler(client, room, request)
+        if error:
+            client.send({"type": "error", "table": request.get("table"), "message": error})
+
+    def _create(self, client, room, request):
+        seats = request.get("seats", [])
+        if not isinstance(seats, list) or not 2 <= len(seats) <= 4:
+            return "A table needs 2-4 seats"
+        for kind in seats:
+            if not isinstance(kind, str) or kind != "human" and kind not in Bots.STRATEGIES:
+                return f"Seats are 'human' or a bot: {', '.join(Bots.STRATEGIES)}"
+        seed = request.get("seed")
+        if seed is not None and not (_is_int(seed) and 0 <= seed < 1 << 64):
+            return "A seed has to be a whole number from 0 to 2**64 - 1"
+        if len(client.tables) >= self.tables_per_client:
+            return f"You already have {len(client.tables)} tables open"
+        id = next(self._ids)
+        room = Room(id, seats, bool(request.get("center_kingdom")), bool(request.get("full_kingdom")),
+                    seed, 0 if request.get("deck") == "random" else 1, self.store, f"{self.store_prefix}-{id}")
+        room.creator = client
+        client.tables.add(room.id)
+        self.rooms[room.id] = room
+        client.send({"type": "created", "table": room.id})
+        if not room.humans:
+            self._begin(room)
+        self._check_abandoned(room)
+
+    def _join(self, client, room, request):
+        seat = request.get("seat")
+        if not _is_int(seat) or seat not in room.humans:
+            return f"Seat {seat} isn't a human seat"
+        if room.humans[seat] is not None:
+            return f"Seat {seat} is taken"
+        if room.id in client.seats:
+            return "You already have a seat at this table"
+        room.humans[seat] = client
+        client.seats[room.id] = seat
+        if room.abandoned:
+            room.abandoned.cancel()
+            room.abandoned = None
+        client.send({"type": "joined", "table": room.id, "seat": seat})
+        if room.game is not None:
+            # Someone is taking back a seat that was left during the game. The name stays as it was.
+            for message in room.catch_up():
+                client.send(message)
+            return
+        room.names[seat] = str(request.get("name") or f"Player {seat + 1}")[:20]
+        if all(room.humans.values()):
+            self._begin(room)
+
+    def _watch(self, client, room, request):
+        room.watchers.add(client)
+        for message in room.catch_up():
+            client.send(message)
+
+    def _place(self, client, room, request):
+        return self._move(client, room, lambda: room.place(request.get("at", ""), request.get("direction")))
+
+    def _choose(self, client, room, request):
+        return self._move(client, room, lambda: room.choose(request.get("tile")))
+
+    def _move(self, client, room, make_move):
+        if room.game is None:
+            return "The game hasn't started"
+        if room.phase is None:
+            return "The game is over"
+        if client.seats.get(room.id) != room.current_seat():
+            return "It's not your turn"
+        error = make_move()
+        if error:
+            return error
+        self._after_move(room)
+
+    def _begin(self, room):
+        room.start()
+        self._after_move(room)
+
+    def _after_move(self, room):
+        self._broadcast(room)
+        if room.current_seat() in room.bots and room.bot_task is None:
+            room.bot_task = asyncio.ensure_future(self._play_bots(room))
+            room.bot_task.add_done_callback(functools.partial(self._bots_done, room))
+
+    async def _play_bots(self, room):
+        """Makes the bots' moves until it's a human's turn (or the game is over).
+        A bot that fails, or picks a move that isn't allowed, makes the first legal move instead."""
+        loop = asyncio.get_running_loop()
+        while room.current_seat() in room.bots:
+            seat, phase = room.current_seat(), room.phase
+            bot = room.bots[seat]
+            choose = bot.choose_placement if phase == Search.PLACE else bot.choose_tile
+            try:
+                action = await loop.run_in_executor(self.executor, choose, room.game)
+            except Exception:
+                log.exception("Table %s: bot %s failed to choose a move", room.id, seat)
+                action = None
+            if not self._bot_move(room, phase, action):
+                log.error("Table %s: bot %s chose a move it can't make (%r), so it makes the first legal one",
+                          room.id, seat, action)
+                self._bot_move(room, phase, Search.legal_actions(room.game, phase)[0])
+            self._broadcast(room)
+
+    @staticmethod
+    def _bot_move(room, phase, action):
+        """Makes a bot's move. Returns whether it could be made."""
+        try:
+            if phase == Search.PLACE:
+                placed, message = room.game.place_current_tile(action)
+                if not placed:
+                    return False
+                room.phase = Search.next_decision(room.game, Search.DRAFT)
+                return True
+            return not room.choose(action)
+        except Exception:  # Something that isn't a move at all
+            return False
+
+    def _broadcast(self, room):
+        """Sends the last move to everyone at the table. Once the game is over, the table is closed
+        after self.linger seconds (so everyone can see how it ended, and late watchers too)."""
+        room.broadcast()
+        if room.phase is None:
+            asyncio.get_running_loop().call_later(self.linger, self._close_room, room.id)
+
+    def _game_spilled(self, key):
+        """While a table's game is put away on disk, its stream is let go of too (see Stream.forget)."""
+        prefix, _, id = key.rpartition("-")
+        room = self.rooms.get(int(id)) if prefix == self.store_prefix else None
+        if room is not None and room.stream is not None:
+            room.stream.forget()
+
+    def _check_abandoned(self, room):
+        """Closes room in self.abandoned_after seconds, if nobody is sitting at it then."""
+        if not room.seated() and room.abandoned is None:
+            room.abandoned = asyncio.get_running_loop().call_later(self.abandoned_after, self._close_abandoned, room.id)
+
+    def _close_abandoned(self, id):
+        room = self.rooms.get(id)
+        if room is None:
+            return
+        room.abandoned = None
+        if not room.seated():
+            log.info("Table %s has been left, so it's closed", id)
+            self._close_room(id)
+
+    def _close_room(self, id):
+        """Lets go of a finished or abandoned table: its game (in the store too), its stream, and its bots."""
+        room = self.rooms.pop(id, None)
+        if room is None:
+            return
+        if room.bot_task:
+            room.bot_task.cancel()
+        if room.abandoned:
+            room.abandoned.cancel()
+        if room.creator is not None:
+            room.creator.tables.discard(id)
+        if self.store is not None:
+            self.store.discard(room.key)
+        for client in room.humans.values():
+            if client is not None:
+                client.seats.pop(id, None)
+        for bot in room.bots.values():
+            bot.close()
+        room.close()
+
+    async def _evict_idle_games(self):
+        """Puts games nobody has played for the store's idle_seconds away on disk, every so often."""
+        interval = max(self.store.idle_seconds / 4, 0.01)
+        while True:
+            await asyncio.sleep(interval)
+            self.store.evict_idle()
+
+    def _bots_done(self, room, task):
+        """Collects how a room's bots task ended, so a failure is always reported."""
+        room.bot_task = None
+        if not task.cancelled() and task.exception() is not None:
+            log.error("Table %s: the bots stopped", room.id, exc_info = task.exception())
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def encode(message):
+    """A message as a line of JSON."""
+    return json.dumps(message, separators = (",", ":")).encode() + b"\n"
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Host games of PrinceDomino over TCP.")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8765)
+    parser.add_argument("--sessions", metavar = "DIRECTORY",
+                        help = "keep only the most recently played games in memory, and put the rest away here")
+    parser.add_argument("--max-games", type = int, default = 1000, help = "games to keep in memory, with --sessions")
+    parser.add_argument("--max-bytes", type = int,
+                        help = "memory the games in memory may take (roughly), with --sessions")
+    parser.add_argument("--idle-seconds", type = float,
+                        help = "put games nobody has played for this long away on disk, with --sessions")
+    parser.add_argument("--abandoned-after", type = float, default = 300,
+                        help = "close a table once nobody has sat at it for this many seconds")
+    parser.add_argument("--tables-per-client", type = int, default = 10,
+                        help = "how many tables each connection can have open")
+    args = parser.parse_args(argv)
+
+    async def serve():
+        store = None
+        if args.sessions:
+            store = Sessions.SessionStore(args.sessions, args.max_games, args.max_bytes, args.idle_seconds)
+        server = Server(store = store, abandoned_after = args.abandoned_after,
+                        tables_per_client = args.tables_per_client)
+        port = await server.start(args.host, args.port)
+        print(f"Serving PrinceDomino on {args.host}:{port}")
+        await server.server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import Bots
+import Game
+import Server
+import Sessions
+import Stream
+
+
+class Connection:
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+        self.states = {}  # The state of each table followed, kept up to date from the deltas
+
+    @classmethod
+    async def open(cls, port):
+        return cls(*await asyncio.open_connection("127.0.0.1", port))
+
+    def send(self, **message):
+        self.writer.write(json.dumps(message).encode() + b"\n")
+
+    async def receive(self, type = None):
+        """Returns the next message (of the given type, skipping others)."""
+        while True:
+            message = json.loads(await asyncio.wait_for(self.reader.readline(), 10))
+            if type is None or message["type"] == type:
+                return message
+
+    async def receive_state(self):
+        """Returns the state of a table, after the next update to it."""
+        while True:
+            message = await self.receive()
+            if message["type"] in ("state", "delta"):
+                table = message["table"]
+                self.states[table] = Stream.apply(self.states.get(table), message)
+                return self.states[table]
+
+    async def play(self, table, seat):
+        """Plays seat at table to the end of the game, making the first legal move each time.
+        Returns the final state, and how many moves were made."""
+        moves = 0
+        while True:
+            state = await self.receive_state()
+            if state["over"]:
+                return state, moves
+            if state["seat"] != seat:
+                continue
+            if state["phase"] == "place":
+                if state["placements"]:
+                    at, direction = state["placements"][0]
+                    self.send(type = "place", table = table, at = at, direction = direction)
+                else:
+                    self.send(type = "place", table = table, at = "P")
+            else:
+                self.send(type = "choose", table = table, tile = state["future_pieces"].index(None) + 1)
+            moves += 1
+
+    def close(self):
+        self.writer.close()
+
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = Server.Server()
+        self.port = await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_human_against_bot(self):
+        alice, watcher = await Connection.open(self.port), await Connection.open(self.port)
+        alice.send(type = "create", seats = ["human", "greedy"], seed = 3, deck = "random")
+        table = (await alice.receive("created"))["table"]
+        watcher.send(type = "watch", table = table)
+        self.assertFalse((await watcher.receive_state())["started"])
+        alice.send(type = "join", table = table, seat = 1)
+        self.assertIn("isn't a human seat", (await alice.receive("error"))["message"])
+        alice.send(type = "join", table = table, seat = 0, name = "Alice")
+        self.assertEqual((await alice.receive("joined"))["seat"], 0)
+
+        state, moves = await alice.play(table, 0)
+        self.assertGreater(moves, 10)
+        self.assertEqual(len(state["boards"]), 2)
+        self.assertEqual(state["boards"][0]["name"], "Alice")
+
+        while not (await watcher.receive_state())["over"]:
+            pass
+        alice.send(type = "choose", table = table, tile = 1)
+        self.assertEqual((await alice.receive("error"))["message"], "The game is over")
+        alice.close()
+        watcher.close()
+
+    async def test_bad_moves(self):
+        alice, bob = await Connection.open(self.port), await Connection.open(self.port)
+        alice.send(type = "create", seats = ["human", "human"], seed = 1, deck = "random")
+        table = (await alice.receive("created"))["table"]
+        alice.send(type = "join", table = table, seat = 0)
+        bob.send(type = "join", table = table, seat = 1)
+        state = await alice.receive_state()
+        players = {0: alice, 1: bob}
+        current, other = players[state["seat"]], players[1 - state["seat"]]
+        other.send(type = "choose", table = table, tile = 1)
+        self.assertEqual((await other.receive("error"))["message"], "It's not your turn")
+        current.send(type = "place", table = table, at = "A1")
+        self.assertEqual((await current.receive("error"))["message"], "It's not time to place a tile")
+        current.send(type = "choose", table = table, tile = 9)
+        self.assertEqual((await current.receive("error"))["message"], "There is no tile 9")
+        current.writer.write(b"not json\n")
+        self.assertIn("JSON", (await current.receive("error"))["message"])
+        current.send(type = "dance")
+        self.assertIn("Unknown", (await current.receive("error"))["message"])
+        alice.close()
+        bob.close()
+
+    async def test_bad_requests(self):
+        """Requests that make no sense get an error, and never cost anyone their connection or their seat."""
+        alice = await Connection.open(self.port)
+        alice.send(type = "create", seats = ["human", "greedy"], seed = 1, deck = "random")
+        table = (await alice.receive("created"))["table"]
+        for request, error in (({"type": "begin", "table": table}, "Unknown request type"),
+                               ({"type": "play_bots", "table": table}, "Unknown request type"),
+                               ({"type": ["join"], "table": table}, "Unknown request type"),
+                               ({"type": "watch", "table": [table]}, "There is no table"),
+                               ({"type": "join", "table": table, "seat": [0]}, "isn't a human seat"),
+                               ({"type": "join", "table": table, "seat": True}, "isn't a human seat"),
+                               ({"type": "create", "seats": [["human"], "human"]}, "Seats are"),
+                               ({"type": "create", "seats": [{}, "human"]}, "Seats are"),
+                               ({"type": "create", "seats": ["human", "human"], "seed": "abc"}, "A seed"),
+                               ({"type": "create", "seats": ["human", "human"], "seed": -1}, "A seed"),
+                               ({"type": "create", "seats": ["human", "human"], "seed": 1.5}, "A seed"),
+                               ({"type": "create", "seats": ["human", "human"], "seed": 2 ** 70}, "A seed")):
+            alice.send(**request)
+            self.assertIn(error, (await alice.receive("error"))["message"], request)
+
+        def broken(client, room, request):
+            raise RuntimeError("a bug")
+        self.server.handlers["watch"] = broken
+        alice.send(type = "watch", table = table)
+        self.assertIn("a bug", (await alice.receive("error"))["message"])
+
+        alice.send(type = "join", table = table, seat = 0, name = "Alice")
+        self.assertEqual((await alice.receive("joined"))["seat"], 0)
+        state = await alice.receive_state()
+        self.assertTrue(state["started"])
+        alice.close()
+        await asyncio.sleep(0.1)
+
+        # The seat was left partway through the game, so someone can take it again and carry on
+        bob = await Connection.open(self.port)
+        bob.send(type = "join", table = table, seat = 0, name = "Bob")
+        self.assertEqual((await bob.receive("joined"))["seat"], 0)
+        state = await bob.receive_state()
+        self.assertEqual(state["boards"][0]["name"], "Alice")
+        bob.close()
+
+    async def test_broken_bot(self):
+        """A bot that fails, or picks moves that can't be made, doesn't hold the game up."""
+        class Broken(Bots.Strategy):
+            def choose_placement(self, game):
+                raise RuntimeError("a bug")
+
+            def choose_tile(self, game):
+                return 99
+
+        alice = await Connection.open(self.port)
+        alice.send(type = "create", seats = ["human", "random"], seed = 2, deck = "random")
+        table = (await alice.receive("created"))["table"]
+        self.server.rooms[table].bots[1] = Broken()
+        alice.send(type = "join", table = table, seat = 0)
+        await alice.receive("joined")
+        with self.assertLogs("Server", "ERROR"):
+            state, moves = await alice.play(table, 0)
+        self.assertTrue(state["over"])
+        alice.close()
+
+    async def test_one_seat_each(self):
+        alice = await Connection.open(self.port)
+        alice.send(type = "create", seats = ["human", "human"], seed = 1, deck = "random")
+        table = (await alice.receive("created"))["table"]
+        alice.send(type = "join", table = table, seat = 0)
+        await alice.receive("joined")
+        alice.send(type = "join", table = table, seat = 1)
+        self.assertEqual((await alice.receive("error"))["message"], "You already have a seat at this table")
+        alice.close()
+
+    async def test_store_from_an_earlier_run(self):
+        """Games left in the store's directory don't get mixed up with new tables."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        old = Sessions.SessionStore(directory.name)
+        for id in (1, 2):
+            game = Game.Game(["X", "Y"], 0, seed = id)
+            Bots.play_game(game, [Bots.RandomBot(1), Bots.RandomBot(2)])
+            old.put(id, game)
+        old.close()
+
+        server = Server.Server(store = Sessions.SessionStore(directory.name))
+        port = await server.start()
+        alice = await Connection.open(port)
+        alice.send(type = "create", seats = ["human", "human"], seed = 1, deck = "random")
+        table = (await alice.receive("created"))["table"]
+        self.assertEqual(table, 1)
+        alice.send(type = "watch", table = table)
+        self.assertFalse((await alice.receive_state())["started"])
+        alice.send(type = "join", table = table, seat = 0)
+        self.assertEqual((await alice.receive("joined"))["seat"], 0)
+        alice.close()
+        await server.close()
+
+    async def test_idle_and_finished_tables(self):
+        """Idle games are put away on disk as the server runs, and finished tables are let go altogether."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        store = Sessions.SessionStore(directory.name, idle_seconds = 0.05)
+        server = Server.Server(store = store, linger = 0)
+        port = await server.start()
+        alice = await Connection.open(port)
+        alice.send(type = "create", seats = ["human", "greedy"], seed = 4, deck = "random")
+        table = (await alice.receive("created"))["table"]
+        alice.send(type = "join", table = table, seat = 0)
+        await alice.receive("joined")
+        await asyncio.sleep(0.3)  # Alice is thinking
+        self.assertEqual(store.spilled, {server.rooms[table].key})
+
+        state, moves = await alice.play(table, 0)
+        self.assertTrue(state["over"])
+        self.assertGreater(store.stats["loads"], 0)
+        await asyncio.sleep(0.05)
+        self.assertEqual(server.rooms, {})
+        self.assertEqual(len(store), 0)
+        self.assertEqual(os.listdir(directory.name), [])
+        alice.send(type = "watch", table = table)
+        self.assertIn("There is no table", (await alice.receive("error"))["message"])
+        alice.close()
+        await server.close()
+
+    async def test_many_bot_tables(self):
+        watcher, other = await Connection.open(self.port), await Connection.open(self.port)
+        tables = []
+        for n in range(20):
+            creator = watcher if n % 2 else other  # (Each can have 10 tables open)
+            creator.send(type = "create", seats = ["random", "greedy", "random"], seed = n, deck = "random")
+            tables.append((await creator.receive("created"))["table"])
+        for table in tables:
+            watcher.send(type = "watch", table = table)
+        finished = set()
+        start = time.perf_counter()
+        while len(finished) < len(tables):
+            state = await watcher.receive_state()
+            if state["over"]:
+                finished.add(state["table"])
+        self.assertLess(time.perf_counter() - start, 10)
+        watcher.close()
+        other.close()
+
+    async def test_abandoned_tables(self):
+        """Tables nobody sits at are closed, and each connection can only have so many open."""
+        server = Server.Server(abandoned_after = 0.25, tables_per_client = 3)
+        port = await server.start()
+        alice, bob = await Connection.open(port), await Connection.open(port)
+        tables = []
+        for seats in (["human", "human"], ["human", "greedy"], ["random", "random"]):
+            alice.send(type = "create", seats = seats, seed = 1, deck = "random")
+            tables.append((await alice.receive("created"))["table"])
+        alice.send(type = "create", seats = ["human", "human"])
+        self.assertEqual((await alice.receive("error"))["message"], "You already have 3 tables open")
+        never_joined, left, bots = tables
+
+        bob.send(type = "join", table = left, seat = 0)
+        await bob.receive("joined")
+        await asyncio.sleep(0.4)
+        self.assertNotIn(never_joined, server.rooms)
+        self.assertIn(left, server.rooms)
+        self.assertIn(bots, server.rooms, "Bots never leave, so their tables are closed when the game ends")
+
+        bob.close()
+        await asyncio.sleep(0.05)
+        carol = await Connection.open(port)
+        carol.send(type = "join", table = left, seat = 0)  # Back in time to keep the table
+        await carol.receive("joined")
+        await asyncio.sleep(0.3)
+        self.assertIn(left, server.rooms)
+        carol.close()
+        await asyncio.sleep(0.4)
+        self.assertNotIn(left, server.rooms)
+
+        alice.send(type = "create", seats = ["human", "human"])
+        self.assertIn("table", await alice.receive("created"))
+        alice.close()
+        await server.close()
+
+    async def test_session_store(self):
+        """Tables whose games have been put away on disk carry on as if they never were."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        store = Sessions.SessionStore(directory.name, max_games = 2)
+        server = Server.Server(store = store)
+        port = await server.start()
+        watcher = await Connection.open(port)
+        scores = {}
+        for n in range(6):
+            watcher.send(type = "create", seats = ["random", "greedy"], seed = n, deck = "random")
+            scores[(await watcher.receive("created"))["table"]] = None
+        for table in scores:
+            watcher.send(type = "watch", table = table)
+        while None in scores.values():
+            state = await watcher.receive_state()
+            if state.get("over"):
+                scores[state["table"]] = [board["score"] for board in state["boards"]]
+        self.assertGreater(store.stats["loads"], 0)
+        self.assertLessEqual(len(store.resident), 2)
+        put_away = [room for room in server.rooms.values() if room.key in store.spilled]
+        self.assertTrue(put_away)
+        for room in put_away:  # Their streams are let go of too, until someone needs them
+            self.assertEqual((room.stream.latest_keyframe, room.stream.deltas), (None, []))
+        late = await Connection.open(port)
+        late.send(type = "watch", table = put_away[0].id)
+        state = await late.receive_state()
+        self.assertEqual([board["score"] for board in state["boards"]], scores[put_away[0].id])
+        late.close()
+
+        for table, seed in zip(sorted(scores), range(6)):
+            game = Game.Game(["Random bot 1", "Greedy bot 2"], 0, seed = seed)
+            Bots.play_game(game, [Bots.RandomBot(f"{seed}:0"), Bots.GreedyBot(f"{seed}:1")])
+            self.assertEqual(scores[table], [player.board.score_board()[0] for player in game.players])
+        watcher.close()
+        await server.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
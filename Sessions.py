@@ -0,0 +1,227 @@
+"""
+A store for many games in progress, which keeps only the recently used ones in memory.
+
+    store = SessionStore("sessions", max_games = 500)
+    store.put("table-1", game)
+    ...
+    game = store.get("table-1")     # loaded back from disk, if it had been put away
+
+A Game takes 40-90 KB of memory, while its move log (see Replay.dumps_log) takes a couple of hundred bytes.
+So once there are more than max_games games in memory (or they're estimated to take more than max_bytes),
+the least recently used ones are written to the store's directory as logs, and dropped.
+Games nobody has touched for idle_seconds can be put away too, with evict_idle.
+get replays a game that's been put away, so the Game it returns is in just the same position,
+even partway through a turn, and carries on the same log.
+
+Games without a move log (like those from Save.loads) are written as saves instead (see Save.dumps),
+which only keeps them exactly between turns. Until such a game finishes its turn, it can't be put away,
+and is kept in memory.
+
+The games in memory are the store's: don't keep one from get after something else has been put in, or got.
+A store isn't thread-safe. Use it from one thread (like an event loop's).
+"""
+import logging
+import os
+import re
+import struct
+import time
+from collections import OrderedDict
+
+import Replay
+import Save
+
+SUFFIX = ".pdgame"
+
+log = logging.getLogger(__name__)
+
+# Rough memory use, measured with tracemalloc: a game's own objects, each player's board, and each tile placed
+GAME_BYTES, PLAYER_BYTES, TILE_BYTES = 27000, 7500, 600
+
+_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def estimate_size(game):
+    """Roughly how many bytes of memory game takes."""
+    tiles_placed = max(game.current_round, 0) * game.num_player_pieces
+    return GAME_BYTES + PLAYER_BYTES * game.player_count + TILE_BYTES * tiles_placed
+
+
+def dumps_session(game):
+    """Returns game as bytes: its move log, if it has one and it can be written, or else a save.
+    Raises ValueError if the game can't be written either way (like a game whose seed isn't a 64 bit integer,
+    or one without a log partway through a turn)."""
+    if game.moves is not None:
+        try:
+            return Replay.dumps_log(game.move_log())
+        except (struct.error, ValueError, TypeError, OverflowError):
+            pass
+    try:
+        return Save.dumps(game, exact_rng = True)
+    except (struct.error, ValueError, TypeError, OverflowError) as error:
+        raise ValueError(f"The game can't be written: {error}")
+
+
+def loads_session(data):
+    """Returns the Game in data, from dumps_session."""
+    if data.startswith(Replay.LOG_MAGIC):
+        return Replay.replay(Replay.loads_log(data))
+    return Save.loads(data)
+
+
+class SessionStore:
+    """Holds games by id (a string of letters, digits, _ and -, or an int), some in memory and the rest on disk.
+
+    directory       where games are put away. Games left in it (by an earlier store) can be got too.
+    max_games       how many games to keep in memory, at most
+    max_bytes       how much memory (see estimate_size) the games in memory may take, or None for no limit
+    idle_seconds    how long a game can go unused before evict_idle puts it away, or None to leave them
+    sync            whether each game is on disk before its memory is let go (slower, but survives a crash)
+    """
+
+    def __init__(self, directory, max_games = 1000, max_bytes = None, idle_seconds = None, sync = False,
+                 clock = time.monotonic):
+        assert max_games >= 1, 'The store has to be able to hold at least one game'
+        self.directory = directory
+        self.max_games = max_games
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.sync = sync
+        self.clock = clock
+        os.makedirs(directory, exist_ok = True)
+        # The games in memory, least recently used first: id: [game, estimated size, last used]
+        self.resident = OrderedDict()
+        self.resident_bytes = 0
+        # The ids of the games on disk
+        self.spilled = {name[:-len(SUFFIX)] for name in os.listdir(directory) if name.endswith(SUFFIX)}
+        self.stats = {"hits": 0, "loads": 0, "spills": 0}
+        # The games that can't be written (see dumps_session). They're kept in memory.
+        self.unspillable = set()
+        self.on_spill = None  # If set, it's called with the id of each game put away
+
+    def __len__(self):
+        return len(self.resident) + len(self.spilled)
+
+    def __contains__(self, id):
+        id = str(id)
+        return id in self.resident or id in self.spilled
+
+    def __iter__(self):
+        return iter(list(self.resident) + sorted(self.spilled))
+
+    def path(self, id):
+        return os.path.join(self.directory, id + SUFFIX)
+
+    def put(self, id, game):
+        """Adds game to the store (replacing any game with the same id), as the most recently used."""
+        id = self._check(id)
+        self.discard(id)
+        self._hold(id, game)
+        self._enforce_limits()
+
+    def get(self, id):
+        """Returns the game with id, loading it from disk if it was put away. Raises KeyError if there's no such game."""
+        id = str(id)
+        entry = self.resident.get(id)
+        if entry is not None:
+            self.stats["hits"] += 1
+            self.resident.move_to_end(id)
+            # The game may have been played on since it was last used, so it's sized again
+            size = estimate_size(entry[0])
+            self.resident_bytes += size - entry[1]
+            entry[1], entry[2] = size, self.clock()
+            self._enforce_limits()
+            return entry[0]
+        if id not in self.spilled:
+            raise KeyError(id)
+        with open(self.path(id), "rb") as file:
+            game = loads_session(file.read())
+        self.stats["loads"] += 1
+        # The file stays until the game is written again, so a crash can only lose the moves made since
+        self.spilled.discard(id)
+        self._hold(id, game)
+        self._enforce_limits()
+        return game
+
+    def discard(self, id):
+        """Removes the game with id from the store, and from disk. Does nothing if there's no such game."""
+        id = str(id)
+        if id in self.resident:
+            self._drop(id)
+        self.unspillable.discard(id)
+        if os.path.exists(self.path(id)):
+            os.remove(self.path(id))
+        self.spilled.discard(id)
+
+    def spill(self, id):
+        """Writes the game with id to disk, and lets go of it in memory.
+        Raises ValueError if the game can't be written. It stays in memory then, and the store carries on."""
+        id = str(id)
+        game = self.resident[id][0]
+        try:
+            data = dumps_session(game)
+        except ValueError:
+            self.unspillable.add(id)
+            raise
+        Save.write_file(self.path(id), data, self.sync)
+        self._drop(id)
+        self.spilled.add(id)
+        self.stats["spills"] += 1
+        if self.on_spill is not None:
+            self.on_spill(id)
+
+    def evict_idle(self, now = None):
+        """Puts away every game that hasn't been used for idle_seconds. Returns how many were."""
+        if self.idle_seconds is None:
+            return 0
+        cutoff = (self.clock() if now is None else now) - self.idle_seconds
+        idle = []
+        for id, (game, size, last_used) in self.resident.items():
+            if last_used > cutoff:
+                break  # The rest were used later still
+            if id not in self.unspillable:
+                idle.append(id)
+        return sum(self._try_to_spill(id) for id in idle)
+
+    def close(self):
+        """Puts every game in memory away, so that a new store on the same directory has them all."""
+        for id in list(self.resident):
+            self._try_to_spill(id)
+
+    def _check(self, id):
+        id = str(id)
+        if not _ID.fullmatch(id):
+            raise ValueError(f"'{id}' can't be a session id: use up to 64 letters, digits, _ or -")
+        return id
+
+    def _hold(self, id, game):
+        size = estimate_size(game)
+        self.resident[id] = [game, size, self.clock()]
+        self.resident_bytes += size
+
+    def _drop(self, id):
+        game, size, last_used = self.resident.pop(id)
+        self.resident_bytes -= size
+
+    def _try_to_spill(self, id):
+        """Spills the game with id, if it can be written. Returns whether it was."""
+        try:
+            self.spill(id)
+            return True
+        except ValueError as error:
+            log.error("Game %s is being kept in memory: %s", id, error)
+            return False
+
+    def _over_limits(self):
+        return len(self.resident) > self.max_games or \
+            self.max_bytes is not None and self.resident_bytes > self.max_bytes
+
+    def _enforce_limits(self):
+        """Puts away the least recently used games until the rest fit. The most recent one is always kept,
+        and so are games that can't be written."""
+        if not self._over_limits():
+            return
+        for id in list(self.resident)[:-1]:
+            if id not in self.unspillable:
+                self._try_to_spill(id)
+                if not self._over_limits():
+                    return
@@ -0,0 +1,135 @@
+import os
+import tempfile
+import unittest
+
+import Save
+import Search
+import Sessions
+from Game import Game
+from Replay_test import logged_game
+from State import GameState
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSessionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_spill_and_reload(self):
+        store = Sessions.SessionStore(self.directory.name, max_games = 1)
+        games = {}
+        for moves in (0, 1, 2, 25, 26, 1000):  # Before, partway through, and after turns, and a finished game
+            games[moves] = logged_game(4, seed = moves, moves = moves)
+            store.put(moves, games[moves][0])
+        self.assertEqual(len(store), 6)
+        self.assertEqual(list(store.resident), ["1000"])
+        self.assertEqual(store.stats["spills"], 5)
+        for moves, (game, phase) in games.items():
+            loaded = store.get(moves)
+            self.assertEqual(GameState.from_game(loaded, phase).key(), GameState.from_game(game, phase).key(), moves)
+            self.assertEqual(loaded.moves.tolist(), game.moves.tolist())
+            self.assertLess(os.path.getsize(store.path(str(moves))), 300)
+        self.assertRaises(KeyError, store.get, "nothing")
+        self.assertRaises(ValueError, store.put, "../escape", games[0][0])
+
+    def test_least_recently_used(self):
+        store = Sessions.SessionStore(self.directory.name, max_games = 3)
+        for n in range(4):
+            store.put(n, logged_game(2, seed = n, moves = 10)[0])
+        self.assertEqual(list(store.resident), ["1", "2", "3"])
+        store.get(1)
+        store.get(0)
+        self.assertEqual(list(store.resident), ["3", "1", "0"])
+        self.assertEqual(store.spilled, {"2"})
+        self.assertEqual(store.stats, {"hits": 1, "loads": 1, "spills": 2})
+
+        store.discard(1)
+        store.discard(2)
+        self.assertEqual(sorted(store), ["0", "3"])
+        # Game 0's file is left from when it was put away, until it's written again
+        self.assertEqual(os.listdir(self.directory.name), ["0.pdgame"])
+
+    def test_memory_limit(self):
+        game = logged_game(3, seed = 1, moves = 30)[0]
+        size = Sessions.estimate_size(game)
+        store = Sessions.SessionStore(self.directory.name, max_bytes = 2.5 * size)
+        for n in range(5):
+            store.put(n, logged_game(3, seed = 1, moves = 30)[0])
+            self.assertLessEqual(store.resident_bytes, 2.5 * size)
+        self.assertEqual(len(store.resident), 2)
+
+    def test_idle(self):
+        clock = Clock()
+        store = Sessions.SessionStore(self.directory.name, idle_seconds = 60, clock = clock)
+        for n in range(3):
+            store.put(n, logged_game(2, seed = n, moves = 5)[0])
+            clock.now += 30
+        store.get(0)
+        self.assertEqual(store.evict_idle(), 1)  # Only game 1 has been left for a minute
+        self.assertEqual(store.spilled, {"1"})
+        clock.now += 60
+        self.assertEqual(store.evict_idle(), 2)
+        self.assertEqual(len(store.resident), 0)
+
+    def test_unwritable_games(self):
+        """A game that can't be written stays in memory, and the store carries on with the rest."""
+        store = Sessions.SessionStore(self.directory.name, max_games = 1)
+        for seed in ("abc", 2 ** 70, -1):
+            game = Game(["A", "B"], deck_type = 0, seed = seed)
+            self.assertRaises(ValueError, Sessions.dumps_session, game)
+            store.put(f"bad{seed}", game)
+        with self.assertLogs("Sessions", "ERROR"):
+            for n in range(3):
+                store.put(n, logged_game(2, seed = n, moves = 4)[0])
+                store.get(n)
+        self.assertEqual(len(store.unspillable), 3)
+        self.assertEqual(store.spilled, {"0", "1"})
+        self.assertEqual(len(store.resident), 4, "The unwritable games, and the latest")
+        self.assertEqual(store.get(0).moves.tolist(), logged_game(2, seed = 0, moves = 4)[0].moves.tolist())
+
+    def test_mid_turn_without_a_log(self):
+        """A game with no move log can only be put away between turns, so it's kept in memory until then."""
+        store = Sessions.SessionStore(self.directory.name, max_games = 1)
+        game = Save.loads(Save.dumps(logged_game(3, seed = 6, moves = 13)[0]))  # (3 claims, then 5 turns)
+        phase = Search.next_decision(game)
+        phase = Search.apply_action(game, phase, Search.legal_actions(game, phase)[0])
+        self.assertEqual(phase, Search.DRAFT)
+        self.assertRaises(ValueError, Sessions.dumps_session, game)
+        store.put("saved", game)
+        with self.assertLogs("Sessions", "ERROR"):
+            store.put("other", logged_game(2, seed = 7, moves = 4)[0])
+        self.assertEqual(store.unspillable, {"saved"})
+        self.assertIs(store.get("saved"), game)
+
+        Search.apply_action(game, phase, Search.legal_actions(game, phase)[0])
+        store.discard("other")
+        store.put("saved", game)
+        store.close()
+        loaded = Sessions.SessionStore(self.directory.name).get("saved")
+        self.assertEqual(GameState.from_game(loaded).key(), GameState.from_game(game).key())
+
+    def test_reopen(self):
+        store = Sessions.SessionStore(self.directory.name)
+        game, phase = logged_game(3, seed = 4, moves = 40)
+        store.put("kept", game)
+        saved = Save.loads(Save.dumps(logged_game(2, seed = 5, moves = 16)[0]))  # A save has no move log
+        store.put("saved", saved)
+        store.close()
+
+        store = Sessions.SessionStore(self.directory.name)
+        self.assertEqual(sorted(store), ["kept", "saved"])
+        self.assertEqual(GameState.from_game(store.get("kept"), phase).key(), GameState.from_game(game, phase).key())
+        self.assertEqual(GameState.from_game(store.get("saved")).key(), GameState.from_game(saved).key())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,256 @@
+"""
+Immutable snapshots of a game of PrinceDomino.
+
+A GameState is a value: applying a move returns a new GameState, and the old one never changes.
+The new state shares everything the move didn't touch with the old one. The other players' boards
+are the very same BoardState objects, and the deck is one shared tuple of tile codes with a cursor.
+So search trees, undo stacks and any number of readers can hold thousands of states,
+while only the board that changed is ever copied.
+
+States step through the game one decision at a time, in the same phases as Search
+(PLACE, then DRAFT, for each turn), and use the same actions (see Search.legal_actions).
+"""
+import random
+from collections import namedtuple
+
+import Game
+import Search
+import Tiles
+
+
+class BoardState:
+    """A read-only board. It wraps a Board that nobody else holds, and that is never changed again.
+    place returns a new BoardState, so the wrapped Board can be shared by every GameState that has it."""
+
+    __slots__ = ("_board",)
+
+    def __init__(self, board):
+        """board is copied, so it can go on being changed by whoever passed it."""
+        self._board = board.copy()
+
+    @classmethod
+    def _wrap(cls, board):
+        state = cls.__new__(cls)
+        state._board = board
+        return state
+
+    def __eq__(self, other):
+        return isinstance(other, BoardState) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __str__(self):
+        return str(self._board)
+
+    def key(self):
+        """The board's contents (its bitmasks), and where the kingdom sits in its view."""
+        bits = self._board.bits
+        return tuple(bits.terrain.values()) + tuple(bits.crowns) + (bits.wild, tuple(self._board.offset))
+
+    @property
+    def zobrist(self):
+        return self._board.zobrist
+
+    def get_cell(self, col, row):
+        return self._board.get_cell(col, row)
+
+    def legal_placements(self, tile):
+        return self._board.legal_placements(tile)
+
+    def has_legal_placement(self, tile):
+        return self._board.has_legal_placement(tile)
+
+    def placement_gain(self, col, row, direction, tile):
+        return self._board.placement_gain(col, row, direction, tile)
+
+    def score(self, center_kingdom = False, full_kingdom = False):
+        """Returns (total_score, score_details), exactly as Board.score_board does."""
+        return self._board.score_board(center_kingdom, full_kingdom)
+
+    def place(self, placement, tile):
+        """Returns a new BoardState with tile placed at placement (a (col, row, direction) tuple,
+        from legal_placements). Returns 0 if the placement isn't valid."""
+        col, row, direction = placement
+        tile = tile.copy()
+        tile.set_direction(direction)
+        board = self._board.copy()
+        if not board.place_tile(col, row, tile):
+            return 0
+        return BoardState._wrap(board)
+
+    def board(self):
+        """Returns a Board with the same contents, that can be changed freely."""
+        return self._board.copy()
+
+
+# The fields of a GameState. Tiles are kept as their codes (see Tiles.encode_tile), players as their ids.
+#   names                      the players' names
+#   boards                     a BoardState for each player
+#   deck, remaining            the deck's codes, top last. Only the first remaining of them are still in the deck.
+#   discard                    the codes of the tiles taken out of the game at the start
+#   current_market, future_market, current_pieces, future_pieces   the Table (tuples of codes, and of player ids)
+#   current_round, current_turn, number_of_rounds, num_player_pieces   as in Game
+#   phase                      the next decision: Search.PLACE, Search.DRAFT, or None once the game is over
+#   center_kingdom, full_kingdom, seed   the game's options, as in Game
+#   rng_state                  the state of the Game's random number generator
+_FIELDS = ["names", "boards", "deck", "remaining", "discard",
+           "current_market", "future_market", "current_pieces", "future_pieces",
+           "current_round", "current_turn", "number_of_rounds", "num_player_pieces",
+           "phase", "center_kingdom", "full_kingdom", "seed", "rng_state"]
+
+
+class GameState(namedtuple("GameState", _FIELDS)):
+    """An immutable snapshot of a game, at a decision. See the module docstring."""
+
+    __slots__ = ()
+
+    @classmethod
+    def from_game(cls, game, phase = Search.PLACE):
+        """Returns a snapshot of game, at the decision in phase of the current turn (see Search.next_decision).
+        The game itself is not changed."""
+        game = game.clone()
+        phase = Search.next_decision(game, phase)
+        table = game.table
+        return cls(names = tuple(player.handle for player in game.players),
+                   boards = tuple(BoardState._wrap(player.board) for player in game.players),
+                   deck = tuple(table.deck.remaining_codes()), remaining = len(table.deck),
+                   discard = tuple(game.discard),
+                   current_market = _codes(table.current_market), future_market = _codes(table.future_market),
+                   current_pieces = _ids(table.current_player_pieces), future_pieces = _ids(table.future_player_pieces),
+                   current_round = game.current_round, current_turn = game.current_turn,
+                   number_of_rounds = game.number_of_rounds, num_player_pieces = game.num_player_pieces,
+                   phase = phase, center_kingdom = game.center_kingdom, full_kingdom = game.full_kingdom,
+                   seed = game.seed, rng_state = game.rng.getstate())
+
+    def to_game(self):
+        """Returns a Game in the same position, which can be played on without changing this state."""
+        game = Game.Game.__new__(Game.Game)
+        game.messages = []
+        game.seed = self.seed
+        game.rng = random.Random()
+        game.rng.setstate(self.rng_state)
+        game.player_count = len(self.names)
+        game.num_player_pieces = self.num_player_pieces
+        game.players = [Game.Player(name, board.board(), id = n)
+                        for n, (name, board) in enumerate(zip(self.names, self.boards))]
+        game.center_kingdom, game.full_kingdom = self.center_kingdom, self.full_kingdom
+        game.number_of_rounds = self.number_of_rounds
+        game.current_round, game.current_turn = self.current_round, self.current_turn
+        game.discard = self.discard
+        table = Game.Table(Tiles.Deck.from_codes(self.deck[:self.remaining]), self.num_player_pieces)
+        table.current_market = tuple(_tile(code) for code in self.current_market)
+        table.future_market = tuple(_tile(code) for code in self.future_market)
+        table.current_player_pieces = tuple(game.players[n] if n is not None else None for n in self.current_pieces)
+        table.future_player_pieces = tuple(game.players[n] if n is not None else None for n in self.future_pieces)
+        game.table = table
+        game.game_is_not_over = int(self.phase is not None)
+        game.turn_placement = None
+        game.temp_future_player_pieces = table.future_player_pieces
+        game.deck_type, game.grid_size = None, self.boards[0]._board.grid_width - 2
+        game.moves, game.turn_moves = None, 0  # States don't keep the moves that led to them
+        return game
+
+    def is_over(self):
+        return self.phase is None
+
+    def current_player(self):
+        """Returns the id of the player making the next decision."""
+        return self.current_pieces[self.current_turn]
+
+    def current_tile(self):
+        """Returns the tile to place this turn, as a new Tile (or None)."""
+        return _tile(self.current_market[self.current_turn])
+
+    def legal_actions(self):
+        """Returns the actions open to the current player (see Search.legal_actions)."""
+        if self.phase == Search.PLACE:
+            return list(self.boards[self.current_player()].legal_placements(self.current_tile())) or [None]
+        return [n + 1 for n, piece in enumerate(self.future_pieces) if piece is None]
+
+    def scores(self):
+        """Returns each player's (total_score, score_details), in player order."""
+        return [board.score(self.center_kingdom, self.full_kingdom) for board in self.boards]
+
+    def apply(self, action):
+        """Returns the state after the current player takes action (see legal_actions).
+        Raises ValueError if the action isn't allowed."""
+        if self.phase == Search.PLACE:
+            player, tile = self.current_player(), self.current_tile()
+            if action is None:
+                if self.boards[player].has_legal_placement(tile):
+                    raise ValueError("You can only pass if there is nowhere to place your tile.")
+                return self._replace(phase = Search.DRAFT)._next_decision()
+            board = self.boards[player].place(action, tile)
+            if not board:
+                raise ValueError(f"'{action}' is not a valid placement")
+            boards = self.boards[:player] + (board,) + self.boards[player + 1:]
+            return self._replace(boards = boards, phase = Search.DRAFT)._next_decision()
+
+        if self.phase == Search.DRAFT:
+            slot = action - 1
+            if not 0 <= slot < self.num_player_pieces or self.future_pieces[slot] is not None:
+                raise ValueError(f"Tile {action} can't be chosen")
+            future_pieces = self.future_pieces[:slot] + (self.current_player(),) + self.future_pieces[slot + 1:]
+            return self._replace(future_pieces = future_pieces)._next_turn()._next_decision()
+
+        raise ValueError("The game is over")
+
+    def _next_decision(self):
+        """Skips ahead over the steps with nothing to decide, like Search.next_decision."""
+        state = self
+        while state.phase is not None:
+            if state.phase == Search.PLACE:
+                if state.current_market[state.current_turn] is not None:
+                    return state
+                state = state._replace(phase = Search.DRAFT)
+            if state.future_market[0] is not None:
+                return state
+            state = state._next_turn()
+        return state
+
+    def _next_turn(self):
+        """Like Game.next_turn, advancing the round (and dealing the next market) after the last turn."""
+        turn = self.current_turn + 1
+        if turn < self.num_player_pieces:
+            return self._replace(current_turn = turn, phase = Search.PLACE)
+        next_round = self.current_round + 1
+        if next_round > self.number_of_rounds:
+            return self._replace(current_round = next_round, current_turn = turn, phase = None)
+
+        empty = (None,) * self.num_player_pieces
+        if next_round == self.number_of_rounds:  # No new tiles are dealt for the last round
+            future_market, remaining = empty, self.remaining
+        else:
+            remaining = self.remaining - self.num_player_pieces
+            dealt = self.deck[remaining:self.remaining][::-1]  # Top of the deck first, as Deck.deal_tile deals them
+            future_market = tuple(sorted(dealt, key = _value))
+        return self._replace(current_round = next_round, current_turn = 0, phase = Search.PLACE,
+                             current_market = self.future_market, current_pieces = self.future_pieces,
+                             future_market = future_market, future_pieces = empty, remaining = remaining)
+
+    def key(self):
+        """A hashable key for the position. States with equal keys have the same actions and outcomes."""
+        return (self.current_round, self.current_turn, self.phase, self.boards,
+                self.current_market, self.future_market, self.current_pieces, self.future_pieces)
+
+
+def _codes(tiles):
+    """The tiles' codes, with the way they've been turned set back to how they're dealt."""
+    shift, bits = Tiles.FIELDS["direction"]
+    dealt = Tiles.DIRECTIONS.index("right") << shift
+    return tuple((Tiles.encode_tile(tile) & ~(((1 << bits) - 1) << shift)) | dealt if tile else None
+                 for tile in tiles)
+
+
+def _ids(pieces):
+    return tuple(piece.id if piece else None for piece in pieces)
+
+
+def _tile(code):
+    return Tiles.decode_tile(code) if code is not None else None
+
+
+def _value(code):
+    shift, bits = Tiles.FIELDS["value"]
+    return (code >> shift) & ((1 << bits) - 1)
@@ -0,0 +1,77 @@
+import random
+import unittest
+
+import Search
+from Game import Game
+from State import GameState
+
+
+def scores(game):
+    return [player.board.score_board(game.center_kingdom, game.full_kingdom)[0] for player in game.players]
+
+
+class TestGameState(unittest.TestCase):
+
+    def test_matches_game(self):
+        #Playing the same moves on a Game and on GameStates gives the same positions
+        for players, seed in ((2, 1), (3, 2), (4, 3)):
+            rng = random.Random(seed)
+            game = Game([str(n) for n in range(players)], deck_type = 0, full_kingdom = True, seed = seed)
+            phase = Search.next_decision(game)
+            state = GameState.from_game(game)
+            while phase is not None:
+                self.assertEqual(state.phase, phase)
+                self.assertEqual(state.current_player(), game.get_current_player().id)
+                self.assertEqual(state.legal_actions(), Search.legal_actions(game, phase))
+                self.assertEqual(state.key(), GameState.from_game(game, phase).key())
+                action = rng.choice(state.legal_actions())
+                phase = Search.apply_action(game, phase, action)
+                state = state.apply(action)
+            self.assertTrue(state.is_over())
+            self.assertEqual([score[0] for score in state.scores()], scores(game))
+
+    def test_immutable(self):
+        game = Game(["A", "B", "C"], deck_type = 0, seed = 5)
+        start = GameState.from_game(game)
+        state = start.apply(start.legal_actions()[0])
+        self.assertIs(state.boards, start.boards, "Drafting doesn't touch any board")
+        while state.current_round == 0:
+            state = state.apply(state.legal_actions()[0])
+        self.assertIs(state.deck, start.deck)
+        self.assertLess(state.remaining, start.remaining)
+        while state.phase != Search.PLACE:
+            state = state.apply(state.legal_actions()[0])
+        player = state.current_player()
+        placed = state.apply(state.legal_actions()[0])
+        self.assertIsNot(placed.boards[player], state.boards[player])
+        for n in range(3):
+            if n != player:
+                self.assertIs(placed.boards[n], state.boards[n], "Boards that didn't change are shared")
+        self.assertNotEqual(placed.boards[player], state.boards[player])
+        self.assertEqual(state.boards[player], GameState.from_game(state.to_game(), state.phase).boards[player],
+                         "Placing a tile on the new state doesn't change the old one")
+        self.assertRaises(AttributeError, setattr, state, "remaining", 0)
+
+    def test_to_game(self):
+        game = Game(["A", "B"], deck_type = 0, seed = 9)
+        state = GameState.from_game(game)
+        for n in range(7):
+            state = state.apply(state.legal_actions()[-1])
+        copy = state.to_game()
+        self.assertEqual(GameState.from_game(copy, state.phase).key(), state.key())
+        phase = state.phase
+        while phase is not None:
+            action = Search.legal_actions(copy, phase)[0]
+            phase = Search.apply_action(copy, phase, action)
+            state = state.apply(action)
+        self.assertEqual([score[0] for score in state.scores()], scores(copy))
+
+    def test_bad_moves(self):
+        state = GameState.from_game(Game(["A", "B"], deck_type = 0, seed = 2))
+        self.assertRaises(ValueError, state.apply, 9)
+        state = state.apply(1)
+        self.assertRaises(ValueError, state.apply, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
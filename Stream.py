@@ -0,0 +1,218 @@
+"""
+Streams the state of a game as small deltas, for clients and spectators following it over a network.
+
+    stream = Stream(table = 1)
+    for message in stream.update(game, phase):      # after every move
+        send(message)
+    ...
+    for message in stream.catch_up():               # for someone who starts following now
+        send(message)
+
+The first update is a keyframe: the table's whole state (a "state" message, see keyframe).
+Every update after that is a "delta" message, with a list of events for what has changed since:
+
+    {"e": "place", "seat": n, "cells": [[col, row, code], ...], "offset": [cols, rows], "edges": {...}, "score": s}
+        Squares were added to player n's kingdom (codes as in Board.encode_kingdom).
+        col and row have the centering taken out, so they stay put however the kingdom is moved.
+        A square is in the view at (col + offset[0], row + offset[1]), and edges bounds the kingdom there.
+    {"e": "claim", "seat": n, "slot": m}
+        Player n claimed tile m (from 0) of the future market.
+    {"e": "table", "current_market": [...], "future_market": [...], "current_pieces": [...], "future_pieces": [...]}
+        A new round was dealt: the whole table, as in a keyframe.
+    {"e": "turned", "slot": m, "direction": d}
+        Tile m of the current market was turned to face direction d.
+    {"e": "turn", "round": r, "turn": t, "phase": p, "seat": n, "over": false}
+        The next decision, with just the fields that have changed. With the legal "placements"
+        when it's a placement (as in a keyframe).
+
+Every message has a sequence number, seq, one more than the message before. Every keyframe_interval updates,
+a keyframe of the state after the delta (with the same seq) is sent after it, so a client that has lost track
+can start again from there. catch_up returns the latest keyframe and the deltas since.
+
+apply carries a state (from a keyframe) forward by a delta, the way a client would.
+
+A stream remembers the boards and the latest keyframe, which take about as much memory as the game.
+While a game isn't being played (like when it's put away on disk, see Sessions), forget lets go of all that
+but seq, and restore picks up again from the game. An update after forget, without restore, is a keyframe.
+"""
+import copy
+from collections import namedtuple
+
+import Search
+
+# What the stream remembers of each board, to tell what a move changed. key is (zobrist, offset, edges),
+# and cells maps each square's position (with the centering taken out) to its code.
+_BoardFrame = namedtuple("_BoardFrame", ["key", "cells", "score"])
+
+
+class Stream:
+    """The messages for one table. table is put in every message, to tell tables apart."""
+
+    def __init__(self, table = None, keyframe_interval = 32):
+        assert keyframe_interval >= 1, 'There has to be a keyframe at least every update'
+        self.table = table
+        self.keyframe_interval = keyframe_interval
+        self.seq = -1
+        self.latest_keyframe = None
+        self.deltas = []  # The deltas since the latest keyframe
+        self._boards = None
+        self._frame = None  # The rest of the state, as last sent
+
+    def update(self, game, phase):
+        """Returns the messages to send after a move (or at the start): a keyframe, or a delta
+        and sometimes a keyframe after it. phase is the next decision (see Search.next_decision)."""
+        self.seq += 1
+        boards = [self._board_frame(player.board, old, game)
+                  for player, old in zip(game.players, self._boards or [None] * len(game.players))]
+        frame = self._table_frame(game, phase)
+        if self._boards is None:
+            self._boards, self._frame = boards, frame
+            return [self._keyframe(game, phase)]
+
+        events = []
+        for seat, (old, new) in enumerate(zip(self._boards, boards)):
+            if old.key != new.key:
+                board = game.players[seat].board
+                cells = [[col, row, code] for (col, row), code in new.cells.items() if old.cells.get((col, row)) != code]
+                events.append({"e": "place", "seat": seat, "cells": cells, "offset": list(board.offset),
+                               "edges": dict(board.edges), "score": new.score})
+        old = self._frame
+        if old["future_market"] == frame["future_market"]:
+            events.extend({"e": "claim", "seat": seat, "slot": slot}
+                          for slot, (before, seat) in enumerate(zip(old["future_pieces"], frame["future_pieces"]))
+                          if before != seat)
+            events.extend({"e": "turned", "slot": slot, "direction": tile["direction"]}
+                          for slot, (before, tile) in enumerate(zip(old["current_market"], frame["current_market"]))
+                          if before != tile)
+        else:
+            events.append({"e": "table", **{key: frame[key] for key in
+                                            ("current_market", "future_market", "current_pieces", "future_pieces")}})
+        turn = {key: frame[key] for key in ("round", "turn", "phase", "seat", "over") if frame[key] != old[key]}
+        if turn:
+            if phase == Search.PLACE:
+                turn["placements"] = frame["placements"]
+            events.append({"e": "turn", **turn})
+
+        self._boards, self._frame = boards, frame
+        delta = {"type": "delta", "table": self.table, "seq": self.seq, "events": events}
+        if self.seq % self.keyframe_interval:
+            self.deltas.append(delta)
+            return [delta]
+        return [delta, self._keyframe(game, phase)]
+
+    def forget(self):
+        """Lets go of everything the stream remembers of the game, but seq (see restore)."""
+        self.latest_keyframe, self.deltas, self._boards, self._frame = None, [], None, None
+
+    def restore(self, game, phase):
+        """Picks up after forget, from game (in the position it was in then, with phase its next decision).
+        Does nothing if the stream hasn't forgotten anything."""
+        if self._boards is not None or self.seq < 0:
+            return
+        self._boards = [self._board_frame(player.board, None, game) for player in game.players]
+        self._frame = self._table_frame(game, phase)
+        self._keyframe(game, phase)
+
+    def catch_up(self):
+        """Returns the messages someone starting to follow the table needs: the latest keyframe, then the deltas since."""
+        if self.latest_keyframe is None:
+            return []
+        return [self.latest_keyframe] + self.deltas
+
+    def keyframe(self, game, phase):
+        """Returns the whole state of the table now, as a "state" message (without changing the stream)."""
+        boards = [self._board_frame(player.board, None, game) for player in game.players]
+        return _state(self.table, self.seq, game, boards, self._table_frame(game, phase))
+
+    def _keyframe(self, game, phase):
+        self.latest_keyframe = _state(self.table, self.seq, game, self._boards, self._frame)
+        self.deltas = []
+        return self.latest_keyframe
+
+    @staticmethod
+    def _board_frame(board, old, game):
+        """Returns a _BoardFrame for board, reusing old if the board hasn't changed since."""
+        key = (board.zobrist, tuple(board.offset), tuple(board.edges.values()))
+        if old is not None and old.key == key:
+            return old
+        height, width, codes = board.encode_kingdom()
+        left, top = board.edges["left"] - board.offset[0], board.edges["top"] - board.offset[1]
+        cells = {}
+        for index, code in enumerate(codes):
+            if code:
+                row, col = divmod(index, width)
+                cells[(left + col, top + row)] = code
+        score, details = board.score_board(game.center_kingdom, game.full_kingdom)
+        return _BoardFrame(key, cells, score)
+
+    @staticmethod
+    def _table_frame(game, phase):
+        table = game.table
+        frame = {"round": game.current_round, "turn": game.current_turn, "phase": phase,
+                 "seat": game.get_current_player().id if phase is not None else None, "over": phase is None,
+                 "current_market": [tile_state(tile) for tile in table.current_market],
+                 "future_market": [tile_state(tile) for tile in table.future_market],
+                 "current_pieces": [piece and piece.id for piece in table.current_player_pieces],
+                 "future_pieces": [piece and piece.id for piece in table.future_player_pieces]}
+        if phase == Search.PLACE:
+            board, tile = game.get_current_player().board, game.get_current_tile()
+            frame["placements"] = [[board.chess_coordinate(col, row), direction]
+                                   for col, row, direction in board.legal_placements(tile)]
+        return frame
+
+
+def _state(table, seq, game, boards, frame):
+    state = {"type": "state", "table": table, "seq": seq, "started": True, "boards": []}
+    for player, board_frame in zip(game.players, boards):
+        board = player.board
+        height, width, codes = board.encode_kingdom()
+        state["boards"].append({"name": player.handle, "score": board_frame.score, "edges": dict(board.edges),
+                                "offset": list(board.offset), "kingdom": codes, "width": width})
+    state.update(frame)
+    return state
+
+
+def tile_state(tile):
+    """A tile as it's sent to clients (or None)."""
+    if not tile:
+        return None
+    return {"tile": str(tile), "value": tile.get_value(), "direction": tile.get_direction()}
+
+
+def apply(state, message):
+    """Returns state (a "state" message) brought up to date by message: a delta, or a keyframe.
+    state isn't changed. Raises ValueError if message doesn't follow on from state."""
+    if message["type"] == "state":
+        return copy.deepcopy(message)
+    if message["seq"] != state["seq"] + 1:
+        raise ValueError(f"Delta {message['seq']} doesn't follow state {state['seq']}")
+    state = copy.deepcopy(state)
+    state["seq"] = message["seq"]
+    for event in message["events"]:
+        kind = event["e"]
+        if kind == "place":
+            board = state["boards"][event["seat"]]
+            edges, offset = board["edges"], board["offset"]
+            cells = {}
+            for index, code in enumerate(board["kingdom"]):
+                if code:
+                    row, col = divmod(index, board["width"])
+                    cells[(edges["left"] + col - offset[0], edges["top"] + row - offset[1])] = code
+            cells.update(((col, row), code) for col, row, code in event["cells"])
+            edges, offset = event["edges"], event["offset"]
+            board["kingdom"] = [cells.get((col - offset[0], row - offset[1]), 0)
+                                for row in range(edges["top"], edges["bottom"] + 1)
+                                for col in range(edges["left"], edges["right"] + 1)]
+            board.update(edges = edges, offset = offset, width = edges["right"] - edges["left"] + 1,
+                         score = event["score"])
+        elif kind == "claim":
+            state["future_pieces"][event["slot"]] = event["seat"]
+        elif kind == "turned":
+            state["current_market"][event["slot"]]["direction"] = event["direction"]
+        elif kind in ("table", "turn"):
+            if kind == "turn":
+                state.pop("placements", None)  # They're only sent for placements
+            state.update((key, value) for key, value in event.items() if key != "e")
+        else:
+            raise ValueError(f"Unknown event '{kind}'")
+    return state
@@ -0,0 +1,89 @@
+import json
+import unittest
+
+import Bots
+import Search
+import Stream
+from Game import Game
+
+
+def stream_game(players, seed, keyframe_interval = 32, center_kingdom = False):
+    """Plays a game between random bots, streaming it. Yields the game, its phase, and the messages after each move."""
+    game = Game([f"P{n}" for n in range(players)], deck_type = 0, center_kingdom = center_kingdom, seed = seed)
+    stream = Stream.Stream(seed, keyframe_interval)
+    bot = Bots.RandomBot(seed)
+    phase = Search.next_decision(game)
+    yield game, phase, stream, stream.update(game, phase)
+    while phase is not None:
+        action = bot.choose_placement(game) if phase == Search.PLACE else bot.choose_tile(game)
+        phase = Search.apply_action(game, phase, action)
+        yield game, phase, stream, stream.update(game, phase)
+
+
+class TestStream(unittest.TestCase):
+
+    def test_deltas(self):
+        """A client applying the deltas always has the same state as a keyframe would give it."""
+        for players, seed in ((2, 1), (3, 2), (4, 3)):
+            state, keyframes, delta_bytes, state_bytes = None, 0, 0, 0
+            for game, phase, stream, messages in stream_game(players, seed, center_kingdom = True):
+                for message in messages:
+                    state = Stream.apply(state, message)
+                    if message["type"] == "state":
+                        keyframes += 1
+                    else:
+                        delta_bytes += len(json.dumps(message))
+                        state_bytes += len(json.dumps(stream.keyframe(game, phase)))
+                self.assertEqual(state, stream.keyframe(game, phase))
+            self.assertTrue(state["over"])
+            self.assertEqual(keyframes, 1 + state["seq"] // 32)
+            self.assertLess(delta_bytes, state_bytes / 3, "Deltas are much smaller than whole states")
+
+    def test_catch_up(self):
+        """Someone starting partway through catches up from the latest keyframe and the deltas after it."""
+        for game, phase, stream, messages in stream_game(3, 4, keyframe_interval = 10):
+            catch_up = stream.catch_up()
+            self.assertEqual(catch_up[0]["type"], "state")
+            self.assertLessEqual(len(catch_up), 10)
+            state = None
+            for message in catch_up:
+                state = Stream.apply(state, message)
+            self.assertEqual(state["seq"], stream.seq)
+            self.assertEqual(state, stream.keyframe(game, phase))
+
+    def test_forget(self):
+        """A stream that forgets the game picks up again from it, and clients can't tell."""
+        state, restored = None, None
+        for game, phase, stream, messages in stream_game(4, 6, keyframe_interval = 10):
+            if restored is not None:
+                # Restored, it carries on with deltas. Otherwise it starts again with a keyframe.
+                self.assertEqual(messages[0]["type"], "delta" if restored else "state")
+                restored = None
+            for message in messages:
+                state = Stream.apply(state, message)
+            if stream.seq % 7 == 3:
+                stream.forget()
+                self.assertEqual((stream.latest_keyframe, stream.deltas), (None, []))
+                restored = bool(stream.seq % 2)
+                if restored:
+                    stream.restore(game, phase)
+                    self.assertEqual(stream.catch_up(), [state])
+            self.assertEqual(state, stream.keyframe(game, phase))
+        self.assertTrue(state["over"])
+
+    def test_events(self):
+        messages = [message for game, phase, stream, sent in stream_game(2, 5) for message in sent]
+        self.assertEqual([message["seq"] for message in messages if message["type"] == "delta"],
+                         list(range(1, messages[-1]["seq"] + 1)))
+        first = messages[1]["events"]  # Someone claiming a tile: no board has changed yet
+        self.assertEqual([event["e"] for event in first], ["claim", "turn"])
+        places = [event for message in messages if message["type"] == "delta"
+                  for event in message["events"] if event["e"] == "place"]
+        self.assertTrue(all(len(event["cells"]) == 2 for event in places))
+
+        state = Stream.apply(None, messages[0])
+        self.assertRaises(ValueError, Stream.apply, state, messages[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
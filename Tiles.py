@@ -1,7 +1,12 @@
 """
 This contains the Tile and Deck classes for Princedomino.
 """
+import array
+import functools
+import os
 import random
+import sys
+import types
 
 # These are all possible squares - the suit, followed by a crown array.
 SQUARESET = {
@@ -9,14 +14,52 @@ SQUARESET = {
     "water": [12, 6, 0, 0], "swamp": [6, 2, 2, 0], "mine": [1, 1, 3, 1]
 }
 
+# Each terrain's position in this tuple is its terrain code (and its rank when valuing tiles).
+TERRAINS = ("wheat", "forest", "water", "grass", "swamp", "mine")
+TERRAIN_RANK = {terrain: rank for rank, terrain in enumerate(TERRAINS)}
+# The directions a tile can face, in clockwise order. A direction's position is its direction code.
+DIRECTIONS = ("left", "up", "right", "down")
+
 
 class Square:
-    def __init__(self, terrain, crowns):
-        assert terrain in SQUARESET, terrain + " not a valid terrain type"
-        assert SQUARESET[terrain][int(crowns)] != 0, (
-                    str(crowns) + " is not a valid number of crowns for " + str(terrain))
-        self.terrain = str(terrain)
-        self.crowns = int(crowns)
+    """A square is a terrain with a number of crowns.
+
+    Squares are immutable, and there is only ever one Square for each (terrain, crowns):
+    Square("wheat", 1) always returns the same object. So squares can be compared
+    and hashed by identity, and copying a board never copies its squares.
+    """
+    __slots__ = ("terrain", "crowns")
+    _instances = {}
+
+    def __new__(cls, terrain, crowns):
+        square = cls._instances.get((terrain, crowns))
+        if square is None:
+            assert terrain in SQUARESET, terrain + " not a valid terrain type"
+            assert SQUARESET[terrain][int(crowns)] != 0, (
+                        str(crowns) + " is not a valid number of crowns for " + str(terrain))
+            square = cls._instances.get((str(terrain), int(crowns)))
+            if square is None:
+                square = super(Square, cls).__new__(cls)
+                object.__setattr__(square, "terrain", str(terrain))
+                object.__setattr__(square, "crowns", int(crowns))
+                cls._instances[(square.terrain, square.crowns)] = square
+            cls._instances[(terrain, crowns)] = square  # Also remember it by the arguments as given (e.g. "1")
+        return square
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Squares are immutable")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return Square, (self.terrain, self.crowns)
+
+    def __repr__(self):
+        return f"Square({self.terrain!r}, {self.crowns})"
 
     def __str__(self):
         return str(self.crowns) + self.terrain
@@ -58,21 +101,25 @@ class Tile:
     The direction can be "left", "right", "up", or "down", and defaults to "left".
     """
 
+    __slots__ = ("square1", "square2", "direction", "value", "face")
+    order = TERRAINS
+
     def __init__(self, square1=None, square2=None, value=None):
         """Each terrain variable is a Square object
 
         If the tile value is not provided, it is calculated"""
 
-        self.order = ["wheat", "forest", "water", "grass", "swamp", "mine"]
         if square1 is None or square2 is None:
             raise ValueError("Must provide two squares as input")
-        assert square1 != square2, "Can't use the same square twice"
+        # (Both squares may be the same object, since equal squares are shared)
 
         s1, s2 = self.sort_squares(square1, square2)
 
         self.square1 = s1
         self.square2 = s2
         self.direction = "right"
+        # The two squares, in order. Tiles with the same face look the same, whatever their value.
+        self.face = (s1, s2)
 
         # calculate value (if value provided, use that instead).
         self.value = self.calculate_value(value)
@@ -103,25 +150,41 @@ class Tile:
     def get_direction(self):
         return self.direction
 
+    def set_direction(self, direction):
+        """Turn the tile to face direction ('left', 'up', 'right', or 'down')."""
+        assert direction in DIRECTIONS, str(direction) + " is not a valid direction"
+        self.direction = direction
+
     def rotate(self, spin="clockwise"):
         """Rotate the card's direction either 'clockwise' or 'counterclockwise'. Default is clockwise.
 
         Directions cycle from 'left' to 'up' to 'right' to 'down'."""
-        rotate = ['left', 'up', 'right', 'down']
+        rotate = DIRECTIONS
         if spin == "counterclockwise":
             mult = -1
         elif spin == "clockwise":
             mult = 1
         self.direction = rotate[(rotate.index(self.direction) + mult) % 4]
 
+    def copy(self):
+        """Returns a copy of the tile, which can be turned without turning this one."""
+        new = Tile.__new__(Tile)
+        for name in Tile.__slots__:
+            setattr(new, name, getattr(self, name))
+        return new
+
+    def get_code(self):
+        """Returns the tile packed into an integer (see encode_tile)."""
+        return encode_tile(self)
+
     def calculate_value(self, value=None):
         if value:
             return int(value)
-        value = 50 * (self.square1.get_crowns() + self.square2.get_crowns())
-        value += self.order.index(self.square2.get_terrain())
-        if self.square1.get_terrain() == self.square2.get_terrain():
+        value = 50 * (self.square1.crowns + self.square2.crowns)
+        value += TERRAIN_RANK[self.square2.terrain]
+        if self.square1.terrain == self.square2.terrain:
             return value
-        value += ((1 + self.order.index(self.square1.get_terrain())) * 7)
+        value += ((1 + TERRAIN_RANK[self.square1.terrain]) * 7)
         return value
 
     def sort_squares(self, square1, square2):
@@ -134,7 +197,7 @@ class Tile:
             return square1, square2
 
         # If crowns are the same, sort based on the suit order
-        if self.order.index(square1.get_terrain()) > self.order.index(square2.get_terrain()):
+        if TERRAIN_RANK[square1.get_terrain()] > TERRAIN_RANK[square2.get_terrain()]:
             return square2, square1
         else:
             return square1, square2
@@ -146,9 +209,146 @@ class Tile:
     #                       CARD_SIZE)
 
 
+# Tile codec
+# A tile packs into a 21 bit integer. From the lowest bit up:
+#   bits 0-2    square1 terrain (its index in TERRAINS)
+#   bits 3-4    square1 crowns
+#   bits 5-7    square2 terrain
+#   bits 8-9    square2 crowns
+#   bits 10-11  direction (its index in DIRECTIONS)
+#   bits 12-20  value
+# The lowest 10 bits (FACE_MASK) are the tile's face: two tiles that look the same share them.
+# NO_TILE stands in for an empty place in a market (terrain 7 is never a real terrain).
+FIELDS = {"terrain1": (0, 3), "crowns1": (3, 2), "terrain2": (5, 3), "crowns2": (8, 2),
+          "direction": (10, 2), "value": (12, 9)}
+FACE_MASK = (1 << 10) - 1
+NO_TILE = (1 << 21) - 1
+
+
+def pack_tile(terrain1, crowns1, terrain2, crowns2, direction = 2, value = 0):
+    """Packs the fields of a tile (as codes) into an integer.
+    The arguments can also be NumPy arrays, to pack many tiles at once.
+    Raises ValueError if a field (of a single tile) doesn't fit in its bits (see FIELDS)."""
+    fields = (terrain1, crowns1, terrain2, crowns2, direction, value)
+    if all(isinstance(field, int) for field in fields):
+        for (name, (shift, bits)), field in zip(FIELDS.items(), fields):
+            if not 0 <= field < 1 << bits:
+                raise ValueError(f"{name} {field} doesn't fit in a tile code ({bits} bits)")
+    return (terrain1 | (crowns1 << 3) | (terrain2 << 5) | (crowns2 << 8)
+            | (direction << 10) | (value << 12))
+
+
+def tile_fields(codes):
+    """Returns a dictionary of each field in codes (see FIELDS).
+    codes can be a single code, or a NumPy array of codes to unpack a whole deck at once."""
+    return {field: (codes >> shift) & ((1 << bits) - 1) for field, (shift, bits) in FIELDS.items()}
+
+
+def encode_tile(tile):
+    """Packs a Tile into an integer. None (an empty market place) becomes NO_TILE."""
+    if tile is None:
+        return NO_TILE
+    return pack_tile(TERRAIN_RANK[tile.square1.terrain], tile.square1.crowns,
+                     TERRAIN_RANK[tile.square2.terrain], tile.square2.crowns,
+                     DIRECTIONS.index(tile.direction), tile.value)
+
+
+def decode_tile(code):
+    """Returns a new Tile from an integer made by encode_tile (or None for NO_TILE)."""
+    code = int(code)
+    if code == NO_TILE:
+        return None
+    fields = tile_fields(code)
+    tile = Tile(Square(TERRAINS[fields["terrain1"]], fields["crowns1"]),
+                Square(TERRAINS[fields["terrain2"]], fields["crowns2"]))
+    tile.value = fields["value"]
+    tile.direction = DIRECTIONS[fields["direction"]]
+    return tile
+
+
+def is_square_code(terrain, crowns):
+    """Whether a terrain code and a number of crowns make a real Square."""
+    return 0 <= terrain < len(TERRAINS) and 0 <= crowns < len(SQUARESET[TERRAINS[terrain]]) \
+        and SQUARESET[TERRAINS[terrain]][crowns] != 0
+
+
+def is_tile_code(code):
+    """Whether code could have come from encode_tile (or is NO_TILE), so decode_tile can be trusted with it."""
+    if code == NO_TILE:
+        return True
+    if not 0 <= code < NO_TILE:
+        return False
+    fields = tile_fields(code)
+    return is_square_code(fields["terrain1"], fields["crowns1"]) and is_square_code(fields["terrain2"], fields["crowns2"])
+
+
+def encode_tiles(tiles):
+    """Packs a deck, market, or any list of tiles into an array of codes (array.array('I'))."""
+    return array.array("I", [encode_tile(tile) for tile in tiles])
+
+
+def decode_tiles(codes):
+    """Returns a list of Tiles from a sequence of codes (an array, list, or NumPy array)."""
+    return [decode_tile(code) for code in codes]
+
+
+# The standard deck
+# The tiles are read once per process, from the CSV in the Kingdomino-For-Queens submodule,
+# or from a precompiled binary asset if one has been made with compile_standard_deck.
+# (The binary is a short header, then each tile's code as a little-endian 32 bit integer.)
+_HERE = os.path.dirname(os.path.abspath(__file__))
+STANDARD_DECK_CSV = os.path.join(_HERE, "Kingdomino-For-Queens", "kingdomino.csv")
+STANDARD_DECK_BINARY = os.path.join(_HERE, "kingdomino.bin")
+_BINARY_HEADER = b"PDTILES1"
+
+
+def _read_csv_template(path):
+    with open(path, "r") as f:
+        lines = f.readlines()
+    dominos = [d.split(",") for d in lines[1:] if d.strip()]
+    return tuple(encode_tile(Tile(Square(domino[1], domino[5]), Square(domino[3], domino[6]), domino[0]))
+                 for domino in dominos)
+
+
+def _read_binary_template(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(_BINARY_HEADER):
+        raise ValueError(f"{path} is not a PrinceDomino tile file")
+    codes = array.array("I")
+    codes.frombytes(data[len(_BINARY_HEADER):])
+    if sys.byteorder == "big":
+        codes.byteswap()
+    return tuple(codes)
+
+
+@functools.lru_cache(maxsize=None)
+def load_standard_template(path = None):
+    """Returns the standard deck as an (immutable) tuple of tile codes, reading it only once per path.
+
+    By default, this reads STANDARD_DECK_BINARY if it exists, and STANDARD_DECK_CSV otherwise.
+    A path ending in .csv is read as a CSV, and any other path as a binary asset.
+    """
+    if path is None:
+        path = STANDARD_DECK_BINARY if os.path.exists(STANDARD_DECK_BINARY) else STANDARD_DECK_CSV
+    if path.endswith(".csv"):
+        return _read_csv_template(path)
+    return _read_binary_template(path)
+
+
+def compile_standard_deck(csv_path = STANDARD_DECK_CSV, binary_path = STANDARD_DECK_BINARY):
+    """Writes the tiles in csv_path to a binary asset at binary_path, which loads without parsing."""
+    codes = array.array("I", _read_csv_template(csv_path))
+    if sys.byteorder == "big":
+        codes.byteswap()
+    with open(binary_path, "wb") as f:
+        f.write(_BINARY_HEADER + codes.tobytes())
+    load_standard_template.cache_clear()
+
+
 # define deck class
 class Deck:
-    def __init__(self, standard=False, deck=None):
+    def __init__(self, standard=False, deck=None, rng=None):
         """
         A deck is a list of Kingdomino Tile objects.
         It has standard deck operations, such as dealing and shuffling.
@@ -156,37 +356,89 @@ class Deck:
         Calling Deck with no parameters will return a deck of randomly generated tiles.
         To use the standard deck of tiles, pass (standard = True).
         To use a specific deck, pass (deck = [list_of_tiles])
+        Random decks are drawn from rng (a random.Random), or the random module if it isn't given.
+
+        Internally, a deck is a template of tile codes, and a permutation (self.order) of the
+        template positions. The first self.remaining entries of order are still in the deck,
+        with the top of the deck last, so dealing just moves that cursor down.
+        The standard template is shared by every standard deck, and its Tiles are
+        only built when they are dealt or looked at.
         """
         if deck:
-            self.deck = deck
+            self._set_template(tuple(encode_tiles(deck)), list(deck))
         elif standard:
-            self.deck = self._standard_deck()
+            self._set_template(load_standard_template())
         else:
-            self.deck = self._random_deck()
+            tiles = self._random_deck(rng or random)
+            self._set_template(tuple(encode_tiles(tiles)), tiles)
 
     def __len__(self):
-        return len(self.deck)
+        return self.remaining
+
+    @classmethod
+    def from_codes(cls, codes):
+        """Returns a deck holding the tiles in a sequence of tile codes (such as a row from
+        Batch.generate_decks), with the last code on top. Tiles are built as they are needed."""
+        deck = cls.__new__(cls)
+        deck._set_template(tuple(int(code) for code in codes))
+        return deck
+
+    def _set_template(self, template, tiles = None):
+        self.template = template
+        self.tiles = tiles if tiles is not None else [None] * len(template)
+        self.order = list(range(len(template)))
+        self.remaining = len(template)
+        self._index_positions()
+        # How many of each face (see FACE_MASK) are still in the deck. Faces that run out are removed.
+        self.face_counts = {}
+        for code in template:
+            face = code & FACE_MASK
+            self.face_counts[face] = self.face_counts.get(face, 0) + 1
+        # Template positions still in the deck, for each face.
+        self.face_positions = {}
+        for index, code in enumerate(template):
+            self.face_positions.setdefault(code & FACE_MASK, set()).add(index)
+
+    def _index_positions(self):
+        """Rebuilds self.position, which gives where each template position sits in self.order"""
+        self.position = [0] * len(self.order)
+        for place, index in enumerate(self.order):
+            self.position[index] = place
+
+    def _tile(self, index):
+        """Returns the Tile at position index of the template, building it the first time it's needed."""
+        tile = self.tiles[index]
+        if tile is None:
+            tile = decode_tile(self.template[index])
+            self.tiles[index] = tile
+        return tile
+
+    @property
+    def deck(self):
+        """The list of tiles remaining in the deck, with the top of the deck at the end."""
+        return [self._tile(index) for index in self.order[:self.remaining]]
+
+    def remaining_faces(self):
+        """Returns a read-only view of how many tiles of each face (a tile code & FACE_MASK)
+        are still in the deck. It stays up to date as the deck is dealt, so it only needs fetching once."""
+        return types.MappingProxyType(self.face_counts)
+
+    def remaining_codes(self):
+        """Returns the codes of the tiles still in the deck, with the top of the deck last."""
+        return [self.template[index] for index in self.order[:self.remaining]]
 
     @staticmethod
     def _standard_deck():
         """Generates the standard deck for KingDomino, courtesy of
         https://github.com/RuPaulsDataRace/Kingdomino-For-Queens
         """
-        standeck = []
-        with open("./Kingdomino-For-Queens/kingdomino.csv", "r") as f:
-            lines = f.readlines()
-        dominos = [d.split(",") for d in lines[1:]]
-        for domino in dominos:
-            tile = Tile(Square(domino[1],domino[5]),
-                        Square(domino[3],domino[6]), domino[0])
-            standeck.append(tile)
-        return standeck
+        return decode_tiles(load_standard_template())
 
     @staticmethod
-    def _random_deck():
+    def _random_deck(rng=random):
         squares = Square.all_squares()
         # Randomly combine pairs of squares into a tile.
-        random.shuffle(squares)
+        rng.shuffle(squares)
         randeck = []
         while len(squares) != 0:
             s1, s2 = squares.pop(), squares.pop()
@@ -200,15 +452,57 @@ class Deck:
 
     def contains(self, tile):
         """Returns whether an equivalent tile appears in deck
-        Note: This looks for a string representation, not the actual object.
+        Note: This compares the tiles' faces (their squares), not the actual objects or their values.
         """
-        for domino in self.deck:
-            if str(domino) == str(tile):
-                return True
-        return False
-
-    def shuffle(self):
-        random.shuffle(self.deck)
+        return (encode_tile(tile) & FACE_MASK) in self.face_counts
+
+    def remove(self, tile):
+        """Takes a tile with the same face as tile out of the deck, and returns it.
+        Returns None if there isn't one."""
+        face = encode_tile(tile) & FACE_MASK
+        positions = self.face_positions.get(face)
+        if not positions:
+            return None
+        index = positions.pop()
+        # Swap it to the top of the deck, then deal it.
+        top = self.remaining - 1
+        place, top_index = self.position[index], self.order[top]
+        self.order[place], self.order[top] = top_index, index
+        self.position[top_index], self.position[index] = place, top
+        return self._tile(self._deal(1)[0])
+
+    def copy(self):
+        """Returns an independent copy of the deck, in the same order.
+        The copy shares the template, but builds its own Tiles."""
+        new = Deck.__new__(Deck)
+        new.template = self.template
+        new.tiles = [None] * len(self.template)
+        new.order, new.remaining, new.position = list(self.order), self.remaining, list(self.position)
+        new.face_counts = dict(self.face_counts)
+        new.face_positions = {face: set(positions) for face, positions in self.face_positions.items()}
+        return new
+
+    def shuffle(self, rng=random):
+        """Shuffles the deck, using rng (a random.Random) if it's given."""
+        remaining = self.order[:self.remaining]
+        rng.shuffle(remaining)
+        self.order[:self.remaining] = remaining
+        self._index_positions()
+
+    def _deal(self, amount):
+        """Moves the cursor past the top amount tiles, and returns their template positions (top first)."""
+        if amount < 0:
+            raise ValueError(f"Can't deal {amount} tiles")
+        dealt = self.order[self.remaining - amount:self.remaining]
+        dealt.reverse()
+        self.remaining -= amount
+        for index in dealt:
+            face = self.template[index] & FACE_MASK
+            self.face_positions[face].discard(index)
+            self.face_counts[face] -= 1
+            if not self.face_counts[face]:
+                del self.face_counts[face]
+        return dealt
 
     def deal_tile(self, amount = 1):
         """Returns one object from the top of the deck.
@@ -217,16 +511,20 @@ class Deck:
         Returns that many objects from the top of the deck
 
         Function returns None if there are not enough cards remaining in the deck to draw amount.
+        Raises ValueError if amount is negative.
         """
-        try:
-            if amount == 1:
-                return self.deck.pop()
-            deal = []
-            for card in range(amount):
-                deal.append(self.deck.pop())
-            return deal
-        except IndexError:
+        if amount > self.remaining:
+            return None
+        if amount == 1:
+            return self._tile(self._deal(1)[0])
+        return [self._tile(index) for index in self._deal(amount)]
+
+    def discard(self, amount):
+        """Removes amount tiles from the top of the deck without building them.
+        Returns their codes (top first), or None if there are not enough tiles. Raises ValueError if amount is negative."""
+        if amount > self.remaining:
             return None
+        return tuple(self.template[index] for index in self._deal(amount))
 
     def __str__(self):
         string = " \n".join([str(d) for d in self.deck])
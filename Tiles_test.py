@@ -1,5 +1,11 @@
+import copy
+import os
+import pickle
+import tempfile
 import unittest
-from Tiles import Tile, Deck, Square
+from Tiles import Tile, Deck, Square, TERRAINS, DIRECTIONS, NO_TILE, FACE_MASK
+from Tiles import encode_tiles, decode_tiles, decode_tile, tile_fields, pack_tile
+from Tiles import load_standard_template, compile_standard_deck
 
 
 class TestTile(unittest.TestCase):
@@ -101,6 +107,67 @@ class TestTile(unittest.TestCase):
                                      "\ninputs:" + str(t1) + str(t2) + "\n"))
 
 
+class TestSquare(unittest.TestCase):
+    def test_flyweight(self):
+        s1 = Square("wheat", 1)
+        self.assertIs(s1, Square("wheat", 1))
+        self.assertIs(s1, Square("wheat", "1"), "The CSV passes crowns as strings")
+        self.assertIsNot(s1, Square("wheat", 0))
+        self.assertIs(copy.deepcopy(s1), s1)
+        self.assertIs(pickle.loads(pickle.dumps(s1)), s1)
+        self.assertEqual(len(set(Square.all_squares())), 16, "One square per (terrain, crowns)")
+        with self.assertRaises(AttributeError):
+            s1.crowns = 2
+
+    def test_slotted_tile(self):
+        s = Square("grass", 0)
+        t = Tile(s, s)
+        self.assertFalse(hasattr(t, "__dict__"))
+        t2 = copy.deepcopy(t)
+        self.assertEqual(t2.face, t.face)
+        self.assertEqual(t2.get_value(), t.get_value())
+        self.assertIs(t2.get_square1(), s)
+
+
+class TestCodec(unittest.TestCase):
+    def test_round_trip(self):
+        d = Deck()
+        for n, t in enumerate(d.deck):
+            t.set_direction(DIRECTIONS[n % 4])
+        codes = encode_tiles(d.deck + [None])
+        self.assertEqual(codes[-1], NO_TILE)
+        for t, decoded in zip(d.deck, decode_tiles(codes)):
+            self.assertEqual(decoded.get_details(), t.get_details())
+            self.assertEqual(decoded.face, t.face)
+            self.assertEqual(decoded.get_code(), t.get_code())
+        self.assertIsNone(decode_tile(NO_TILE))
+
+    def test_fields(self):
+        t = Tile(Square("mine", 3), Square("swamp", 2))
+        t.rotate()
+        fields = tile_fields(t.get_code())
+        self.assertEqual(fields["terrain1"], TERRAINS.index("mine"))
+        self.assertEqual(fields["crowns1"], 3)
+        self.assertEqual(fields["terrain2"], TERRAINS.index("swamp"))
+        self.assertEqual(fields["crowns2"], 2)
+        self.assertEqual(DIRECTIONS[fields["direction"]], "down")
+        self.assertEqual(fields["value"], t.get_value())
+        self.assertEqual(pack_tile(**fields), t.get_code())
+        for field, bad in (("crowns1", 4), ("terrain2", 8), ("direction", -1), ("value", 512)):
+            self.assertRaises(ValueError, pack_tile, **dict(fields, **{field: bad}))
+
+    def test_vectorized(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("needs NumPy")
+        d = Deck()
+        codes = numpy.array(encode_tiles(d.deck))
+        fields = tile_fields(codes)
+        self.assertEqual(list(fields["value"]), [t.get_value() for t in d.deck])
+        self.assertEqual(list(pack_tile(**fields)), list(codes))
+
+
 class TestDeck(unittest.TestCase):
     def test_test_deck(self):
         s13, s14 = Square("swamp", 2), Square("water", 0)
@@ -127,6 +194,51 @@ class TestDeck(unittest.TestCase):
         self.assertTrue(d.contains(t7), "Deck contains standard Tile #1")
         self.assertTrue(d.contains(t8), "Deck contains standard Tile #21")
 
+    def test_standard_template(self):
+        with tempfile.TemporaryDirectory() as folder:
+            csv_path = os.path.join(folder, "tiles.csv")
+            with open(csv_path, "w") as f:
+                f.write("Tile,Left,Left Num,Right,Right Num,Left Crowns,Right Crowns\n")
+                f.write("1,wheat,0,wheat,0,0,0\n")
+                f.write("21,wheat,0,grass,0,1,0\n")
+            template = load_standard_template(csv_path)
+            self.assertIs(load_standard_template(csv_path), template, "Only read once")
+            self.assertEqual([str(t) for t in decode_tiles(template)], ["[0wheat|0wheat]", "[1wheat|0grass]"])
+            self.assertEqual([t.get_value() for t in decode_tiles(template)], [1, 21])
+
+            binary_path = os.path.join(folder, "tiles.bin")
+            compile_standard_deck(csv_path, binary_path)
+            self.assertEqual(load_standard_template(binary_path), template)
+
+    def test_index_and_cursor(self):
+        d = Deck()
+        d.shuffle()
+        faces = d.remaining_faces()
+        tiles = list(d.deck)
+        top = tiles[-1]
+        self.assertTrue(d.contains(top))
+        self.assertIs(d.deal_tile(), top)
+        self.assertEqual(faces.get(top.get_code() & FACE_MASK, 0), sum(t.face == top.face for t in tiles[:-1]))
+
+        middle = tiles[10]
+        copies = sum(t.face == middle.face for t in d.deck)
+        removed = d.remove(middle)
+        self.assertEqual(removed.face, middle.face)
+        self.assertEqual(len(d), 46)
+        self.assertNotIn(removed, d.deck)
+        self.assertEqual(sum(t.face == middle.face for t in d.deck), copies - 1)
+        discarded = d.discard(5)
+        self.assertEqual(len(discarded), 5)
+        self.assertIsNone(d.discard(100))
+        self.assertRaises(ValueError, d.discard, -1)
+        self.assertRaises(ValueError, d.deal_tile, -2)
+        dealt = d.deal_tile(41)
+        self.assertEqual(len(dealt), 41)
+        self.assertNotIn(removed, dealt)
+        self.assertEqual(len(d), 0)
+        self.assertEqual(dict(faces), {}, "The face counts stay current")
+        self.assertIsNone(d.remove(middle))
+
     def test_random_deck(self):
         try:
             d = Deck(False)
@@ -0,0 +1,130 @@
+"""
+Runs many bot-vs-bot games of PrinceDomino, spread over a pool of worker processes, and reports who wins.
+
+    python Tournament.py --games 1000 --players random,random --workers 8 --seed 1
+
+Each game gets its own seed, worked out from the tournament seed and the game's number,
+so a tournament plays out the same games however many workers it is split between.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import time
+
+import Bots
+import Game
+
+
+def game_seed(seed, index):
+    """The seed for game number index of a tournament."""
+    return random.Random(f"{seed}:{index}").getrandbits(64)
+
+
+def play_one(job):
+    """Worker function. job is (index, seed, strategy names, deck_type, center_kingdom, full_kingdom).
+    Plays the game, and returns (index, seed, [score for each seat])."""
+    index, seed, strategies, deck_type, center_kingdom, full_kingdom = job
+    game = Game.Game([f"{name} {n + 1}" for n, name in enumerate(strategies)], deck_type,
+                     center_kingdom, full_kingdom, seed = seed)
+    bots = [Bots.STRATEGIES[name](seed = f"{seed}:{n}") for n, name in enumerate(strategies)]
+    scores = Bots.play_game(game, bots)
+    return index, seed, [scores[player][0] for player in game.players]
+
+
+def run_tournament(games, strategies, workers = None, seed = 0, deck_type = 1,
+                   center_kingdom = False, full_kingdom = False, report = None):
+    """Plays games games between strategies (a list of names from Bots.STRATEGIES, one for each seat).
+    workers is the number of processes to use (default: one per CPU). With 1 worker, games run in this process.
+    report, if given, is called with each game's result as it comes in.
+
+    Returns a summary dictionary:
+    {"games", "seconds", "games_per_second",
+     "seats": [{"strategy", "wins", "win_rate", "mean", "stdev", "min", "median", "max"}, ...]}
+    A tied win is shared between the tied seats.
+    """
+    for name in strategies:
+        assert name in Bots.STRATEGIES, f"Unknown strategy '{name}'. Choose from: {', '.join(Bots.STRATEGIES)}"
+    assert 2 <= len(strategies) <= 4, "PrinceDomino is a game for 2-4 players"
+    workers = workers or os.cpu_count() or 1
+
+    jobs = ((index, game_seed(seed, index), tuple(strategies), deck_type, center_kingdom, full_kingdom)
+            for index in range(games))
+    wins = [0.0] * len(strategies)
+    scores = [[] for _ in strategies]
+
+    start = time.perf_counter()
+    if workers == 1:
+        results = map(play_one, jobs)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(play_one, jobs, chunksize = max(1, games // (workers * 16)))
+    try:
+        for result in results:
+            index, game_seed_used, game_scores = result
+            best = max(game_scores)
+            winners = [n for n, score in enumerate(game_scores) if score == best]
+            for n in winners:
+                wins[n] += 1 / len(winners)
+            for n, score in enumerate(game_scores):
+                scores[n].append(score)
+            if report:
+                report(result)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    seconds = time.perf_counter() - start
+
+    seats = []
+    for n, name in enumerate(strategies):
+        seat_scores = scores[n] or [0]
+        seats.append({"strategy": name,
+                      "wins": wins[n],
+                      "win_rate": wins[n] / games if games else 0.0,
+                      "mean": statistics.mean(seat_scores),
+                      "stdev": statistics.pstdev(seat_scores),
+                      "min": min(seat_scores),
+                      "median": statistics.median(seat_scores),
+                      "max": max(seat_scores)})
+    return {"games": games, "seconds": seconds,
+            "games_per_second": games / seconds if seconds else 0.0,
+            "seats": seats}
+
+
+def format_summary(summary):
+    """Returns the summary from run_tournament as a printable table."""
+    lines = [f"{summary['games']} games in {summary['seconds']:.2f}s "
+             f"({summary['games_per_second']:.1f} games/s)",
+             f"{'seat':<6}{'strategy':<12}{'win rate':>10}{'mean':>8}{'stdev':>8}{'min':>6}{'median':>8}{'max':>6}"]
+    for n, seat in enumerate(summary["seats"]):
+        lines.append(f"{n + 1:<6}{seat['strategy']:<12}{seat['win_rate']:>10.1%}{seat['mean']:>8.1f}"
+                     f"{seat['stdev']:>8.1f}{seat['min']:>6}{seat['median']:>8.1f}{seat['max']:>6}")
+    return "\n".join(lines)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Play bot-vs-bot games of PrinceDomino in parallel.")
+    parser.add_argument("--games", type = int, default = 100, help = "number of games to play")
+    parser.add_argument("--players", default = "random,random",
+                        help = f"comma-separated strategy for each seat ({', '.join(Bots.STRATEGIES)})")
+    parser.add_argument("--workers", type = int, default = os.cpu_count(), help = "number of worker processes")
+    parser.add_argument("--seed", type = int, default = 0, help = "tournament seed")
+    parser.add_argument("--deck", choices = ("standard", "random"), default = "standard")
+    parser.add_argument("--center-kingdom", action = "store_true", help = "score the Middle Kingdom bonus")
+    parser.add_argument("--full-kingdom", action = "store_true", help = "score the Harmony bonus")
+    parser.add_argument("--verbose", action = "store_true", help = "print each game's result as it finishes")
+    args = parser.parse_args(argv)
+
+    report = None
+    if args.verbose:
+        report = lambda result: print(f"game {result[0]} (seed {result[1]}): {result[2]}")
+    summary = run_tournament(args.games, args.players.split(","), args.workers, args.seed,
+                             1 if args.deck == "standard" else 0, args.center_kingdom, args.full_kingdom, report)
+    print(format_summary(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import unittest
+import Tournament
+
+
+class TestTournament(unittest.TestCase):
+
+    def test_run_tournament(self):
+        summary = Tournament.run_tournament(6, ["random", "random", "random"], workers = 1, seed = 3, deck_type = 0)
+        self.assertEqual(summary["games"], 6)
+        self.assertEqual(len(summary["seats"]), 3)
+        self.assertAlmostEqual(sum(seat["wins"] for seat in summary["seats"]), 6)
+        for seat in summary["seats"]:
+            self.assertLessEqual(seat["min"], seat["median"])
+            self.assertLessEqual(seat["median"], seat["max"])
+
+    def test_workers_agree(self):
+        #The same tournament plays out the same games, however many processes it is split between
+        results = {}
+        for workers in (1, 2):
+            played = []
+            Tournament.run_tournament(4, ["random", "random"], workers = workers, seed = 9, deck_type = 0,
+                                      report = played.append)
+            results[workers] = sorted(played)
+        self.assertEqual(results[1], results[2])
+
+
+if __name__ == '__main__':
+    unittest.main()